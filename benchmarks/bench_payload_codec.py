@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+ペイロード符号化形式のベンチマーク
+実際の呼吸解析結果に近いレコードで、形式・圧縮ごとのサイズと符号化/復号時間を比較する
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Dict, Any, List
+
+# プロジェクトのルートディレクトリをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from worker.payload_codec import PayloadCodec, decode_payload
+
+COMBINATIONS = [
+    ('json', None),
+    ('json', 'zstd'),
+    ('cbor', None),
+    ('cbor', 'zstd'),
+    ('msgpack', None),
+    ('msgpack', 'zstd'),
+]
+
+
+def make_record(rng: random.Random, index: int, duration: int, sample_rate: int, subcarriers: int) -> Dict[str, Any]:
+    """
+    呼吸解析結果を模したレコードを生成
+
+    Args:
+        rng: 乱数生成器
+        index: レコード番号
+        duration: 解析区間の長さ（秒）
+        sample_rate: サンプリング周波数（Hz）
+        subcarriers: サブキャリア数
+
+    Returns:
+        解析結果のレコード
+    """
+    samples = duration * sample_rate
+    rate = rng.uniform(10, 20)
+    frequency = rate / 60
+    signal = [
+        round(math.sin(2 * math.pi * frequency * i / sample_rate) + rng.gauss(0, 0.05), 6)
+        for i in range(samples)
+    ]
+    timestamp = 1700000000 + index * duration
+    return {
+        'metadata': {
+            'device_id': f"esp32-{index % 8:02d}",
+            'timestamp': timestamp,
+            'sample_rate': sample_rate,
+            'duration': duration,
+            'firmware': '1.2.0'
+        },
+        'breathing_rate': round(rate, 2),
+        'confidence': round(rng.uniform(0.7, 1.0), 4),
+        'breathing_signal': signal,
+        'peak_indices': [i for i in range(1, samples - 1) if signal[i - 1] < signal[i] > signal[i + 1]],
+        'subcarrier_amplitudes': [round(rng.uniform(5, 40), 3) for _ in range(subcarriers)],
+        'subcarrier_weights': [round(rng.random(), 4) for _ in range(subcarriers)],
+        'spectrum': [round(abs(rng.gauss(0, 1)) / (1 + i), 6) for i in range(samples // 2)]
+    }
+
+
+def run(records: List[Dict[str, Any]], iterations: int) -> List[Dict[str, Any]]:
+    """
+    利用可能な形式・圧縮の組み合わせごとに計測
+
+    Args:
+        records: 計測に使うレコード
+        iterations: 計測の繰り返し回数
+
+    Returns:
+        組み合わせごとの計測結果
+    """
+    results = []
+    baseline = None
+    for codec_name, compression in COMBINATIONS:
+        try:
+            codec = PayloadCodec(codec_name, compression)
+        except ValueError as e:
+            print(f"スキップ: {codec_name}+{compression or 'none'}: {e}", file=sys.stderr)
+            continue
+
+        encoded = [codec.encode(record) for record in records]
+        if [decode_payload(raw) for raw in encoded] != records:
+            raise RuntimeError(f"復号結果が一致しません: {codec_name}+{compression or 'none'}")
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for record in records:
+                codec.encode(record)
+        encode_seconds = (time.perf_counter() - start) / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for raw in encoded:
+                decode_payload(raw)
+        decode_seconds = (time.perf_counter() - start) / iterations
+
+        total_bytes = sum(len(raw) for raw in encoded)
+        if baseline is None:
+            baseline = total_bytes
+        results.append({
+            'codec': codec_name,
+            'compression': compression or 'none',
+            'total_bytes': total_bytes,
+            'bytes_per_record': total_bytes // len(records),
+            'ratio': round(total_bytes / baseline, 3),
+            'encode_ms_per_record': round(encode_seconds * 1000 / len(records), 4),
+            'decode_ms_per_record': round(decode_seconds * 1000 / len(records), 4)
+        })
+    return results
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='ペイロード符号化形式のベンチマーク')
+    parser.add_argument('--records', type=int, default=200, help='計測に使うレコード数')
+    parser.add_argument('--iterations', type=int, default=5, help='計測の繰り返し回数')
+    parser.add_argument('--duration', type=int, default=30, help='解析区間の長さ（秒）')
+    parser.add_argument('--sample-rate', type=int, default=20, help='サンプリング周波数（Hz）')
+    parser.add_argument('--subcarriers', type=int, default=64, help='サブキャリア数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = [
+        make_record(rng, index, args.duration, args.sample_rate, args.subcarriers)
+        for index in range(args.records)
+    ]
+    results = run(records, args.iterations)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'形式':<18}{'バイト/件':>12}{'比率':>8}{'符号化ms/件':>14}{'復号ms/件':>12}")
+    for result in results:
+        name = f"{result['codec']}+{result['compression']}"
+        print(
+            f"{name:<18}{result['bytes_per_record']:>12}{result['ratio']:>8}"
+            f"{result['encode_ms_per_record']:>14}{result['decode_ms_per_record']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
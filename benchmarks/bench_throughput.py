@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+エンドツーエンドのスループットベンチマーク
+分析サーバー・IPFS・Ethereumの代替サーバーを起動し、取り込み方式ごとに
+スループット・遅延（p50/p99）・最大RSSを計測してJSONで出力する
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+# プロジェクトのルートディレクトリをパスに追加
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from benchmarks.standins import StandinServers, FakeAnalysisServer, FakeIpfsServer, FakeChain
+
+MODES = ['direct', 'queue', 'batching', 'analysis', 'analysis-pipeline', 'pending-dir', 'pending-dir-pipeline']
+
+# 開発用チェーンでよく使われる既知のテスト用秘密鍵（実資産には使わないこと）
+BENCH_PRIVATE_KEY = '0x4f3edf983ac636a65a842ce7c78d9aa706d3b113bce9c46f30d7d21715b23b1d'
+# 同じく既知のテスト用ニーモニック（--signersが2以上の場合に署名アカウントを導出する）
+BENCH_MNEMONIC = 'test test test test test test test test test test test junk'
+
+ENDPOINTS = {
+    'results': '/breathing-analysis/results',
+    'latest': '/breathing-analysis/results/{device_id}/latest',
+    'health': '/breathing-analysis/health',
+    'devices': '/breathing-analysis/devices'
+}
+
+
+def build_config(work_dir: str, urls: Dict[str, str], args: argparse.Namespace, device_ids: List[str]) -> Dict[str, Any]:
+    """
+    代替サーバーと一時ディレクトリを使う設定を作成
+
+    Args:
+        work_dir: データベースやログを置く一時ディレクトリ
+        urls: 代替サーバーのURL
+        args: コマンドライン引数
+        device_ids: デバイスIDのリスト
+
+    Returns:
+        設定辞書
+    """
+    data_dir = os.path.join(work_dir, 'data')
+    if args.signers > 1:
+        signers = {'private_key': None, 'signers': {'mnemonic': BENCH_MNEMONIC, 'account_count': args.signers}}
+    else:
+        signers = {'private_key': BENCH_PRIVATE_KEY}
+    return {
+        'log_dir': os.path.join(work_dir, 'logs'),
+        'ipfs': {
+            'api_url': urls['ipfs'].replace('http://', '/ip4/').replace(':', '/tcp/'),
+            'http_url': urls['ipfs'],
+            'timeout': 30,
+            'cache': {'max_bytes': 16 * 1024 * 1024}
+        },
+        'ethereum': {
+            'rpc_url': urls['chain'],
+            'contract_address': FakeChain.CONTRACT_ADDRESS,
+            **signers,
+            'gas_limit': 3000000,
+            'submit_workers': args.workers,
+            'receipt_tracker': {'poll_interval': args.poll_interval, 'confirmations': 1, 'timeout': 600},
+            'fee_oracle': {'poll_interval': args.poll_interval}
+        },
+        'batching': {
+            'enabled': args.mode == 'batching',
+            'proof_db': os.path.join(data_dir, 'proofs.db'),
+            'max_records': args.batch_size,
+            'max_wait_seconds': 0.2
+        },
+        'dedup': {'index_db': os.path.join(data_dir, 'dedup.db')},
+        'work_queue': {
+            'db_path': os.path.join(data_dir, 'work_queue.db'),
+            'workers': args.workers,
+            'bulk_size': args.bulk_size
+        },
+        'chain_index': {'db_path': os.path.join(data_dir, 'chain_index.db')},
+        'analysis_server': {
+            'base_url': urls['analysis'],
+            'api_key': 'bench',
+            'endpoints': ENDPOINTS,
+            'device_ids': device_ids,
+            'polling_interval': args.poll_interval,
+            'batch_size': args.fetch_limit,
+            'watermark_file': os.path.join(data_dir, 'watermarks.json')
+        },
+        'monitoring': {'data_dir': data_dir, 'ingest_workers': 4},
+        'pipeline': {'backlog_interval': 1, 'drain_timeout': args.timeout},
+        'storage': {
+            'base_dir': work_dir,
+            'data_dir': data_dir,
+            'logs_dir': os.path.join(work_dir, 'logs'),
+            'temp_dir': os.path.join(work_dir, 'temp')
+        },
+        'logging': {'level': 'WARNING', 'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'}
+    }
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """最近傍法によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def queue_latencies(db_path: str) -> List[float]:
+    """作業キューの追加から確定までの時間（秒）"""
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT updated_at - created_at FROM work_items WHERE state = 'confirmed'").fetchall()
+    return [row[0] for row in rows]
+
+
+def wait_for_confirmed(manager, expected: int, timeout: float) -> int:
+    """作業キューの確定件数が期待値に達するまで待機"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        confirmed = manager.work_queue.counts()['confirmed']
+        if confirmed >= expected:
+            return confirmed
+        time.sleep(0.01)
+    return manager.work_queue.counts()['confirmed']
+
+
+def run_direct(manager, records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """process_breathing_analysisを1件ずつ呼び出す（作業キューを使わない従来の経路）"""
+    latencies: List[float] = []
+    futures = []
+    start = time.perf_counter()
+    for record in records:
+        submitted_at = time.perf_counter()
+        _, anchored = manager._process_breathing_analysis(record)
+        anchored.add_done_callback(lambda f, t=submitted_at: latencies.append(time.perf_counter() - t))
+        futures.append(anchored)
+    confirmed = 0
+    for future in futures:
+        try:
+            future.result(timeout=args.timeout)
+            confirmed += 1
+        except Exception as e:
+            logging.warning(f"確定しなかったレコードがあります: {e}")
+    return {'seconds': time.perf_counter() - start, 'confirmed': confirmed, 'latencies': latencies}
+
+
+def run_queue(manager, records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """作業キューに追加してprocess_work_queueで処理する"""
+    start = time.perf_counter()
+    for record in records:
+        manager.enqueue_analysis(record, 'file', source_ref=record['metadata']['device_id'])
+    manager.process_work_queue()
+    confirmed = wait_for_confirmed(manager, len(records), args.timeout)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'confirmed': confirmed,
+        'latencies': queue_latencies(manager.work_queue_db_path)
+    }
+
+
+def run_analysis(manager, records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """分析サーバー監視の1サイクルを確定件数が揃うまで繰り返す"""
+    async def drive():
+        deadline = time.monotonic() + args.timeout
+        cycles = 0
+        confirmed = 0
+        while time.monotonic() < deadline:
+            await manager.fetch_and_process_analysis_results()
+            cycles += 1
+            confirmed = manager.work_queue.counts()['confirmed']
+            if confirmed >= len(records):
+                break
+            await asyncio.sleep(0.01)
+        seconds = time.perf_counter() - start
+        # 非同期クライアントを含めてここで停止する
+        await manager.aclose()
+        return seconds, confirmed, cycles
+
+    start = time.perf_counter()
+    seconds, confirmed, cycles = asyncio.run(drive())
+    return {
+        'seconds': seconds,
+        'confirmed': confirmed,
+        'latencies': queue_latencies(manager.work_queue_db_path),
+        'cycles': cycles
+    }
+
+
+def run_analysis_pipeline(manager, records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """分析サーバー監視をパイプラインで実行し、確定件数が揃ったら停止する"""
+    async def drive():
+        monitor = asyncio.create_task(manager.monitor_analysis_server())
+        deadline = time.monotonic() + args.timeout
+        confirmed = 0
+        while time.monotonic() < deadline:
+            confirmed = manager.work_queue.counts()['confirmed']
+            if confirmed >= len(records):
+                break
+            await asyncio.sleep(0.01)
+        seconds = time.perf_counter() - start
+        monitor.cancel()
+        await asyncio.gather(monitor, return_exceptions=True)
+        await manager.aclose()
+        return seconds, confirmed
+
+    start = time.perf_counter()
+    seconds, confirmed = asyncio.run(drive())
+    return {
+        'seconds': seconds,
+        'confirmed': confirmed,
+        'latencies': queue_latencies(manager.work_queue_db_path)
+    }
+
+
+def write_pending_files(node_manager, records: List[Dict[str, Any]]) -> str:
+    """解析結果を待機ディレクトリにファイルとして置く"""
+    pending_dir = node_manager._pending_dir()
+    for index, record in enumerate(records):
+        with open(os.path.join(pending_dir, f"analysis_{index:06d}.json"), 'w') as f:
+            json.dump(record, f)
+    return pending_dir
+
+
+def run_pending_dir(node_manager, records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """待機ディレクトリにファイルを置き、monitor_data_directoryで取り込む"""
+    manager = node_manager.blockchain_manager
+    pending_dir = write_pending_files(node_manager, records)
+
+    start = time.perf_counter()
+    deadline = time.monotonic() + args.timeout
+    scans = 0
+    while time.monotonic() < deadline:
+        node_manager.monitor_data_directory()
+        scans += 1
+        if not os.listdir(pending_dir):
+            break
+    confirmed = wait_for_confirmed(manager, len(records), max(0, deadline - time.monotonic()))
+    return {
+        'seconds': time.perf_counter() - start,
+        'confirmed': confirmed,
+        'latencies': queue_latencies(manager.work_queue_db_path),
+        'scans': scans
+    }
+
+
+def run_pending_dir_pipeline(node_manager, records: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """待機ディレクトリにファイルを置き、パイプラインで取り込む"""
+    manager = node_manager.blockchain_manager
+    write_pending_files(node_manager, records)
+
+    start = time.perf_counter()
+    node_manager._start_pipeline()
+    try:
+        node_manager.submit_pending_directory()
+        confirmed = wait_for_confirmed(manager, len(records), args.timeout)
+        seconds = time.perf_counter() - start
+    finally:
+        node_manager._stop_pipeline()
+    return {
+        'seconds': seconds,
+        'confirmed': confirmed,
+        'latencies': queue_latencies(manager.work_queue_db_path)
+    }
+
+
+def run_mode(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    1つの取り込み方式を計測
+
+    Args:
+        args: コマンドライン引数（modeは個別の方式）
+
+    Returns:
+        計測結果
+    """
+    # ノード側のINFOログは計測に影響するため抑える
+    logging.basicConfig(level=logging.WARNING)
+
+    device_ids = [f"bench-device-{index:03d}" for index in range(args.devices)]
+    per_device = -(-args.records // args.devices)
+    analysis_server = FakeAnalysisServer(device_ids, per_device, seed=args.seed)
+    ipfs_server = FakeIpfsServer()
+    chain = FakeChain(block_time=args.block_time, rpc_latency=args.rpc_latency / 1000)
+
+    servers = StandinServers()
+    urls = {
+        'analysis': servers.serve(analysis_server.app(ENDPOINTS)),
+        'ipfs': servers.serve(ipfs_server.app()),
+        'chain': servers.serve(chain.app())
+    }
+    records = [record for device_id in device_ids for record in analysis_server.records[device_id]][:args.records]
+
+    work_dir = tempfile.mkdtemp(prefix=f"csi-bench-{args.mode}-")
+    config = build_config(work_dir, urls, args, device_ids)
+
+    from worker.blockchain_manager import BlockchainManager
+    from worker.async_blockchain_manager import AsyncBlockchainManager
+
+    node_manager = None
+    if args.mode.startswith('pending-dir'):
+        from main import BlockchainNodeManager
+        config_path = os.path.join(work_dir, 'config.json')
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+        node_manager = BlockchainNodeManager(config_path)
+        manager = node_manager.blockchain_manager
+    elif args.mode.startswith('analysis'):
+        manager = AsyncBlockchainManager(config)
+    else:
+        manager = BlockchainManager(config)
+    manager.work_queue_db_path = config['work_queue']['db_path']
+
+    try:
+        if args.mode == 'direct':
+            outcome = run_direct(manager, records, args)
+        elif args.mode in ('queue', 'batching'):
+            outcome = run_queue(manager, records, args)
+        elif args.mode == 'analysis':
+            outcome = run_analysis(manager, records, args)
+        elif args.mode == 'analysis-pipeline':
+            outcome = run_analysis_pipeline(manager, records, args)
+        elif args.mode == 'pending-dir':
+            outcome = run_pending_dir(node_manager, records, args)
+        else:
+            outcome = run_pending_dir_pipeline(node_manager, records, args)
+    finally:
+        if not args.mode.startswith('analysis'):
+            manager.close()
+        servers.close()
+
+    latencies = outcome.pop('latencies')
+    seconds = outcome.pop('seconds')
+    result = {
+        'mode': args.mode,
+        'records': len(records),
+        'confirmed': outcome.pop('confirmed'),
+        'seconds': round(seconds, 4),
+        'throughput_rps': round(len(records) / seconds, 2) if seconds else None,
+        'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        # Linuxのru_maxrssはKB単位
+        'rss_peak_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'ipfs_add_requests': ipfs_server.add_requests,
+        'rpc_calls': sum(chain.rpc_calls.values()),
+        'rpc_calls_by_method': dict(sorted(chain.rpc_calls.items())),
+        'analysis_requests': analysis_server.requests
+    }
+    result.update(outcome)
+    return result
+
+
+def git_commit() -> Optional[str]:
+    """計測対象のコミット"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='エンドツーエンドのスループットベンチマーク')
+    parser.add_argument('--mode', choices=MODES + ['all'], default='all', help='計測する取り込み方式')
+    parser.add_argument('--records', type=int, default=200, help='計測に使うレコード数')
+    parser.add_argument('--devices', type=int, default=4, help='デバイス数')
+    parser.add_argument('--workers', type=int, default=4, help='作業キューのワーカー数')
+    parser.add_argument('--bulk-size', type=int, default=10, help='1回の取り出しでまとめてIPFSに保存する件数')
+    parser.add_argument('--batch-size', type=int, default=50, help='Merkleバッチの最大件数（batchingモード）')
+    parser.add_argument('--fetch-limit', type=int, default=50, help='1サイクルでデバイスごとに取得する件数（analysisモード）')
+    parser.add_argument('--signers', type=int, default=1, help='送信に使う署名アカウント数')
+    parser.add_argument('--block-time', type=float, default=0, help='代替チェーンのブロック生成間隔（秒、0は送信ごと）')
+    parser.add_argument('--rpc-latency', type=float, default=0, help='RPC呼び出しごとに加える遅延（ms）')
+    parser.add_argument('--poll-interval', type=float, default=0.05, help='レシート・手数料の確認間隔（秒）')
+    parser.add_argument('--timeout', type=float, default=300, help='1方式あたりの待機上限（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--output', type=str, help='結果を書き出すJSONファイル（省略時は標準出力）')
+
+    args = parser.parse_args()
+
+    if args.mode != 'all':
+        print(json.dumps(run_mode(args)))
+        return
+
+    # 方式ごとに別プロセスで計測し、RSSやグローバルな状態を分離する
+    results = []
+    for mode in MODES:
+        command = [sys.executable, os.path.abspath(__file__), '--mode', mode]
+        for key, value in vars(args).items():
+            if key not in ('mode', 'output'):
+                command += [f"--{key.replace('_', '-')}", str(value)]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            results.append({'mode': mode, 'error': completed.stderr.strip().splitlines()[-1:]})
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{mode}: {result['throughput_rps']} 件/秒, p50 {result['latency_p50_ms']} ms, "
+              f"p99 {result['latency_p99_ms']} ms, RSS {result['rss_peak_mb']} MB", file=sys.stderr)
+        results.append(result)
+
+    report = {
+        'benchmark': 'throughput',
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('mode', 'output')},
+        'results': results
+    }
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    else:
+        print(encoded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+"""
+ベンチマーク用のローカル代替サーバー
+分析サーバー・IPFS HTTP API・Ethereum JSON-RPCを1つのイベントループスレッドで提供する
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from typing import Dict, Any, List, Optional
+
+import rlp
+from aiohttp import web
+from eth_abi import decode as abi_decode, encode as abi_encode
+from eth_account import Account
+from web3 import Web3
+
+from benchmarks.bench_payload_codec import make_record
+
+_BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def _base58(data: bytes) -> str:
+    """base58btc符号化"""
+    number = int.from_bytes(data, 'big')
+    encoded = ''
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = _BASE58_ALPHABET[remainder] + encoded
+    padding = len(data) - len(data.lstrip(b'\0'))
+    return '1' * padding + encoded
+
+
+def fake_cid(data: bytes) -> str:
+    """内容のSHA-256からCIDv0形式の識別子を生成（実際のIPFSのCIDとは一致しない）"""
+    return _base58(b'\x12\x20' + hashlib.sha256(data).digest())
+
+
+class StandinServers:
+    """代替サーバーを動かすイベントループスレッド"""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='standins', daemon=True)
+        self._runners: List[web.AppRunner] = []
+        self._thread.start()
+
+    def serve(self, app: web.Application, host: str = '127.0.0.1') -> str:
+        """
+        アプリケーションを空きポートで起動
+
+        Args:
+            app: aiohttpのアプリケーション
+            host: 待ち受けるアドレス
+
+        Returns:
+            ベースURL
+        """
+        async def start():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, host, 0)
+            await site.start()
+            self._runners.append(runner)
+            return runner.addresses[0][1]
+
+        port = asyncio.run_coroutine_threadsafe(start(), self._loop).result()
+        return f"http://{host}:{port}"
+
+    def call(self, coroutine):
+        """イベントループスレッドでコルーチンを実行して結果を返す"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        """すべてのサーバーを停止"""
+        async def stop():
+            for runner in self._runners:
+                await runner.cleanup()
+
+        self.call(stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+class FakeAnalysisServer:
+    """分析サーバーの代替（health・results・latest・devices）"""
+
+    def __init__(
+        self,
+        device_ids: List[str],
+        records_per_device: int,
+        start_timestamp: int = 1700000000,
+        interval: int = 30,
+        seed: int = 0
+    ):
+        """
+        代替分析サーバーの初期化
+
+        Args:
+            device_ids: デバイスIDのリスト
+            records_per_device: デバイスごとのレコード数
+            start_timestamp: 最初のレコードの時刻
+            interval: レコードの時刻の間隔（秒）
+            seed: 乱数シード
+        """
+        rng = random.Random(seed)
+        self.records: Dict[str, List[Dict[str, Any]]] = {}
+        for device_number, device_id in enumerate(device_ids):
+            records = []
+            for index in range(records_per_device):
+                record = make_record(rng, index, interval, sample_rate=10, subcarriers=32)
+                record['metadata']['device_id'] = device_id
+                record['metadata']['timestamp'] = start_timestamp + index * interval + device_number
+                records.append(record)
+            self.records[device_id] = records
+        self.requests = 0
+
+    def app(self, endpoints: Dict[str, str]) -> web.Application:
+        """
+        エンドポイントの設定に合わせたアプリケーションを作成
+
+        Args:
+            endpoints: 設定のanalysis_server.endpoints
+
+        Returns:
+            aiohttpのアプリケーション
+        """
+        app = web.Application()
+        app.add_routes([
+            web.get(endpoints['health'], self._health),
+            web.get(endpoints['devices'], self._devices),
+            web.get(endpoints['latest'], self._latest),
+            web.get(f"{endpoints['results']}/{{device_id}}", self._results),
+        ])
+        return app
+
+    async def _health(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.json_response({'status': 'ok'})
+
+    async def _devices(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.json_response({'devices': list(self.records)})
+
+    async def _latest(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        records = self.records.get(request.match_info['device_id'])
+        if not records:
+            return web.json_response({'detail': 'not found'}, status=404)
+        return web.json_response(records[-1])
+
+    async def _results(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        records = self.records.get(request.match_info['device_id'], [])
+        start_time = int(request.query.get('start_time', 0))
+        end_time = request.query.get('end_time')
+        limit = int(request.query.get('limit', 100))
+        selected = [
+            record for record in records
+            if record['metadata']['timestamp'] >= start_time
+            and (end_time is None or record['metadata']['timestamp'] <= int(end_time))
+        ][:limit]
+        return web.json_response({'count': len(selected), 'results': selected})
+
+
+class FakeIpfsServer:
+    """IPFS HTTP APIの代替（add・cat・id・pin・version）"""
+
+    def __init__(self):
+        self.blocks: Dict[str, bytes] = {}
+        self.add_requests = 0
+
+    def app(self) -> web.Application:
+        """aiohttpのアプリケーションを作成"""
+        app = web.Application(client_max_size=256 * 1024 * 1024)
+        # ipfshttpclientはGET、IPFSのHTTP APIの仕様ではPOSTを使うため両方を受け付ける
+        for path, handler in (
+            ('/api/v0/add', self._add),
+            ('/api/v0/cat', self._cat),
+            ('/api/v0/id', self._id),
+            ('/api/v0/version', self._version),
+            ('/api/v0/pin/add', self._pin),
+            ('/api/v0/pin/rm', self._pin),
+        ):
+            app.router.add_route('*', path, handler)
+        return app
+
+    async def _add(self, request: web.Request) -> web.Response:
+        self.add_requests += 1
+        lines = []
+        reader = await request.multipart()
+        async for part in reader:
+            data = await part.read()
+            cid = fake_cid(data)
+            self.blocks[cid] = data
+            lines.append(json.dumps({'Name': part.filename or cid, 'Hash': cid, 'Size': str(len(data))}))
+        return web.Response(text='\n'.join(lines) + '\n', content_type='application/json')
+
+    async def _cat(self, request: web.Request) -> web.Response:
+        data = self.blocks.get(request.query.get('arg', ''))
+        if data is None:
+            return web.json_response({'Message': 'block not found', 'Code': 0, 'Type': 'error'}, status=500)
+        return web.Response(body=data, content_type='text/plain')
+
+    async def _id(self, request: web.Request) -> web.Response:
+        return web.json_response({'ID': 'QmBenchStandin', 'Addresses': [], 'AgentVersion': 'go-ipfs/0.4.23/'})
+
+    async def _version(self, request: web.Request) -> web.Response:
+        return web.json_response({'Version': '0.4.23', 'Commit': '', 'Repo': '7', 'System': 'amd64/linux'})
+
+    async def _pin(self, request: web.Request) -> web.Response:
+        return web.json_response({'Pins': [request.query.get('arg', '')]})
+
+
+class FakeChain:
+    """Ethereum JSON-RPCの代替（呼吸データ記録コントラクト1つだけを持つ開発用チェーン）
+
+    ブロック時間が0の場合は送信ごとにブロックを生成し、それ以外は一定間隔で生成する。
+    nonceの飛びは実際のノードと同様に、手前のnonceが届くまで保留する。
+    """
+
+    CONTRACT_ADDRESS = Web3.to_checksum_address('0x' + 'c5' * 20)
+    STORE_SELECTOR = Web3.keccak(text='storeBreathingData(string,uint256,string)')[:4]
+    COUNT_SELECTOR = Web3.keccak(text='getBreathingDataCount()')[:4]
+    RECORD_SELECTOR = Web3.keccak(text='breathingData(uint256)')[:4]
+
+    def __init__(
+        self,
+        chain_id: int = 1337,
+        block_time: float = 0,
+        base_fee: Optional[int] = 1_000_000_000,
+        rpc_latency: float = 0
+    ):
+        """
+        代替チェーンの初期化
+
+        Args:
+            chain_id: チェーンID
+            block_time: ブロック生成間隔（秒、0の場合は送信ごとに生成）
+            base_fee: ベースフィー（wei、Noneの場合はEIP-1559以前のチェーン）
+            rpc_latency: RPC呼び出しごとに加える遅延（秒）
+        """
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.base_fee = base_fee
+        self.rpc_latency = rpc_latency
+
+        self.block_number = 0
+        self.block_timestamps = {0: 1700000000}
+        self.next_nonce: Dict[str, int] = {}
+        self.future_txs: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.mempool: List[Dict[str, Any]] = []
+        self.transactions: Dict[str, Dict[str, Any]] = {}
+        self.receipts: Dict[str, Dict[str, Any]] = {}
+        self.records: List[tuple] = []
+        self.rpc_calls: Dict[str, int] = {}
+        self._miner: Optional[asyncio.Task] = None
+
+    def app(self) -> web.Application:
+        """aiohttpのアプリケーションを作成"""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes([web.post('/', self._handle)])
+        if self.block_time > 0:
+            app.on_startup.append(self._start_miner)
+            app.on_cleanup.append(self._stop_miner)
+        return app
+
+    async def _start_miner(self, app: web.Application):
+        self._miner = asyncio.create_task(self._mine_periodically())
+
+    async def _stop_miner(self, app: web.Application):
+        if self._miner:
+            self._miner.cancel()
+
+    async def _mine_periodically(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            self._mine()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+        if isinstance(payload, list):
+            return web.json_response([self._dispatch(call) for call in payload])
+        return web.json_response(self._dispatch(payload))
+
+    def _dispatch(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        method = call.get('method')
+        self.rpc_calls[method] = self.rpc_calls.get(method, 0) + 1
+        handler = getattr(self, f"_rpc_{method}", None)
+        if handler is None:
+            return {'jsonrpc': '2.0', 'id': call.get('id'),
+                    'error': {'code': -32601, 'message': f"method not found: {method}"}}
+        try:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': handler(*call.get('params', []))}
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32000, 'message': str(e)}}
+
+    def _block_hash(self, number: int) -> str:
+        return Web3.to_hex(Web3.keccak(number.to_bytes(32, 'big')))
+
+    def _mine(self):
+        """メモリプールのトランザクションを新しいブロックに取り込む"""
+        if not self.mempool and self.block_time == 0:
+            return
+        self.block_number += 1
+        self.block_timestamps[self.block_number] = self.block_timestamps[self.block_number - 1] + 1
+        block_hash = self._block_hash(self.block_number)
+        for index, tx in enumerate(self.mempool):
+            ipfs_hash, timestamp, device_id = abi_decode(['string', 'uint256', 'string'], tx['input'][4:])
+            self.records.append((ipfs_hash, timestamp, device_id))
+            self.receipts[tx['hash']] = {
+                'transactionHash': tx['hash'],
+                'transactionIndex': hex(index),
+                'blockHash': block_hash,
+                'blockNumber': hex(self.block_number),
+                'from': tx['from'],
+                'to': self.CONTRACT_ADDRESS,
+                'cumulativeGasUsed': hex(tx['gas']),
+                'gasUsed': hex(tx['gas']),
+                'effectiveGasPrice': hex(self.base_fee or 1),
+                'contractAddress': None,
+                'logs': [],
+                'logsBloom': '0x' + '00' * 256,
+                'status': '0x1',
+                'type': hex(tx['type'])
+            }
+            tx['blockNumber'] = hex(self.block_number)
+            tx['blockHash'] = block_hash
+        self.mempool = []
+
+    def _rpc_web3_clientVersion(self):
+        return 'csi-bench-chain/0.1'
+
+    def _rpc_net_version(self):
+        return str(self.chain_id)
+
+    def _rpc_eth_chainId(self):
+        return hex(self.chain_id)
+
+    def _rpc_eth_blockNumber(self):
+        return hex(self.block_number)
+
+    def _rpc_eth_gasPrice(self):
+        return hex((self.base_fee or 1_000_000_000) * 2)
+
+    def _rpc_eth_maxPriorityFeePerGas(self):
+        return hex(1_000_000_000)
+
+    def _rpc_eth_getBlockByNumber(self, tag, full=False):
+        number = self.block_number if tag in ('latest', 'pending', 'safe', 'finalized') else int(tag, 16)
+        if number > self.block_number:
+            return None
+        block = {
+            'number': hex(number),
+            'hash': self._block_hash(number),
+            'parentHash': self._block_hash(number - 1) if number else '0x' + '00' * 32,
+            'timestamp': hex(self.block_timestamps.get(number, 1700000000)),
+            'gasLimit': hex(30_000_000),
+            'gasUsed': '0x0',
+            'miner': '0x' + '00' * 20,
+            'difficulty': '0x0',
+            'totalDifficulty': '0x0',
+            'extraData': '0x',
+            'size': '0x0',
+            'nonce': '0x0000000000000000',
+            'sha3Uncles': '0x' + '00' * 32,
+            'logsBloom': '0x' + '00' * 256,
+            'transactionsRoot': '0x' + '00' * 32,
+            'stateRoot': '0x' + '00' * 32,
+            'receiptsRoot': '0x' + '00' * 32,
+            'mixHash': '0x' + '00' * 32,
+            'transactions': [],
+            'uncles': []
+        }
+        if self.base_fee is not None:
+            block['baseFeePerGas'] = hex(self.base_fee)
+        return block
+
+    def _rpc_eth_getTransactionCount(self, address, tag='latest'):
+        return hex(self.next_nonce.get(address.lower(), 0))
+
+    def _rpc_eth_getBalance(self, address, tag='latest'):
+        return hex(10 ** 21)
+
+    def _rpc_eth_estimateGas(self, transaction, tag=None):
+        data = bytes.fromhex(transaction.get('data', transaction.get('input', '0x'))[2:])
+        return hex(21000 + 16 * len(data) + 60000)
+
+    def _rpc_eth_sendRawTransaction(self, raw_hex):
+        raw = bytes.fromhex(raw_hex[2:])
+        sender = Account.recover_transaction(raw).lower()
+        if raw[0] == 2:
+            fields = rlp.decode(raw[1:])
+            nonce, gas, data, tx_type = fields[1], fields[4], fields[7], 2
+        else:
+            fields = rlp.decode(raw)
+            nonce, gas, data, tx_type = fields[0], fields[2], fields[5], 0
+        nonce = int.from_bytes(nonce, 'big')
+        tx_hash = Web3.to_hex(Web3.keccak(raw))
+
+        expected = self.next_nonce.get(sender, 0)
+        if nonce < expected:
+            raise ValueError('nonce too low')
+        if not data.startswith(self.STORE_SELECTOR):
+            raise ValueError('execution reverted: unknown function')
+
+        tx = {
+            'hash': tx_hash,
+            'from': sender,
+            'to': self.CONTRACT_ADDRESS,
+            'nonce': hex(nonce),
+            'gas': int.from_bytes(gas, 'big'),
+            'input': data,
+            'type': tx_type,
+            'blockNumber': None,
+            'blockHash': None
+        }
+        self.transactions[tx_hash] = tx
+
+        # nonce順に取り込み可能になったものをメモリプールへ移す
+        pending = self.future_txs.setdefault(sender, {})
+        pending[nonce] = tx
+        while expected in pending:
+            self.mempool.append(pending.pop(expected))
+            expected += 1
+        self.next_nonce[sender] = expected
+
+        if self.block_time == 0:
+            self._mine()
+        return tx_hash
+
+    def _rpc_eth_getTransactionReceipt(self, tx_hash):
+        return self.receipts.get(tx_hash)
+
+    def _rpc_eth_getTransactionByHash(self, tx_hash):
+        tx = self.transactions.get(tx_hash)
+        if tx is None:
+            return None
+        return {
+            'hash': tx['hash'],
+            'from': tx['from'],
+            'to': tx['to'],
+            'nonce': tx['nonce'],
+            'gas': hex(tx['gas']),
+            'input': Web3.to_hex(tx['input']),
+            'value': '0x0',
+            'blockNumber': tx['blockNumber'],
+            'blockHash': tx['blockHash'],
+            'transactionIndex': None,
+            'type': hex(tx['type'])
+        }
+
+    def _rpc_eth_call(self, transaction, tag='latest'):
+        data = bytes.fromhex(transaction.get('data', transaction.get('input', '0x'))[2:])
+        if data.startswith(self.COUNT_SELECTOR):
+            return Web3.to_hex(abi_encode(['uint256'], [len(self.records)]))
+        if data.startswith(self.RECORD_SELECTOR):
+            (index,) = abi_decode(['uint256'], data[4:])
+            if index >= len(self.records):
+                raise ValueError('execution reverted')
+            return Web3.to_hex(abi_encode(['string', 'uint256', 'string'], list(self.records[index])))
+        raise ValueError('execution reverted: unknown function')
@@ -10,32 +10,48 @@ import sys
 import time
 import argparse
 import logging
+import threading
 from datetime import datetime
 from typing import Dict, Any
 import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import schedule
 
 # プロジェクトのルートディレクトリをパスに追加
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from worker.blockchain_manager import BlockchainManager
+from worker.async_blockchain_manager import AsyncBlockchainManager
+from worker.file_watcher import PendingDirectoryWatcher, inotify_available
+from worker.records import canonical_hash, validate_analysis
+from worker.work_queue import STATE_CONFIRMED
+from worker.profiler import SamplingProfiler
 
 class BlockchainNodeManager:
     """ブロックチェーンノード管理クラス"""
     
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, use_async_io: bool = False):
         """
         ブロックチェーンノードマネージャーの初期化
         
         Args:
             config_path: 設定ファイルのパス
+            use_async_io: IPFSへの保存をイベントループ上で行うマネージャーを使うかどうか
         """
         self.config = self._load_config(config_path)
         self._setup_logging()
         self._setup_directories()
         
         # ブロックチェーンマネージャーの初期化
-        self.blockchain_manager = BlockchainManager(self.config)
+        manager_class = AsyncBlockchainManager if use_async_io else BlockchainManager
+        self.blockchain_manager = manager_class(self.config)
+        
+        # 待機ファイルを処理するパイプライン（monitorモードで開始）
+        self.pipeline = None
+        self._pipeline_loop = None
+        self._pipeline_thread = None
+        self._pipeline_paths = set()
+        self._pipeline_lock = threading.Lock()
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """設定ファイルの読み込み"""
@@ -82,74 +98,284 @@ class BlockchainNodeManager:
                 os.makedirs(directory)
                 self.logger.info(f"ディレクトリを作成しました: {directory}")
                 
-    def process_analysis_file(self, file_path: str) -> bool:
+    def ingest_analysis_file(self, file_path: str) -> str:
         """
-        解析ファイルの処理
+        解析ファイルを作業キューに取り込む
+        
+        取り込んだファイルは削除し、解析結果の処理状態は作業キューで管理する。
+        読み込みや検証に失敗したファイルはfailedディレクトリに移動する。
         
         Args:
             file_path: 解析ファイルのパス
             
         Returns:
-            処理成功フラグ
+            取り込み結果（'queued'、'requeued'、'duplicate'、'invalid' のいずれか）
         """
         try:
-            self.logger.info(f"解析ファイルの処理を開始: {file_path}")
-            
-            # ファイルの読み込み
             with open(file_path, 'r') as f:
                 analysis_data = json.load(f)
-                
-            # ブロックチェーンへの保存
-            result = self.blockchain_manager.process_breathing_analysis(analysis_data)
+            validate_analysis(analysis_data)
+        except Exception as e:
+            self.logger.error(f"解析ファイルの読み込みに失敗: {file_path}: {e}")
+            self._move_to_failed(file_path)
+            return 'invalid'
             
-            self.logger.info(f"解析ファイルの処理が完了: {result['transaction_hash']}")
+        # 置き直されたファイルはfailed状態の項目を再試行する
+        outcome = self.blockchain_manager.enqueue_analysis(
+            analysis_data, 'file', source_ref=file_path, retry_failed=True
+        )
+        if outcome == 'queued':
+            self.logger.info(f"解析ファイルを作業キューに追加しました: {file_path}")
+        elif outcome == 'requeued':
+            self.logger.info(f"失敗した解析結果を作業キューで再試行します: {file_path}")
+        else:
+            self.logger.info(f"同一の解析結果が作業キューにあるため追加を省略しました: {file_path}")
             
-            # 処理済みファイルの移動
-            processed_dir = os.path.join(self.config['storage']['data_dir'], 'processed')
-            os.makedirs(processed_dir, exist_ok=True)
+        # キューへの書き込みが確定してから削除する
+        os.remove(file_path)
+        return outcome
+        
+    def _move_to_failed(self, file_path: str):
+        """読み込みや検証に失敗したファイルをfailedディレクトリに移動"""
+        failed_dir = os.path.join(self.config['storage']['data_dir'], 'failed')
+        os.makedirs(failed_dir, exist_ok=True)
+        os.rename(file_path, os.path.join(failed_dir, os.path.basename(file_path)))
+        
+    def process_analysis_file(self, file_path: str) -> bool:
+        """
+        解析ファイルの処理
+        
+        Args:
+            file_path: 解析ファイルのパス
             
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            new_filename = f"processed_{timestamp}_{os.path.basename(file_path)}"
-            new_path = os.path.join(processed_dir, new_filename)
+        Returns:
+            処理成功フラグ（このファイルの解析結果がチェーンに記録済みであればTrue）
+        """
+        try:
+            self.logger.info(f"解析ファイルの処理を開始: {file_path}")
             
-            os.rename(file_path, new_path)
-            self.logger.info(f"処理済みファイルを移動しました: {new_path}")
+            # ファイルの読み込みと検証
+            analysis_data = self._read_json(file_path)
+            validate_analysis(analysis_data)
             
+            outcome = self.blockchain_manager.enqueue_analysis(
+                analysis_data, 'file', source_ref=file_path, retry_failed=True
+            )
+            if outcome == 'duplicate':
+                self.logger.info(f"同一の解析結果は処理済みまたは処理中です: {file_path}")
+                
+            # このファイルの解析結果だけを処理し、記録の結果を待つ
+            payload_hash = canonical_hash(analysis_data)
+            state = self.blockchain_manager.process_queued_analysis(payload_hash)
+            if state != STATE_CONFIRMED:
+                self.logger.error(f"解析ファイルの記録が確定しませんでした: {file_path} (状態: {state})")
+                return False
+                
+            self.logger.info(f"解析ファイルの処理が完了: {file_path}")
             return True
             
         except Exception as e:
             self.logger.error(f"解析ファイル処理中にエラーが発生: {e}")
             return False
             
-    def monitor_data_directory(self):
-        """データディレクトリの監視"""
-        try:
-            data_dir = self.config['storage']['data_dir']
-            pending_dir = os.path.join(data_dir, 'pending')
-            
-            if not os.path.exists(pending_dir):
-                os.makedirs(pending_dir)
+    def _pending_dir(self) -> str:
+        """待機ディレクトリのパス（存在しない場合は作成）"""
+        pending_dir = os.path.join(self.config['storage']['data_dir'], 'pending')
+        if not os.path.exists(pending_dir):
+            os.makedirs(pending_dir)
+        return pending_dir
+        
+    def handle_pending_file(self, file_path: str):
+        """
+        書き込みが完了した待機ファイルを取り込んで処理
+        
+        Args:
+            file_path: 解析ファイルのパス
+        """
+        if self.ingest_analysis_file(file_path) in ('queued', 'requeued'):
+            results = self.blockchain_manager.process_work_queue()
+            if results:
+                self.logger.info(f"作業キューから {len(results)} 件を処理しました")
                 
-            # 待機中のファイルを検索
-            json_files = [f for f in os.listdir(pending_dir) if f.endswith('.json')]
+    def monitor_data_directory(self) -> Dict[str, str]:
+        """
+        データディレクトリの監視
+        
+        待機ファイルの読み込みと検証を並列に行って作業キューに取り込み、
+        作業キューを複数のワーカーで処理する。
+        
+        Returns:
+            ファイルパスをキーとした処理結果
+            （'submitted'、'duplicate'、'invalid'、'retry'、'error' のいずれか）
+        """
+        outcomes: Dict[str, str] = {}
+        try:
+            pending_dir = self._pending_dir()
             
-            for filename in json_files:
-                file_path = os.path.join(pending_dir, filename)
+            # 待機中のファイルを作業キューに取り込む
+            with os.scandir(pending_dir) as entries:
+                json_files = [entry.path for entry in entries if entry.name.endswith('.json')]
                 
-                try:
-                    # ファイルの処理
-                    if self.process_analysis_file(file_path):
-                        self.logger.info(f"ファイルの処理が成功しました: {filename}")
-                    else:
-                        self.logger.error(f"ファイルの処理に失敗しました: {filename}")
+            workers = self.config.get('monitoring', {}).get('ingest_workers', 4)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest') as executor:
+                futures = {executor.submit(self.ingest_analysis_file, path): path for path in json_files}
+                for future in as_completed(futures):
+                    file_path = futures[future]
+                    try:
+                        outcomes[file_path] = future.result()
+                    except Exception as e:
+                        self.logger.error(f"ファイル取り込み中にエラーが発生 {file_path}: {e}")
+                        outcomes[file_path] = 'error'
                         
-                except Exception as e:
-                    self.logger.error(f"ファイル処理中にエラーが発生 {filename}: {e}")
-                    continue
+            # 作業キューの待機中項目を処理
+            results = self.blockchain_manager.process_work_queue()
+            submitted = {result['source_ref'] for result in results}
+            for file_path, outcome in outcomes.items():
+                if outcome in ('queued', 'requeued'):
+                    # 送信に至らなかったファイルは作業キューで再試行される
+                    outcomes[file_path] = 'submitted' if file_path in submitted else 'retry'
                     
+            if outcomes:
+                summary = {}
+                for outcome in outcomes.values():
+                    summary[outcome] = summary.get(outcome, 0) + 1
+                self.logger.info(f"待機ファイルの処理結果: {summary}")
+            if results:
+                self.logger.info(f"作業キューから {len(results)} 件を処理しました")
+                
         except Exception as e:
             self.logger.error(f"データディレクトリ監視中にエラーが発生: {e}")
             
+        return outcomes
+        
+    def _start_pipeline(self):
+        """待機ファイルを処理するパイプラインをバックグラウンドのイベントループで開始"""
+        self._pipeline_loop = asyncio.new_event_loop()
+        self._pipeline_thread = threading.Thread(
+            target=self._pipeline_loop.run_forever, name='pipeline', daemon=True
+        )
+        self._pipeline_thread.start()
+        
+        workers = self.config.get('monitoring', {}).get('ingest_workers', 4)
+        self.pipeline = self.blockchain_manager.create_pipeline(self._read_pending_files, workers, name='pending-dir')
+        self._run_in_pipeline(self.pipeline.start())
+        
+    def _stop_pipeline(self):
+        """処理中の待機ファイルを流し切ってからパイプラインを停止"""
+        if not self.pipeline:
+            return
+        drain_timeout = self.config.get('pipeline', {}).get('drain_timeout', 60)
+        self._run_in_pipeline(self.pipeline.close(timeout=drain_timeout))
+        self.logger.info(f"パイプラインの処理件数: {self.pipeline.snapshot()}")
+        self._pipeline_loop.call_soon_threadsafe(self._pipeline_loop.stop)
+        self._pipeline_thread.join(timeout=5)
+        self._pipeline_loop.close()
+        self.pipeline = None
+        
+    def _run_in_pipeline(self, coroutine):
+        """パイプラインのイベントループでコルーチンを実行して結果を待つ"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._pipeline_loop).result()
+        
+    async def _read_pending_files(self, paths, emit):
+        """パイプラインの取得段階（待機ファイルを読み込んで渡す）"""
+        loop = asyncio.get_running_loop()
+        for path in paths:
+            try:
+                analysis_data = await loop.run_in_executor(None, self._read_json, path)
+            except FileNotFoundError:
+                self._release_pending_file(path)
+                continue
+            except Exception as e:
+                self.logger.error(f"解析ファイルの読み込みに失敗: {path}: {e}")
+                try:
+                    self._move_to_failed(path)
+                finally:
+                    self._release_pending_file(path)
+                continue
+            await emit({
+                'source': 'file',
+                'source_ref': path,
+                'payload': analysis_data,
+                'on_admitted': lambda outcome, path=path: self._finish_pending_file(path, outcome)
+            })
+            
+    @staticmethod
+    def _read_json(path: str) -> Any:
+        """JSONファイルの読み込み"""
+        with open(path, 'r') as f:
+            return json.load(f)
+            
+    def _finish_pending_file(self, file_path: str, outcome: str):
+        """
+        作業キューへの取り込み結果に応じて待機ファイルを片付ける
+        
+        Args:
+            file_path: 解析ファイルのパス
+            outcome: 'queued'、'requeued'、'duplicate'、'invalid'、'error' のいずれか
+        """
+        try:
+            if outcome == 'invalid':
+                self._move_to_failed(file_path)
+            elif outcome in ('queued', 'requeued', 'duplicate'):
+                # キューへの書き込みが確定してから削除する
+                os.remove(file_path)
+            # 'error' の場合はファイルを残し、次回の走査で取り込み直す
+        finally:
+            self._release_pending_file(file_path)
+            
+    def _release_pending_file(self, file_path: str):
+        """待機ファイルをパイプラインの処理中から外す"""
+        with self._pipeline_lock:
+            self._pipeline_paths.discard(file_path)
+            
+    def submit_pending_file(self, file_path: str) -> bool:
+        """
+        書き込みが完了した待機ファイルをパイプラインに渡す
+        
+        取得段階のキューが満杯の間は空きを待つ。
+        
+        Args:
+            file_path: 解析ファイルのパス
+            
+        Returns:
+            渡したかどうか（既にパイプラインで処理中の場合はFalse）
+        """
+        with self._pipeline_lock:
+            if file_path in self._pipeline_paths:
+                return False
+            self._pipeline_paths.add(file_path)
+        try:
+            self._run_in_pipeline(self.pipeline.put(file_path))
+        except Exception:
+            self._release_pending_file(file_path)
+            raise
+        return True
+        
+    def submit_pending_directory(self) -> int:
+        """
+        待機ディレクトリの全ファイルと作業キューの待機中項目をパイプラインに渡す
+        
+        Returns:
+            渡したファイル数
+        """
+        submitted = 0
+        try:
+            with os.scandir(self._pending_dir()) as entries:
+                json_files = [entry.path for entry in entries if entry.name.endswith('.json')]
+            for file_path in json_files:
+                if self.submit_pending_file(file_path):
+                    submitted += 1
+            self.feed_pipeline_backlog()
+            if submitted:
+                self.logger.info(f"待機ファイルをパイプラインに渡しました: {submitted} 件")
+        except Exception as e:
+            self.logger.error(f"データディレクトリ監視中にエラーが発生: {e}")
+        return submitted
+        
+    def feed_pipeline_backlog(self) -> int:
+        """作業キューの待機中項目（再試行待ちなど）をパイプラインに渡す"""
+        return self._run_in_pipeline(self.blockchain_manager.feed_pipeline_backlog(self.pipeline))
+        
     def get_blockchain_status(self) -> Dict[str, Any]:
         """
         ブロックチェーンの状態取得
@@ -178,9 +404,35 @@ class BlockchainNodeManager:
             
     def run_scheduled_tasks(self):
         """スケジュールされたタスクの実行"""
+        watcher = None
         try:
-            # データディレクトリ監視のスケジュール
-            schedule.every(30).seconds.do(self.monitor_data_directory)
+            monitoring_config = self.config.get('monitoring', {})
+            pipeline_config = self.config.get('pipeline', {})
+            watch_mode = monitoring_config.get('watch_mode', 'inotify')
+            
+            if pipeline_config.get('enabled', True):
+                # 取り込みから確定待ちまでを段階ごとの並行数で重ねる
+                self._start_pipeline()
+                on_file_ready, on_scan = self.submit_pending_file, self.submit_pending_directory
+                schedule.every(pipeline_config.get('backlog_interval', 30)).seconds.do(self.feed_pipeline_backlog)
+            else:
+                on_file_ready, on_scan = self.handle_pending_file, self.monitor_data_directory
+            
+            if watch_mode == 'inotify' and inotify_available():
+                # 書き込み完了イベントで取り込み、全件走査は取りこぼしの回収のみに使う
+                watcher = PendingDirectoryWatcher(
+                    self._pending_dir(),
+                    on_file_ready=on_file_ready,
+                    on_reconcile=on_scan,
+                    debounce_seconds=monitoring_config.get('debounce_seconds', 0.5),
+                    reconcile_interval=monitoring_config.get('reconcile_interval', 300)
+                )
+                watcher.start()
+            else:
+                if watch_mode == 'inotify':
+                    self.logger.warning("inotifyが利用できないため定期走査で監視します")
+                # データディレクトリ監視のスケジュール
+                schedule.every(monitoring_config.get('scan_interval', 30)).seconds.do(on_scan)
             
             # ブロックチェーン状態確認のスケジュール
             schedule.every(5).minutes.do(self.get_blockchain_status)
@@ -195,7 +447,47 @@ class BlockchainNodeManager:
             self.logger.info("スケジュールされたタスクを停止しました")
         except Exception as e:
             self.logger.error(f"スケジュールタスク実行中にエラーが発生: {e}")
+        finally:
+            if watcher:
+                watcher.stop(timeout=5)
+            self._stop_pipeline()
+            
+    def export_breathing_data(
+        self,
+        output,
+        device_id: str = None,
+        start_index: int = 0,
+        page_size: int = 100,
+        include_ipfs: bool = True
+    ) -> int:
+        """
+        呼吸データをJSONL形式で逐次書き出す
+        
+        Args:
+            output: 書き出し先のテキストストリーム
+            device_id: デバイスIDによる絞り込み
+            start_index: 書き出しを開始するチェーン上のインデックス
+            page_size: 1ページの件数
+            include_ipfs: IPFSの詳細データを含めるかどうか
             
+        Returns:
+            書き出した件数
+        """
+        count = 0
+        for data in self.blockchain_manager.iter_breathing_data(
+            start_index=start_index,
+            page_size=page_size,
+            device_id=device_id,
+            include_ipfs=include_ipfs
+        ):
+            output.write(json.dumps(data, ensure_ascii=False) + '\n')
+            count += 1
+            if count % page_size == 0:
+                output.flush()
+        output.flush()
+        self.logger.info(f"呼吸データを書き出しました: {count} 件")
+        return count
+        
     def test_connection(self) -> bool:
         """接続テスト"""
         try:
@@ -220,6 +512,8 @@ class BlockchainNodeManager:
             await self.blockchain_manager.monitor_analysis_server()
         except Exception as e:
             self.logger.error(f"分析サーバー監視中にエラーが発生: {e}")
+        finally:
+            await self.blockchain_manager.aclose()
             
     async def process_analysis_results(self, device_id: str = None, limit: int = 10):
         """分析結果の一括処理"""
@@ -231,22 +525,32 @@ class BlockchainNodeManager:
         except Exception as e:
             self.logger.error(f"一括処理中にエラーが発生: {e}")
             return []
+        finally:
+            await self.blockchain_manager.aclose()
 
 def main():
     parser = argparse.ArgumentParser(description="ブロックチェーンノードメインスクリプト")
     parser.add_argument("--config", type=str, default="config/blockchain_config.json",
                       help="設定ファイルのパス")
     parser.add_argument("--mode", type=str, 
-                      choices=["monitor", "process", "test", "analysis-monitor", "analysis-process"],
+                      choices=["monitor", "process", "test", "analysis-monitor", "analysis-process", "export"],
                       default="monitor", help="実行モード")
     parser.add_argument("--file", type=str, help="処理対象のファイル（processモード用）")
-    parser.add_argument("--device-id", type=str, help="デバイスID（analysis-processモード用）")
+    parser.add_argument("--device-id", type=str, help="デバイスID（analysis-process・exportモード用）")
     parser.add_argument("--limit", type=int, default=10, help="処理件数制限")
+    parser.add_argument("--output", type=str, help="書き出し先のJSONLファイル（exportモード用、省略時は標準出力）")
+    parser.add_argument("--start-index", type=int, default=0, help="書き出しを開始するインデックス（exportモード用）")
+    parser.add_argument("--page-size", type=int, default=100, help="1ページの件数（exportモード用）")
+    parser.add_argument("--no-ipfs", action="store_true", help="IPFSの詳細データを含めない（exportモード用）")
+    parser.add_argument("--profile", type=str, nargs="?", const="logs/profile.folded",
+                      help="サンプリングプロファイルをcollapsed stack形式で書き出す（省略時は logs/profile.folded）")
+    parser.add_argument("--profile-interval", type=float, default=0.005, help="プロファイルのサンプリング間隔（秒）")
     
     args = parser.parse_args()
     
     # ブロックチェーンノードマネージャーの初期化
-    manager = BlockchainNodeManager(args.config)
+    # 分析サーバー連携モードはIPFSへの保存もイベントループ上で行う
+    manager = BlockchainNodeManager(args.config, use_async_io=args.mode.startswith("analysis-"))
     
     # 接続テスト
     if not manager.test_connection():
@@ -254,24 +558,43 @@ def main():
         sys.exit(1)
     
     # モードに応じた実行
-    if args.mode == "monitor":
-        manager.run_scheduled_tasks()
-    elif args.mode == "process":
-        if not args.file:
-            print("エラー: processモードでは--fileが必要です")
-            sys.exit(1)
-        success = manager.process_analysis_file(args.file)
-        sys.exit(0 if success else 1)
-    elif args.mode == "test":
-        status = manager.get_blockchain_status()
-        print(json.dumps(status, indent=2))
-    elif args.mode == "analysis-monitor":
-        # 非同期実行
-        asyncio.run(manager.run_analysis_server_monitor())
-    elif args.mode == "analysis-process":
-        # 非同期実行
-        results = asyncio.run(manager.process_analysis_results(args.device_id, args.limit))
-        print(json.dumps(results, indent=2))
+    profiler = SamplingProfiler(args.profile, args.profile_interval) if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        if args.mode == "monitor":
+            manager.run_scheduled_tasks()
+        elif args.mode == "process":
+            if not args.file:
+                print("エラー: processモードでは--fileが必要です")
+                sys.exit(1)
+            success = manager.process_analysis_file(args.file)
+            sys.exit(0 if success else 1)
+        elif args.mode == "test":
+            status = manager.get_blockchain_status()
+            print(json.dumps(status, indent=2))
+        elif args.mode == "analysis-monitor":
+            # 非同期実行
+            asyncio.run(manager.run_analysis_server_monitor())
+        elif args.mode == "analysis-process":
+            # 非同期実行
+            results = asyncio.run(manager.process_analysis_results(args.device_id, args.limit))
+            print(json.dumps(results, indent=2))
+        elif args.mode == "export":
+            export_args = dict(
+                device_id=args.device_id,
+                start_index=args.start_index,
+                page_size=args.page_size,
+                include_ipfs=not args.no_ipfs
+            )
+            if args.output:
+                with open(args.output, 'w') as f:
+                    manager.export_breathing_data(f, **export_args)
+            else:
+                manager.export_breathing_data(sys.stdout, **export_args)
+    finally:
+        if profiler:
+            profiler.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
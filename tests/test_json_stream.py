@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from worker.json_stream import JsonArrayStreamParser, NdjsonStreamParser
+
+BODY = {
+    'count': 3,
+    'threshold': 3.5e10,
+    'results': [
+        {'device_id': 'd0', 'value': 35000000000.0, 'score': -1.25E-3},
+        {'device_id': 'd1', 'value': 12, 'ok': True, 'note': None},
+        7.5
+    ],
+    'next': None
+}
+
+
+def _feed_in_chunks(parser, data: bytes, size: int) -> list:
+    items = []
+    for start in range(0, len(data), size):
+        items.extend(parser.feed(data[start:start + size]))
+    items.extend(parser.close())
+    return items
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64])
+def test_object_body_split_at_every_chunk_boundary(size):
+    parser = JsonArrayStreamParser()
+    items = _feed_in_chunks(parser, json.dumps(BODY).encode('utf-8'), size)
+    assert items == BODY['results']
+    assert parser.fields == {'count': 3, 'threshold': 3.5e10, 'next': None}
+
+
+@pytest.mark.parametrize('first, second', [('3', '5000000000.0'), ('35000000000', '.0'), ('3.5', 'e10'), ('3.5e', '10')])
+def test_number_split_before_fraction_or_exponent(first, second):
+    parser = JsonArrayStreamParser()
+    items = parser.feed(f'[{first}'.encode('utf-8'))
+    items += parser.feed(f'{second}, 1]'.encode('utf-8'))
+    items += parser.close()
+    assert items == [float(first + second), 1]
+
+
+def test_truncated_body_is_rejected():
+    parser = JsonArrayStreamParser()
+    parser.feed(b'{"results": [{"a": 1}, 2.')
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_ndjson_split_inside_line():
+    parser = NdjsonStreamParser()
+    data = b'{"a": 1.5e3}\n{"b": 2}'
+    assert _feed_in_chunks(parser, data, 5) == [{'a': 1500.0}, {'b': 2}]
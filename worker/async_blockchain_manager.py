@@ -0,0 +1,315 @@
+import asyncio
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+from .blockchain_manager import BlockchainManager
+from .async_ipfs_client import AsyncIpfsClient
+from .payload_codec import decode_payload
+from .metrics import STAGE_DURATION, RECORDS_FAILED
+from .tracing import SPAN_KIND_CLIENT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBlockchainManager(BlockchainManager):
+    """IPFSへの保存・取得をイベントループ上で行うブロックチェーン管理クラス
+
+    分析サーバー監視のような非同期処理から使う。IPFSはaiohttpで直接呼び出し、
+    トランザクションの署名・送信は上限つきのスレッドプールで行うため、イベントループを止めない。
+    同期版のメソッドもそのまま利用できる。
+    """
+
+    def _setup_ipfs(self):
+        """IPFSクライアントの設定（非同期クライアントを追加）"""
+        super()._setup_ipfs()
+
+        ipfs_config = self.config.get('ipfs', {})
+        async_config = ipfs_config.get('async_client', {})
+        self.async_ipfs_client = AsyncIpfsClient(
+            ipfs_config.get('http_url', ipfs_config.get('api_url', '/ip4/ipfs/tcp/5001')),
+            timeout=ipfs_config.get('timeout', 30),
+            max_connections=async_config.get('max_connections', 10),
+            keepalive_timeout=async_config.get('keepalive_timeout', 30)
+        )
+
+    def _setup_ethereum(self):
+        """Ethereumクライアントの設定（送信用のスレッドプールを追加）"""
+        super()._setup_ethereum()
+
+        # web3の呼び出しと署名はブロッキングのため、同時実行数を絞ったスレッドで行う
+        self.ethereum_executor = ThreadPoolExecutor(
+            max_workers=self.config.get('ethereum', {}).get('submit_workers', 8),
+            thread_name_prefix='eth-submit'
+        )
+
+    async def asubmit_to_blockchain(self, ipfs_hash: str, timestamp: int, device_id: str) -> Tuple[str, Future]:
+        """
+        IPFSハッシュを記録するトランザクションを送信
+
+        Args:
+            ipfs_hash: IPFSハッシュ
+            timestamp: タイムスタンプ
+            device_id: デバイスID
+
+        Returns:
+            トランザクションハッシュと、確定時にレシート情報で解決されるFuture
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.ethereum_executor,
+            self.submit_to_blockchain,
+            ipfs_hash, timestamp, device_id
+        )
+
+    async def await_receipt(self, tx_hash: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        トランザクションの確定を待機
+
+        タイムアウトしても追跡自体は継続する。
+
+        Args:
+            tx_hash: トランザクションハッシュ
+            timeout: 待機時間（秒、Noneの場合は確定または破棄まで）
+
+        Returns:
+            レシート情報
+        """
+        future = self.get_receipt_future(tx_hash)
+        if future is None:
+            future = self.receipt_tracker.track(tx_hash)
+        # 待機側のキャンセルが追跡中のFutureに伝わらないようにする
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+
+    async def astore_to_blockchain(
+        self,
+        ipfs_hash: str,
+        timestamp: int,
+        device_id: str,
+        wait: bool = False
+    ) -> Dict[str, Any]:
+        """
+        IPFSハッシュをブロックチェーンに保存
+
+        Args:
+            ipfs_hash: IPFSハッシュ
+            timestamp: タイムスタンプ
+            device_id: デバイスID
+            wait: レシートの確定まで待機するかどうか
+
+        Returns:
+            トランザクション結果（待機しない場合はblock_numberがNoneのpending状態）
+        """
+        tx_hash, _ = await self.asubmit_to_blockchain(ipfs_hash, timestamp, device_id)
+
+        if not wait:
+            return {
+                'transaction_hash': tx_hash,
+                'block_number': None,
+                'gas_used': None,
+                'status': 'pending'
+            }
+
+        try:
+            result = await self.await_receipt(tx_hash)
+            logger.info(f"ブロックチェーンへの保存が成功しました: {result['transaction_hash']}")
+            return result
+        except Exception as e:
+            logger.error(f"ブロックチェーンへの保存に失敗: {e}")
+            raise
+
+    async def astore_to_ipfs(self, data: Dict[str, Any]) -> str:
+        """
+        データをIPFSに保存
+
+        Args:
+            data: 保存するデータ
+
+        Returns:
+            IPFSハッシュ
+        """
+        try:
+            with STAGE_DURATION.time(stage='ipfs_add'), self.tracer.span('ipfs.add', SPAN_KIND_CLIENT):
+                result = await self.async_ipfs_client.add(self.payload_codec.encode(data))
+            logger.info(f"データをIPFSに保存しました: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"IPFSへの保存に失敗: {e}")
+            raise
+
+    async def astore_many_to_ipfs(self, data_list: List[Dict[str, Any]]) -> List[str]:
+        """
+        複数のデータを1回の要求でIPFSに保存
+
+        Args:
+            data_list: 保存するデータのリスト
+
+        Returns:
+            入力と同じ順序のIPFSハッシュのリスト
+        """
+        try:
+            with STAGE_DURATION.time(stage='ipfs_add_batch'), \
+                    self.tracer.span('ipfs.add_batch', SPAN_KIND_CLIENT, batch_size=len(data_list)):
+                result = await self.async_ipfs_client.add_many([self.payload_codec.encode(data) for data in data_list])
+            logger.info(f"データをIPFSに一括保存しました: {len(result)} 件")
+            return result
+        except Exception as e:
+            logger.error(f"IPFSへの一括保存に失敗: {e}")
+            raise
+
+    async def aget_data_from_ipfs(self, ipfs_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        IPFSからデータを取得
+
+        Args:
+            ipfs_hash: IPFSハッシュ
+
+        Returns:
+            データ（見つからない場合はNone）
+        """
+        try:
+            data = self.ipfs_cache.get(ipfs_hash)
+            if data is not None:
+                return data
+
+            data = decode_payload(await self.async_ipfs_client.cat(ipfs_hash))
+            self.ipfs_cache.put(ipfs_hash, data)
+            return data
+        except Exception as e:
+            logger.error(f"IPFSからのデータ取得に失敗: {e}")
+            return None
+
+    async def _aupload_analyses(self, analysis_list: List[Dict[str, Any]]) -> Tuple[List[Any], List[str], List[int], List[str]]:
+        """
+        記録済みの解析結果を除き、残りをまとめてIPFSに保存
+
+        Args:
+            analysis_list: 呼吸解析データのリスト
+
+        Returns:
+            (記録済みのもの・失敗したものを埋めた処理結果, 正規化ハッシュ,
+             IPFSに保存した入力の位置, その位置と同じ順序のIPFSハッシュ) のタプル
+        """
+        outcomes, payload_hashes, pending = self._prepare_analyses(analysis_list)
+        if not pending:
+            return outcomes, payload_hashes, [], []
+
+        try:
+            with self.tracer.records(payload_hashes[index] for index in pending):
+                ipfs_hashes = await self.astore_many_to_ipfs([analysis_list[index] for index in pending])
+        except Exception as e:
+            RECORDS_FAILED.inc(len(pending), stage='ipfs')
+            for index in pending:
+                self.tracer.end_record(payload_hashes[index], e)
+                outcomes[index] = e
+            return outcomes, payload_hashes, [], []
+        return outcomes, payload_hashes, pending, ipfs_hashes
+
+    async def _aanchor_analysis(
+        self,
+        analysis_data: Dict[str, Any],
+        payload_hash: str,
+        ipfs_hash: str
+    ) -> Tuple[Dict[str, Any], Future]:
+        """
+        IPFSに保存済みの解析結果を送信用のスレッドでブロックチェーンに記録
+
+        Args:
+            analysis_data: 呼吸解析データ（blockchain_timestamp付与済み）
+            payload_hash: 解析結果の正規化ハッシュ
+            ipfs_hash: IPFSハッシュ
+
+        Returns:
+            処理結果と、チェーンへの記録完了時に解決されるFuture
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.ethereum_executor,
+            self._anchor_analysis,
+            analysis_data, payload_hash, ipfs_hash
+        )
+
+    async def _aprocess_breathing_analyses(
+        self,
+        analysis_list: List[Dict[str, Any]],
+        on_uploaded: Optional[Callable[[int, str], None]] = None
+    ) -> List[Any]:
+        """
+        複数の呼吸解析データをまとめて処理
+
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            on_uploaded: IPFSへの保存完了時に (入力の位置, IPFSハッシュ) を渡して呼び出すコールバック
+
+        Returns:
+            入力と同じ順序の (処理結果, Future) または失敗時の例外のリスト
+        """
+        outcomes, payload_hashes, pending, ipfs_hashes = await self._aupload_analyses(analysis_list)
+        if not pending:
+            return outcomes
+
+        # 署名とRPC呼び出しは送信用のスレッドで並行に行う
+        async def anchor(index: int, ipfs_hash: str):
+            try:
+                if on_uploaded:
+                    on_uploaded(index, ipfs_hash)
+                outcomes[index] = await self._aanchor_analysis(
+                    analysis_list[index], payload_hashes[index], ipfs_hash
+                )
+            except Exception as e:
+                logger.error(f"呼吸解析データ処理中にエラーが発生: {e}")
+                outcomes[index] = e
+
+        await asyncio.gather(*(anchor(index, ipfs_hash) for index, ipfs_hash in zip(pending, ipfs_hashes)))
+        logger.info(f"呼吸解析データの一括処理が完了しました: {len(analysis_list)} 件")
+        return outcomes
+
+    async def aprocess_work_queue(
+        self,
+        max_items: Optional[int] = None,
+        workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        作業キューの待機中項目を処理
+
+        複数のコルーチンで並行に取り出し、IPFSへの保存とトランザクションの送信を重ねる。
+
+        Args:
+            max_items: 処理する最大件数（Noneの場合は待機中をすべて処理）
+            workers: 並行数（Noneの場合は設定値）
+
+        Returns:
+            処理された結果のリスト
+        """
+        if workers is None:
+            workers = self.config.get('work_queue', {}).get('workers', 4)
+        bulk_size = max(1, self.config.get('work_queue', {}).get('bulk_size', 10))
+
+        processed_results = []
+        claimed = 0
+
+        async def drain():
+            nonlocal claimed
+            while True:
+                if max_items is not None and claimed >= max_items:
+                    return
+                limit = bulk_size if max_items is None else min(bulk_size, max_items - claimed)
+                claimed += limit
+                items = self.work_queue.claim(limit=limit)
+                if not items:
+                    return
+                outcomes = await self._aprocess_breathing_analyses(
+                    [item['payload'] for item in items],
+                    on_uploaded=lambda index, ipfs_hash: self.work_queue.mark_uploaded(items[index]['id'], ipfs_hash)
+                )
+                results = self._finish_work_items(items, outcomes)
+                processed_results.extend(result for result in results if result)
+
+        await asyncio.gather(*(drain() for _ in range(max(1, workers))))
+        return processed_results
+
+    async def aclose(self):
+        """非同期クライアントを含めてバックグラウンド処理を停止"""
+        await self.async_ipfs_client.close()
+        await super().aclose()
+        self.ethereum_executor.shutdown(wait=False)
@@ -0,0 +1,180 @@
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+from .ipfs_bulk import multiaddr_to_url, parse_add_response
+from .payload_codec import encode_json
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncIpfsClient:
+    """aiohttpでIPFS HTTP APIを呼び出す非同期クライアント
+
+    セッションは最初の呼び出し時に作成し、close()まで接続を使い回す。
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        timeout: float = 30,
+        max_connections: int = 10,
+        keepalive_timeout: float = 30
+    ):
+        """
+        非同期IPFSクライアントの初期化
+
+        Args:
+            api_url: IPFS APIのアドレス（multiaddrまたはURL）
+            timeout: 1回の要求全体のタイムアウト（秒）
+            max_connections: 同時接続数の上限
+            keepalive_timeout: 使用していない接続を保持する時間（秒）
+        """
+        self.base_url = multiaddr_to_url(api_url)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        """非同期コンテキストマネージャーの開始"""
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """非同期コンテキストマネージャーの終了"""
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """接続プール付きのセッションを取得（未作成または閉じている場合は作成）"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=self.keepalive_timeout
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self.session
+
+    async def _post(self, path: str, params: Optional[Dict[str, Any]] = None, data: Any = None) -> bytes:
+        """
+        APIを呼び出して応答本文を返す（IPFS HTTP APIはすべてPOST）
+
+        Args:
+            path: /api/v0 以下のパス
+            params: クエリパラメータ
+            data: 送信する本文（マルチパート）
+
+        Returns:
+            応答本文
+        """
+        url = f"{self.base_url}/api/v0/{path}"
+        async with self._get_session().post(url, params=params, data=data) as response:
+            body = await response.read()
+            if response.status != 200:
+                try:
+                    message = json.loads(body).get('Message', '')
+                except ValueError:
+                    message = body[:200].decode('utf-8', errors='replace')
+                raise RuntimeError(f"IPFS APIの呼び出しに失敗: {path}, ステータス {response.status}: {message}")
+            return body
+
+    async def add(self, payload: bytes, pin: bool = True) -> str:
+        """
+        バイト列を追加
+
+        Args:
+            payload: 追加するバイト列
+            pin: ピン留めするかどうか
+
+        Returns:
+            CID
+        """
+        return (await self.add_many([payload], pin=pin))[0]
+
+    async def add_json(self, data: Dict[str, Any], pin: bool = True) -> str:
+        """
+        JSONを追加（ipfshttpclientのadd_jsonと同じCIDになる）
+
+        Args:
+            data: 追加するデータ
+            pin: ピン留めするかどうか
+
+        Returns:
+            CID
+        """
+        return await self.add(encode_json(data), pin=pin)
+
+    async def add_many(self, payloads: List[bytes], pin: bool = True) -> List[str]:
+        """
+        複数のバイト列を1回のマルチパート要求で追加
+
+        Args:
+            payloads: 追加するバイト列のリスト
+            pin: ピン留めするかどうか
+
+        Returns:
+            入力と同じ順序のCIDのリスト
+        """
+        if not payloads:
+            return []
+
+        form = aiohttp.FormData()
+        for index, payload in enumerate(payloads):
+            form.add_field('file', payload, filename=f"{index}", content_type='application/octet-stream')
+        body = await self._post('add', params={'pin': 'true' if pin else 'false'}, data=form)
+        return parse_add_response(body.decode('utf-8'), len(payloads))
+
+    async def cat(self, cid: str) -> bytes:
+        """
+        CIDの内容を取得
+
+        Args:
+            cid: IPFSハッシュ
+
+        Returns:
+            内容のバイト列
+        """
+        return await self._post('cat', params={'arg': cid})
+
+    async def id(self) -> Dict[str, Any]:
+        """
+        IPFSノードの情報を取得
+
+        Returns:
+            ノードID・アドレスなどの情報
+        """
+        return json.loads(await self._post('id'))
+
+    async def pin_add(self, cid: str) -> List[str]:
+        """
+        CIDをピン留め
+
+        Args:
+            cid: IPFSハッシュ
+
+        Returns:
+            ピン留めされたCIDのリスト
+        """
+        return json.loads(await self._post('pin/add', params={'arg': cid})).get('Pins', [])
+
+    async def pin_rm(self, cid: str) -> List[str]:
+        """
+        CIDのピン留めを解除
+
+        Args:
+            cid: IPFSハッシュ
+
+        Returns:
+            解除されたCIDのリスト
+        """
+        return json.loads(await self._post('pin/rm', params={'arg': cid})).get('Pins', [])
+
+    async def close(self):
+        """セッションを閉じる"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
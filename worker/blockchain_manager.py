@@ -2,12 +2,38 @@ import json
 import os
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Set, Tuple, Callable, Iterator, AsyncIterator
 import ipfshttpclient
+import requests
+from requests.adapters import HTTPAdapter
 from web3 import Web3
 from web3.exceptions import ContractLogicError, ValidationError
 import asyncio
 from .http_client import AnalysisServerClient
+from .nonce_manager import is_nonce_error
+from .signer_pool import SignerPool, load_accounts, is_insufficient_funds_error
+from .receipt_tracker import ReceiptTracker
+from .fee_oracle import FeeOracle
+from .merkle_batcher import MerkleBatcher, ProofStore, BATCH_DEVICE_PREFIX, compute_root
+from .records import canonical_hash, record_timestamp, validate_analysis
+from .watermark_store import WatermarkStore
+from .poll_scheduler import AdaptivePollScheduler
+from .dedup_index import DedupIndex
+from .work_queue import WorkQueue, STATE_PENDING, STATE_CONFIRMED, STATE_FAILED
+from .chain_index import ChainIndex
+from .ipfs_cache import IpfsPayloadCache
+from .ipfs_bulk import IpfsBulkUploader
+from .payload_codec import PayloadCodec, decode_payload
+from .metrics import (
+    MetricsServer, STAGE_DURATION, RECORDS_PROCESSED, RECORDS_FAILED, RECORDS_DEDUPLICATED,
+    WORK_QUEUE_ITEMS, PENDING_TRANSACTIONS, DEVICE_LAG, DEVICE_POLL_INTERVAL, PIPELINE_ITEMS,
+    SIGNER_BALANCE, SIGNER_ACTIVE
+)
+from .pipeline import Pipeline, PipelineStage, StageHandler, Emit
+from .tracing import Tracer, OtlpJsonFileExporter, SPAN_KIND_CLIENT
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +49,16 @@ class BlockchainManager:
         """
         self.config = config
         self._setup_logging()
+        self._setup_tracing()
         self._setup_ipfs()
         self._setup_ethereum()
+        self._setup_batching()
+        self._setup_watermarks()
+        self._setup_polling()
+        self._setup_dedup()
+        self._setup_work_queue()
+        self._setup_chain_index()
+        self._setup_metrics()
         
     def _setup_logging(self):
         """ロギングの設定"""
@@ -50,6 +84,28 @@ class BlockchainManager:
             ipfs_api_url = self.config.get('ipfs', {}).get('api_url', '/ip4/ipfs/tcp/5001')
             self.ipfs_client = ipfshttpclient.connect(ipfs_api_url)
             logger.info(f"IPFSクライアントを初期化しました: {ipfs_api_url}")
+            
+            # ペイロードの符号化形式（既定は従来どおりのJSON）
+            payload_config = self.config.get('ipfs', {}).get('payload', {})
+            self.payload_codec = PayloadCodec(
+                codec=payload_config.get('codec', 'json'),
+                compression=payload_config.get('compression'),
+                level=payload_config.get('level', 3)
+            )
+            
+            # 複数レコードの一括保存はHTTP APIを直接呼び出す
+            self.ipfs_bulk_uploader = IpfsBulkUploader(
+                self.config.get('ipfs', {}).get('http_url', ipfs_api_url),
+                timeout=self.config.get('ipfs', {}).get('timeout', 30)
+            )
+            
+            # CIDの内容は不変のため、読み込んだペイロードは無効化なしでキャッシュする
+            cache_config = self.config.get('ipfs', {}).get('cache', {})
+            self.ipfs_cache = IpfsPayloadCache(
+                max_bytes=cache_config.get('max_bytes', 64 * 1024 * 1024),
+                disk_dir=cache_config.get('disk_dir'),
+                disk_max_bytes=cache_config.get('disk_max_bytes', 1024 * 1024 * 1024)
+            )
         except Exception as e:
             logger.error(f"IPFSクライアントの初期化に失敗: {e}")
             raise
@@ -60,20 +116,30 @@ class BlockchainManager:
             ethereum_config = self.config.get('ethereum', {})
             rpc_url = ethereum_config.get('rpc_url', 'http://localhost:8545')
             contract_address = ethereum_config.get('contract_address')
-            private_key = ethereum_config.get('private_key')
+            accounts = load_accounts(ethereum_config)
             
-            if not all([contract_address, private_key]):
+            if not contract_address or not accounts:
                 raise ValueError("コントラクトアドレスと秘密鍵が必要です")
                 
+            # 並行する送信・問い合わせでTCP接続を使い回すよう接続プールを広げる
+            pool_size = ethereum_config.get('http_pool_size', 20)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.rpc_session = requests.Session()
+            self.rpc_session.mount('http://', adapter)
+            self.rpc_session.mount('https://', adapter)
+            
             # Web3の初期化
-            self.w3 = Web3(Web3.HTTPProvider(rpc_url))
+            self.w3 = Web3(Web3.HTTPProvider(
+                rpc_url,
+                request_kwargs={'timeout': ethereum_config.get('request_timeout', 30)},
+                session=self.rpc_session
+            ))
             
             if not self.w3.is_connected():
                 raise ConnectionError("Ethereumノードに接続できません")
                 
             # コントラクトの設定
             self.contract_address = contract_address
-            self.private_key = private_key
             
             # コントラクトのABI（簡略化版）
             self.contract_abi = [
@@ -118,18 +184,229 @@ class BlockchainManager:
                 abi=self.contract_abi
             )
             
-            # アカウントの設定
-            self.account = self.w3.eth.account.from_key(private_key)
+            # 署名アカウントの設定（複数ある場合はデバイスIDごとに振り分ける）
+            signers_config = ethereum_config.get('signers', {})
+            self.signer_pool = SignerPool(
+                self.w3,
+                accounts,
+                virtual_nodes=signers_config.get('virtual_nodes', 64),
+                min_balance=signers_config.get('min_balance_wei', 0),
+                balance_check_interval=signers_config.get('balance_check_interval', 60)
+            )
+            self.account = self.signer_pool.primary.account
             self.w3.eth.default_account = self.account.address
             
+            # 署名に使うチェーンIDは起動時に1回だけ確認する
+            self.chain_id = self.w3.eth.chain_id
+            configured_chain_id = ethereum_config.get('chain_id')
+            if configured_chain_id is not None and configured_chain_id != self.chain_id:
+                logger.warning(f"設定のchain_id {configured_chain_id} がノードの値 {self.chain_id} と異なるため、ノードの値を使用します")
+                
+            # 手数料はブロックごと、ガス量は引数の形ごとにキャッシュし、送信時の問い合わせを省く
+            fee_config = ethereum_config.get('fee_oracle', {})
+            self.fee_oracle = FeeOracle(
+                self.w3,
+                mode=fee_config.get('mode', 'auto'),
+                poll_interval=fee_config.get('poll_interval', 1.0),
+                base_fee_multiplier=fee_config.get('base_fee_multiplier', 2.0),
+                priority_fee_per_gas=fee_config.get('priority_fee_per_gas', 1_500_000_000),
+                gas_price=ethereum_config.get('gas_price'),
+                gas_limit=ethereum_config.get('gas_limit', 3_000_000),
+                gas_multiplier=fee_config.get('gas_multiplier', 1.2)
+            )
+            self.fee_oracle.start()
+            
+            # nonceはアカウントごとにノード側で払い出し、送信ごとの問い合わせを省く
+            self.signer_pool.start()
+            
+            # レシートはバックグラウンドで一括確認する
+            tracker_config = ethereum_config.get('receipt_tracker', {})
+            self.receipt_tracker = ReceiptTracker(
+                self.w3,
+                rpc_url,
+                poll_interval=tracker_config.get('poll_interval', 1.0),
+                confirmations=tracker_config.get('confirmations', 1),
+                timeout=tracker_config.get('timeout', 600),
+                batch_size=tracker_config.get('batch_size', 100),
+                on_confirmed=self._on_transaction_confirmed,
+                on_dropped=self._on_transaction_dropped,
+                session=self.rpc_session
+            )
+            self.receipt_tracker.start()
+            
             logger.info(f"Ethereumクライアントを初期化しました: {rpc_url}")
             logger.info(f"コントラクトアドレス: {contract_address}")
-            logger.info(f"アカウントアドレス: {self.account.address}")
+            logger.info(f"アカウントアドレス: {', '.join(signer.address for signer in self.signer_pool.signers)}")
             
         except Exception as e:
             logger.error(f"Ethereumクライアントの初期化に失敗: {e}")
             raise
             
+    def _on_transaction_confirmed(self, tx):
+        """確定したトランザクションのnonceを送信元アカウントの送信中の集合から外す"""
+        signer = self.signer_pool.get(tx.sender)
+        if signer:
+            signer.nonce_manager.confirm(tx.nonce)
+            
+    def _on_transaction_dropped(self, tx):
+        """nonceが他のトランザクションで消費され破棄とみなしたトランザクションの送信元アカウントのnonceを再同期"""
+        signer = self.signer_pool.get(tx.sender)
+        if signer:
+            signer.nonce_manager.resync(dropped=tx.nonce)
+            
+    def _setup_batching(self):
+        """Merkleバッチモードの設定"""
+        batching_config = self.config.get('batching', {})
+        self.batcher = None
+        self.proof_store = None
+        
+        if not batching_config.get('enabled', False):
+            return
+            
+        self.proof_store = ProofStore(batching_config.get('proof_db', '/app/data/proofs.db'))
+        self.batcher = MerkleBatcher(
+            store_manifest=self.store_to_ipfs,
+            submit=self.submit_to_blockchain,
+            proof_store=self.proof_store,
+            max_records=batching_config.get('max_records', 100),
+            max_wait_seconds=batching_config.get('max_wait_seconds', 30),
+            on_submitted=self._on_batch_submitted
+        )
+        self.batcher.start()
+        
+    def _on_batch_submitted(self, ipfs_hashes: List[str], transaction_hash: str):
+        """バッチのトランザクションハッシュを作業項目に記録（再起動後の追跡の再開に使う）"""
+        if self.work_queue:
+            self.work_queue.mark_batch_submitted(ipfs_hashes, transaction_hash)
+        
+    def _setup_watermarks(self):
+        """デバイスごとのウォーターマークストアの設定"""
+        watermark_file = self.config.get('analysis_server', {}).get(
+            'watermark_file', '/app/data/watermarks.json'
+        )
+        self.watermark_store = WatermarkStore(watermark_file)
+        
+    def _setup_polling(self):
+        """分析サーバーへの問い合わせ間隔の設定"""
+        server_config = self.config.get('analysis_server', {})
+        adaptive_config = server_config.get('adaptive_polling', {})
+        long_poll_config = server_config.get('long_poll', {})
+        
+        # ロングポーリングに対応したサーバーでは結果がなくても待機時間まで応答が保留される
+        self.long_poll_wait = None
+        if long_poll_config.get('enabled', False):
+            self.long_poll_wait = long_poll_config.get('wait_seconds', 25)
+            
+        # デバイスごとの次回取得開始時刻（確定前でも取得済みの位置まで進める）
+        self.fetch_cursors: Dict[str, int] = {}
+        # パイプラインに渡した解析結果のうち、次回取得開始時刻と同時刻のものの正規化ハッシュ
+        self.fetch_cursor_keys: Dict[str, set] = {}
+        
+        # 監視サイクルをまたいで使い回す分析サーバークライアント
+        self.analysis_client = AnalysisServerClient(self.config) if 'analysis_server' in self.config else None
+        
+        self.poll_scheduler = None
+        if adaptive_config.get('enabled', True):
+            self.poll_scheduler = AdaptivePollScheduler(
+                base_interval=server_config.get('polling_interval', 60),
+                min_interval=adaptive_config.get('min_interval', 0),
+                max_interval=adaptive_config.get('max_interval', 300),
+                backoff_factor=adaptive_config.get('backoff_factor', 2.0),
+                jitter=adaptive_config.get('jitter', 0.2),
+                device_refresh_interval=adaptive_config.get('device_refresh_interval', 300),
+                long_poll_wait=self.long_poll_wait
+            )
+            
+    def _setup_dedup(self):
+        """重複排除インデックスの設定"""
+        dedup_config = self.config.get('dedup', {})
+        self.dedup_index = None
+        # 登録済みで未確定の解析結果の、記録完了時に解決されるFuture
+        self._dedup_pending: Dict[str, Future] = {}
+        
+        if not dedup_config.get('enabled', True):
+            return
+            
+        self.dedup_index = DedupIndex(
+            dedup_config.get('index_db', '/app/data/dedup.db'),
+            cache_size_mb=dedup_config.get('cache_size_mb', 64)
+        )
+        
+    def _setup_work_queue(self):
+        """永続作業キューの設定と前回終了時の処理途中項目の復旧"""
+        queue_config = self.config.get('work_queue', {})
+        self.work_queue = WorkQueue(
+            queue_config.get('db_path', '/app/data/work_queue.db'),
+            lease_seconds=queue_config.get('lease_seconds', 300),
+            max_attempts=queue_config.get('max_attempts', 3)
+        )
+        # パイプラインに渡して処理が終わっていない項目のID（リースを延長し続ける）
+        self._pipeline_items: Set[int] = set()
+        self._pipeline_items_lock = threading.Lock()
+        
+        for item in self.work_queue.recover():
+            if item['transaction_hash']:
+                # 送信済みのトランザクションはレシートの追跡から再開する
+                future = self.receipt_tracker.track(item['transaction_hash'])
+                future.add_done_callback(self._work_item_callback(item))
+                self._hold_dedup_pending(item['payload_hash'], future)
+            else:
+                # バッチのトランザクションを送信する前に終了した項目は重複排除の登録を取り消して再処理する
+                if self.dedup_index:
+                    self.dedup_index.remove(item['payload_hash'])
+                self.work_queue.requeue(item['id'])
+                
+        logger.info(f"作業キューを初期化しました: {self.work_queue.counts()}")
+        
+    def _setup_chain_index(self):
+        """チェーン上の呼吸データのローカルインデックスの設定"""
+        index_config = self.config.get('chain_index', {})
+        self.chain_index = ChainIndex(index_config.get('db_path', '/app/data/chain_index.db'))
+        
+    def _setup_metrics(self):
+        """メトリクスの設定（有効な場合は/metricsを公開）"""
+        WORK_QUEUE_ITEMS.set_function(
+            lambda: {(state,): count for state, count in self.work_queue.counts().items()}
+        )
+        PENDING_TRANSACTIONS.set_function(lambda: self.receipt_tracker.pending_count)
+        SIGNER_BALANCE.set_function(
+            lambda: {(address,): state['balance'] for address, state in self.signer_pool.snapshot().items()
+                     if state['balance'] is not None}
+        )
+        SIGNER_ACTIVE.set_function(
+            lambda: {(address,): int(state['active']) for address, state in self.signer_pool.snapshot().items()}
+        )
+        DEVICE_LAG.set_function(
+            lambda: {(device_id,): max(0, time.time() - timestamp)
+                     for device_id, timestamp in self.watermark_store.get_all().items()}
+        )
+        if self.poll_scheduler:
+            DEVICE_POLL_INTERVAL.set_function(
+                lambda: {(device_id,): interval for device_id, interval in self.poll_scheduler.intervals().items()}
+            )
+        
+        metrics_config = self.config.get('metrics', {})
+        self.metrics_server = None
+        if metrics_config.get('enabled', False):
+            self.metrics_server = MetricsServer(
+                host=metrics_config.get('host', '0.0.0.0'),
+                port=metrics_config.get('port', 9100)
+            )
+            self.metrics_server.start()
+            
+    def _setup_tracing(self):
+        """トレースの設定（有効な場合は解析結果ごとのスパンをOTLP JSONで書き出す）"""
+        tracing_config = self.config.get('tracing', {})
+        exporter = None
+        if tracing_config.get('enabled', False):
+            exporter = OtlpJsonFileExporter(
+                tracing_config.get('output', os.path.join(self.config.get('log_dir', '/app/logs'), 'traces.jsonl')),
+                service_name=tracing_config.get('service_name', 'csi-blockchain-node'),
+                flush_interval=tracing_config.get('flush_interval', 5.0)
+            )
+            logger.info(f"トレースの書き出しを開始しました: {exporter.path}")
+        self.tracer = Tracer(exporter)
+        
     def store_to_ipfs(self, data: Dict[str, Any]) -> str:
         """
         データをIPFSに保存
@@ -141,17 +418,45 @@ class BlockchainManager:
             IPFSハッシュ
         """
         try:
-            # JSONデータをIPFSに追加
-            result = self.ipfs_client.add_json(data)
+            with STAGE_DURATION.time(stage='ipfs_add'), self.tracer.span('ipfs.add', SPAN_KIND_CLIENT):
+                if self.payload_codec.is_plain_json:
+                    # JSONデータをIPFSに追加
+                    result = self.ipfs_client.add_json(data)
+                else:
+                    # 自己記述ヘッダー付きのバイト列として追加
+                    result = self.ipfs_client.add_bytes(self.payload_codec.encode(data))
             logger.info(f"データをIPFSに保存しました: {result}")
             return result
         except Exception as e:
             logger.error(f"IPFSへの保存に失敗: {e}")
             raise
             
-    def store_to_blockchain(self, ipfs_hash: str, timestamp: int, device_id: str) -> Dict[str, Any]:
+    def store_many_to_ipfs(self, data_list: List[Dict[str, Any]]) -> List[str]:
         """
-        IPFSハッシュをブロックチェーンに保存
+        複数のデータを1回の要求でIPFSに保存
+        
+        Args:
+            data_list: 保存するデータのリスト
+            
+        Returns:
+            入力と同じ順序のIPFSハッシュのリスト
+        """
+        if len(data_list) == 1:
+            return [self.store_to_ipfs(data_list[0])]
+            
+        try:
+            with STAGE_DURATION.time(stage='ipfs_add_batch'), \
+                    self.tracer.span('ipfs.add_batch', SPAN_KIND_CLIENT, batch_size=len(data_list)):
+                result = self.ipfs_bulk_uploader.add_many([self.payload_codec.encode(data) for data in data_list])
+            logger.info(f"データをIPFSに一括保存しました: {len(result)} 件")
+            return result
+        except Exception as e:
+            logger.error(f"IPFSへの一括保存に失敗: {e}")
+            raise
+            
+    def submit_to_blockchain(self, ipfs_hash: str, timestamp: int, device_id: str) -> Tuple[str, Future]:
+        """
+        IPFSハッシュを記録するトランザクションを送信
         
         Args:
             ipfs_hash: IPFSハッシュ
@@ -159,49 +464,192 @@ class BlockchainManager:
             device_id: デバイスID
             
         Returns:
-            トランザクション結果
+            トランザクションハッシュと、確定時にレシート情報で解決されるFuture
         """
+        # 同じデバイスの記録は同じアカウント（同じnonceの系列）から送信する
+        signer = self.signer_pool.select(device_id)
+        nonce_manager = signer.nonce_manager
+        nonce = nonce_manager.allocate()
+        
         try:
-            # トランザクションの構築
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-            gas_price = self.w3.eth.gas_price
-            
-            # トランザクションの作成
-            transaction = self.contract.functions.storeBreathingData(
+            function = self.contract.functions.storeBreathingData(
                 ipfs_hash,
                 timestamp,
                 device_id
-            ).build_transaction({
-                'from': self.account.address,
-                'nonce': nonce,
-                'gas': 200000,
-                'gasPrice': gas_price
-            })
+            )
+            
+            with STAGE_DURATION.time(stage='tx_build'), self.tracer.span('ethereum.tx_build'):
+                # ガス量は文字列引数の長さが同じ呼び出しで共有する
+                gas = self.fee_oracle.estimate_gas(
+                    ('storeBreathingData', len(ipfs_hash), len(device_id)),
+                    lambda: function.estimate_gas({'from': signer.address})
+                )
+                
+                # 必要なフィールドをすべて指定し、構築時のRPC呼び出しをなくす
+                transaction = function.build_transaction({
+                    'from': signer.address,
+                    'nonce': nonce,
+                    'gas': gas,
+                    'chainId': self.chain_id,
+                    **self.fee_oracle.fees()
+                })
             
             # トランザクションの署名
-            signed_txn = self.w3.eth.account.sign_transaction(
-                transaction,
-                self.private_key
-            )
+            with STAGE_DURATION.time(stage='tx_sign'), self.tracer.span('ethereum.tx_sign'):
+                signed_txn = self.w3.eth.account.sign_transaction(
+                    transaction,
+                    signer.key
+                )
             
             # トランザクションの送信
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            result = {
-                'transaction_hash': receipt['transactionHash'].hex(),
-                'block_number': receipt['blockNumber'],
-                'gas_used': receipt['gasUsed'],
-                'status': receipt['status']
+            with STAGE_DURATION.time(stage='tx_send'), self.tracer.span('ethereum.tx_send', SPAN_KIND_CLIENT, nonce=nonce):
+                tx_hash = Web3.to_hex(self.w3.eth.send_raw_transaction(signed_txn.rawTransaction))
+            
+        except Exception as e:
+            # 送信前に失敗したnonceは返却し、nonce不整合ならチェーンと再同期する
+            nonce_manager.release(nonce)
+            if is_nonce_error(e):
+                nonce_manager.resync()
+            elif is_insufficient_funds_error(e):
+                self.signer_pool.deactivate(signer.address)
+            logger.error(f"ブロックチェーンへの送信に失敗: {e}")
+            raise
+            
+        future = self.receipt_tracker.track(tx_hash, nonce=nonce, sender=signer.address)
+        sent_at = time.perf_counter()
+        
+        def observe_confirmation(done: Future):
+            if done.exception() is None:
+                STAGE_DURATION.observe(time.perf_counter() - sent_at, stage='confirmation')
+        future.add_done_callback(observe_confirmation)
+        self.tracer.follow(future, 'ethereum.confirmation', transaction_hash=tx_hash)
+        logger.info(f"トランザクションを送信しました: {tx_hash} ({signer.address} nonce {nonce})")
+        return tx_hash, future
+        
+    def store_to_blockchain(
+        self,
+        ipfs_hash: str,
+        timestamp: int,
+        device_id: str,
+        wait: bool = False
+    ) -> Dict[str, Any]:
+        """
+        IPFSハッシュをブロックチェーンに保存
+        
+        Args:
+            ipfs_hash: IPFSハッシュ
+            timestamp: タイムスタンプ
+            device_id: デバイスID
+            wait: レシートの確定まで待機するかどうか
+            
+        Returns:
+            トランザクション結果（待機しない場合はblock_numberがNoneのpending状態）
+        """
+        tx_hash, future = self.submit_to_blockchain(ipfs_hash, timestamp, device_id)
+        
+        if not wait:
+            return {
+                'transaction_hash': tx_hash,
+                'block_number': None,
+                'gas_used': None,
+                'status': 'pending'
             }
             
+        try:
+            result = future.result()
             logger.info(f"ブロックチェーンへの保存が成功しました: {result['transaction_hash']}")
             return result
-            
         except Exception as e:
             logger.error(f"ブロックチェーンへの保存に失敗: {e}")
             raise
             
+    def get_receipt_future(self, tx_hash: str) -> Optional[Future]:
+        """
+        確定待ちトランザクションのFutureを取得
+        
+        Args:
+            tx_hash: トランザクションハッシュ
+            
+        Returns:
+            確定待ちであればFuture、追跡対象外であればNone
+        """
+        pending = self.receipt_tracker.get(tx_hash)
+        return pending.future if pending else None
+        
+    def verify_record(self, ipfs_hash: str) -> bool:
+        """
+        バッチ記録されたレコードをチェーン上のMerkleルートと照合
+        
+        Args:
+            ipfs_hash: レコードのIPFSハッシュ
+            
+        Returns:
+            包含証明がチェーンに記録されたルートと一致するかどうか
+        """
+        if not self.proof_store:
+            logger.error("Merkleバッチモードが無効です")
+            return False
+            
+        try:
+            proof = self.proof_store.get(ipfs_hash)
+            if not proof:
+                logger.error(f"包含証明が見つかりません: {ipfs_hash}")
+                return False
+                
+            if compute_root(ipfs_hash, proof['proof']) != proof['merkle_root']:
+                logger.error(f"包含証明がルートと一致しません: {ipfs_hash}")
+                return False
+                
+            # チェーン上のトランザクションに記録されたルートと照合
+            receipt = self.w3.eth.get_transaction_receipt(proof['transaction_hash'])
+            if receipt is None or receipt['status'] != 1:
+                logger.error(f"バッチのトランザクションが確定していません: {proof['transaction_hash']}")
+                return False
+                
+            transaction = self.w3.eth.get_transaction(proof['transaction_hash'])
+            _, params = self.contract.decode_function_input(transaction['input'])
+            anchored = (
+                params['ipfsHash'] == proof['manifest_cid']
+                and params['deviceId'] == f"{BATCH_DEVICE_PREFIX}{proof['merkle_root']}"
+            )
+            if not anchored:
+                logger.error(f"チェーン上のルートと一致しません: {ipfs_hash}")
+            return anchored
+            
+        except Exception as e:
+            logger.error(f"レコードの検証に失敗: {e}")
+            return False
+            
+    def close(self):
+        """バックグラウンド処理の停止"""
+        if self.batcher:
+            self.batcher.stop(timeout=5)
+            # 送信済みのバッチのレシートを追跡し終えてから追跡を止める
+            drain_timeout = self.config.get('batching', {}).get('drain_timeout', 60)
+            if not self.batcher.wait_settled(timeout=drain_timeout):
+                logger.warning(f"確定待ちのMerkleバッチを残して停止します（{drain_timeout}秒経過）")
+        self.receipt_tracker.stop(timeout=5)
+        self.fee_oracle.stop(timeout=5)
+        self.signer_pool.stop(timeout=5)
+        self.tracer.shutdown()
+        self.rpc_session.close()
+        self.ipfs_bulk_uploader.close()
+        if self.proof_store:
+            self.proof_store.close()
+        if self.dedup_index:
+            self.dedup_index.close()
+        self.work_queue.close()
+        self.chain_index.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+            
+    async def aclose(self):
+        """分析サーバークライアントを閉じてからバックグラウンド処理を停止"""
+        if self.analysis_client:
+            await self.analysis_client.close()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close)
+        
     def get_breathing_data_count(self) -> int:
         """
         保存されている呼吸データの数を取得
@@ -248,7 +696,13 @@ class BlockchainManager:
             データ（見つからない場合はNone）
         """
         try:
-            data = self.ipfs_client.get_json(ipfs_hash)
+            data = self.ipfs_cache.get(ipfs_hash)
+            if data is not None:
+                return data
+                
+            # 符号化形式はヘッダーから判別する（ヘッダーなしは従来のJSON）
+            data = decode_payload(self.ipfs_client.cat(ipfs_hash))
+            self.ipfs_cache.put(ipfs_hash, data)
             return data
         except Exception as e:
             logger.error(f"IPFSからのデータ取得に失敗: {e}")
@@ -264,29 +718,49 @@ class BlockchainManager:
         Returns:
             処理結果
         """
+        result, _ = self._process_breathing_analysis(analysis_data)
+        return result
+        
+    def _process_breathing_analysis(
+        self,
+        analysis_data: Dict[str, Any],
+        on_uploaded: Optional[Callable[[str], None]] = None
+    ) -> Tuple[Dict[str, Any], Future]:
+        """
+        呼吸解析データの処理とブロックチェーンへの保存
+        
+        Args:
+            analysis_data: 呼吸解析データ
+            on_uploaded: IPFSへの保存完了時にIPFSハッシュを渡して呼び出すコールバック
+            
+        Returns:
+            処理結果と、チェーンへの記録完了時に解決されるFuture
+        """
         try:
-            logger.info(f"呼吸解析データの処理を開始: デバイスID {analysis_data.get('metadata', {}).get('device_id', 'unknown')}")
+            logger.info(f"呼吸解析データの処理を開始: デバイスID {(analysis_data.get('metadata') or {}).get('device_id', 'unknown')}")
             
+            # 記録済みの解析結果であれば以前の結果を返す
+            payload_hash = canonical_hash(analysis_data)
+            duplicate = self._find_duplicate(payload_hash)
+            if duplicate:
+                return duplicate
+                
             # タイムスタンプの追加
             analysis_data['blockchain_timestamp'] = int(datetime.now().timestamp())
             
             # IPFSに保存
-            ipfs_hash = self.store_to_ipfs(analysis_data)
-            
-            # ブロックチェーンに保存
-            receipt = self.store_to_blockchain(
-                ipfs_hash,
-                analysis_data['blockchain_timestamp'],
-                analysis_data['metadata']['device_id']
-            )
-            
-            result = {
-                'ipfs_hash': ipfs_hash,
-                'transaction_hash': receipt['transaction_hash'],
-                'block_number': receipt['block_number'],
-                'timestamp': analysis_data['blockchain_timestamp']
-            }
-            
+            self.tracer.start_record(payload_hash, device_id=(analysis_data.get('metadata') or {}).get('device_id'))
+            try:
+                with self.tracer.records([payload_hash]):
+                    ipfs_hash = self.store_to_ipfs(analysis_data)
+            except Exception as e:
+                RECORDS_FAILED.inc(stage='ipfs')
+                self.tracer.end_record(payload_hash, e)
+                raise
+            if on_uploaded:
+                on_uploaded(ipfs_hash)
+                
+            result = self._anchor_analysis(analysis_data, payload_hash, ipfs_hash)
             logger.info(f"呼吸解析データの処理が完了しました")
             return result
             
@@ -294,95 +768,1301 @@ class BlockchainManager:
             logger.error(f"呼吸解析データ処理中にエラーが発生: {e}")
             raise
             
+    def process_breathing_analyses(self, analysis_list: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        複数の呼吸解析データをまとめて処理
+        
+        IPFSへの保存を1回の要求にまとめ、その後それぞれをブロックチェーンに記録する。
+        
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            
+        Returns:
+            入力と同じ順序の処理結果（失敗したものはNone）
+        """
+        outcomes = self._process_breathing_analyses(analysis_list)
+        return [None if isinstance(outcome, Exception) else outcome[0] for outcome in outcomes]
+        
+    def _process_breathing_analyses(
+        self,
+        analysis_list: List[Dict[str, Any]],
+        on_uploaded: Optional[Callable[[int, str], None]] = None
+    ) -> List[Any]:
+        """
+        複数の呼吸解析データをまとめて処理
+        
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            on_uploaded: IPFSへの保存完了時に (入力の位置, IPFSハッシュ) を渡して呼び出すコールバック
+            
+        Returns:
+            入力と同じ順序の (処理結果, Future) または失敗時の例外のリスト
+        """
+        outcomes, payload_hashes, pending, ipfs_hashes = self._upload_analyses(analysis_list)
+        if pending:
+            self._anchor_analyses(analysis_list, payload_hashes, pending, ipfs_hashes, outcomes, on_uploaded)
+        return outcomes
+        
+    def _upload_analyses(self, analysis_list: List[Dict[str, Any]]) -> Tuple[List[Any], List[str], List[int], List[str]]:
+        """
+        記録済みの解析結果を除き、残りをまとめてIPFSに保存
+        
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            
+        Returns:
+            (記録済みのもの・失敗したものを埋めた処理結果, 正規化ハッシュ,
+             IPFSに保存した入力の位置, その位置と同じ順序のIPFSハッシュ) のタプル
+        """
+        outcomes, payload_hashes, pending = self._prepare_analyses(analysis_list)
+        if not pending:
+            return outcomes, payload_hashes, [], []
+            
+        try:
+            with self.tracer.records(payload_hashes[index] for index in pending):
+                ipfs_hashes = self.store_many_to_ipfs([analysis_list[index] for index in pending])
+        except Exception as e:
+            RECORDS_FAILED.inc(len(pending), stage='ipfs')
+            for index in pending:
+                self.tracer.end_record(payload_hashes[index], e)
+                outcomes[index] = e
+            return outcomes, payload_hashes, [], []
+        return outcomes, payload_hashes, pending, ipfs_hashes
+        
+    async def _aupload_analyses(self, analysis_list: List[Dict[str, Any]]) -> Tuple[List[Any], List[str], List[int], List[str]]:
+        """
+        記録済みの解析結果を除き、残りをまとめてIPFSに保存（イベントループを止めない）
+        
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            
+        Returns:
+            _upload_analyses と同じタプル
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._upload_analyses, analysis_list)
+        
+    async def _aanchor_analysis(
+        self,
+        analysis_data: Dict[str, Any],
+        payload_hash: str,
+        ipfs_hash: str
+    ) -> Tuple[Dict[str, Any], Future]:
+        """
+        IPFSに保存済みの解析結果をブロックチェーンに記録（イベントループを止めない）
+        
+        Args:
+            analysis_data: 呼吸解析データ（blockchain_timestamp付与済み）
+            payload_hash: 解析結果の正規化ハッシュ
+            ipfs_hash: IPFSハッシュ
+            
+        Returns:
+            処理結果と、チェーンへの記録完了時に解決されるFuture
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._anchor_analysis, analysis_data, payload_hash, ipfs_hash)
+        
+    def _prepare_analyses(self, analysis_list: List[Dict[str, Any]]) -> Tuple[List[Any], List[str], List[int]]:
+        """
+        記録済みの解析結果を除き、IPFSに保存するものにタイムスタンプを付与
+        
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            
+        Returns:
+            (記録済みのものだけを埋めた処理結果, 正規化ハッシュ, IPFSに保存する入力の位置) のタプル
+        """
+        outcomes: List[Any] = [None] * len(analysis_list)
+        payload_hashes = [canonical_hash(analysis_data) for analysis_data in analysis_list]
+        
+        pending = []
+        for index, payload_hash in enumerate(payload_hashes):
+            duplicate = self._find_duplicate(payload_hash)
+            if duplicate:
+                outcomes[index] = duplicate
+            else:
+                analysis_list[index]['blockchain_timestamp'] = int(datetime.now().timestamp())
+                self.tracer.start_record(
+                    payload_hash,
+                    device_id=(analysis_list[index].get('metadata') or {}).get('device_id')
+                )
+                pending.append(index)
+        return outcomes, payload_hashes, pending
+        
+    def _anchor_analyses(
+        self,
+        analysis_list: List[Dict[str, Any]],
+        payload_hashes: List[str],
+        pending: List[int],
+        ipfs_hashes: List[str],
+        outcomes: List[Any],
+        on_uploaded: Optional[Callable[[int, str], None]] = None
+    ):
+        """
+        IPFSに保存済みの複数の解析結果をブロックチェーンに記録し、処理結果を埋める
+        
+        Args:
+            analysis_list: 呼吸解析データのリスト
+            payload_hashes: 正規化ハッシュのリスト
+            pending: IPFSに保存した入力の位置
+            ipfs_hashes: pendingと同じ順序のIPFSハッシュ
+            outcomes: 処理結果のリスト（この関数で更新する）
+            on_uploaded: (入力の位置, IPFSハッシュ) を渡して呼び出すコールバック
+        """
+        for index, ipfs_hash in zip(pending, ipfs_hashes):
+            try:
+                if on_uploaded:
+                    on_uploaded(index, ipfs_hash)
+                outcomes[index] = self._anchor_analysis(analysis_list[index], payload_hashes[index], ipfs_hash)
+            except Exception as e:
+                logger.error(f"呼吸解析データ処理中にエラーが発生: {e}")
+                outcomes[index] = e
+                
+        logger.info(f"呼吸解析データの一括処理が完了しました: {len(analysis_list)} 件")
+        
+    def _find_duplicate(self, payload_hash: str) -> Optional[Tuple[Dict[str, Any], Future]]:
+        """
+        記録済みの解析結果を重複排除インデックスから検索
+        
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ
+            
+        Returns:
+            記録済みであれば以前の処理結果と、以前の記録の完了時に解決されるFuture
+            （確定済みであれば解決済み、確定前であれば以前の記録が失敗すると例外）、未記録であればNone
+        """
+        if not self.dedup_index:
+            return None
+        existing = self.dedup_index.get(payload_hash)
+        if not existing:
+            return None
+            
+        RECORDS_DEDUPLICATED.inc()
+        self.tracer.end_record(payload_hash, deduplicated=True)
+        logger.info(f"記録済みの解析結果のため処理を省略しました: {existing['ipfs_hash']}")
+        # 登録は送信時に行うため、確定前であれば以前の記録の結果を待つ
+        anchored = self._dedup_pending.get(payload_hash)
+        if anchored is None:
+            anchored = Future()
+            anchored.set_result(existing)
+        return {
+            'ipfs_hash': existing['ipfs_hash'],
+            'transaction_hash': existing['transaction_hash'],
+            'block_number': None,
+            'timestamp': existing['timestamp'],
+            'deduplicated': True
+        }, anchored
+        
+    def _anchor_analysis(
+        self,
+        analysis_data: Dict[str, Any],
+        payload_hash: str,
+        ipfs_hash: str
+    ) -> Tuple[Dict[str, Any], Future]:
+        """
+        IPFSに保存済みの解析結果をブロックチェーンに記録
+        
+        Args:
+            analysis_data: 呼吸解析データ（blockchain_timestamp付与済み）
+            payload_hash: 解析結果の正規化ハッシュ
+            ipfs_hash: IPFSハッシュ
+            
+        Returns:
+            処理結果と、チェーンへの記録完了時に解決されるFuture
+        """
+        timestamp = analysis_data['blockchain_timestamp']
+        device_id = analysis_data['metadata']['device_id']
+        
+        # バッチモードではMerkleルートとしてまとめて記録する
+        if self.batcher:
+            anchored = self.batcher.add(ipfs_hash, device_id, timestamp)
+            anchored.add_done_callback(self._count_anchored)
+            self.tracer.end_record_on(payload_hash, anchored, ipfs_hash=ipfs_hash, batched=True)
+            self._register_dedup(payload_hash, ipfs_hash, None, timestamp, anchored)
+            logger.info(f"呼吸解析データをバッチに追加しました: {ipfs_hash}")
+            return {
+                'ipfs_hash': ipfs_hash,
+                'transaction_hash': None,
+                'block_number': None,
+                'timestamp': timestamp,
+                'batched': True
+            }, anchored
+            
+        # ブロックチェーンに保存
+        try:
+            with self.tracer.records([payload_hash]):
+                tx_hash, anchored = self.submit_to_blockchain(ipfs_hash, timestamp, device_id)
+        except Exception as e:
+            RECORDS_FAILED.inc(stage='submit')
+            self.tracer.end_record(payload_hash, e)
+            raise
+        anchored.add_done_callback(self._count_anchored)
+        self.tracer.end_record_on(payload_hash, anchored, ipfs_hash=ipfs_hash, transaction_hash=tx_hash)
+        self._register_dedup(payload_hash, ipfs_hash, tx_hash, timestamp, anchored)
+        
+        return {
+            'ipfs_hash': ipfs_hash,
+            'transaction_hash': tx_hash,
+            'block_number': None,
+            'timestamp': timestamp
+        }, anchored
+        
+    @staticmethod
+    def _count_anchored(future: Future):
+        """チェーンへの記録の確定・失敗を件数に反映"""
+        if future.exception() is None:
+            RECORDS_PROCESSED.inc()
+        else:
+            RECORDS_FAILED.inc(stage='confirm')
+            
+    def sync_chain_index(self) -> int:
+        """
+        ローカルインデックスにチェーン上の新しいレコードを取り込む
+        
+        Returns:
+            新たに取り込んだレコード数
+        """
+        index_config = self.config.get('chain_index', {})
+        return self.chain_index.sync(
+            self.get_breathing_data_count,
+            self.get_breathing_data,
+            batch_size=index_config.get('sync_batch_size', 100),
+            workers=index_config.get('sync_workers', 8),
+            expand_batch=self._expand_batch_record if index_config.get('expand_batches', True) else None
+        )
+        
+    def _expand_batch_record(self, record: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Merkleバッチのレコードからマニフェストに含まれるレコードを取得
+        
+        Args:
+            record: チェーン上のレコード
+            
+        Returns:
+            バッチに含まれるレコードのリスト（バッチでない場合は空、マニフェストを取得できない場合はNone）
+        """
+        if not record['device_id'].startswith(BATCH_DEVICE_PREFIX):
+            return []
+        manifest = self.get_data_from_ipfs(record['ipfs_hash'])
+        if not manifest:
+            logger.warning(f"バッチマニフェストを取得できませんでした（次回の同期で再試行します）: {record['ipfs_hash']}")
+            return None
+        return [
+            {
+                'ipfs_hash': entry['cid'],
+                'merkle_root': manifest['merkle_root'],
+                'timestamp': entry['timestamp'],
+                'device_id': entry['device_id']
+            }
+            for entry in manifest.get('records', [])
+        ]
+        
+    def query_breathing_data(
+        self,
+        device_id: Optional[str] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        limit: Optional[int] = None,
+        sync: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        ローカルインデックスから呼吸データを検索
+        
+        Args:
+            device_id: デバイスID
+            start_time: 開始時刻（UNIXタイムスタンプ）
+            end_time: 終了時刻（UNIXタイムスタンプ）
+            limit: 取得件数制限
+            sync: 検索前にチェーンとの差分を同期するかどうか
+            
+        Returns:
+            呼吸データ一覧（IPFSの詳細データは含まない）
+        """
+        if sync:
+            try:
+                self.sync_chain_index()
+            except Exception as e:
+                logger.error(f"チェーンインデックスの同期に失敗: {e}")
+        return self.chain_index.query(device_id, start_time, end_time, limit)
+        
+    def iter_breathing_data(
+        self,
+        start_index: int = 0,
+        page_size: int = 100,
+        device_id: Optional[str] = None,
+        include_ipfs: bool = True,
+        sync: bool = True
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        呼吸データをページ単位で順に取得するイテレーター
+        
+        ページごとにローカルインデックスを検索するため、メモリ使用量は
+        チェーンの履歴長によらず1ページ分に収まる。
+        
+        Args:
+            start_index: 取得を開始するチェーン上のインデックス
+            page_size: 1ページの件数
+            device_id: デバイスIDによる絞り込み
+            include_ipfs: IPFSの詳細データを含めるかどうか
+            sync: 取得前にチェーンとの差分を同期するかどうか
+            
+        Yields:
+            呼吸データ
+        """
+        if sync:
+            try:
+                self.sync_chain_index()
+            except Exception as e:
+                logger.error(f"チェーンインデックスの同期に失敗: {e}")
+                
+        # (インデックス, IPFSハッシュ) のキーでページを送る
+        cursor = (start_index, '')
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix='ipfs-fetch') as executor:
+            while True:
+                page = self.chain_index.query(device_id=device_id, limit=page_size, after=cursor)
+                if not page:
+                    return
+                    
+                if include_ipfs:
+                    # ページ内のIPFS取得は並列に行う
+                    for data, ipfs_data in zip(page, executor.map(lambda d: self.get_data_from_ipfs(d['ipfs_hash']), page)):
+                        if ipfs_data:
+                            data['analysis_data'] = ipfs_data
+                            
+                yield from page
+                
+                if len(page) < page_size:
+                    return
+                cursor = (page[-1]['chain_index'], page[-1]['ipfs_hash'])
+                
+    async def aiter_breathing_data(
+        self,
+        start_index: int = 0,
+        page_size: int = 100,
+        device_id: Optional[str] = None,
+        include_ipfs: bool = True,
+        sync: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        呼吸データをページ単位で順に取得する非同期イテレーター
+        
+        ページの取得はスレッドで行い、イベントループを止めない。
+        
+        Args:
+            start_index: 取得を開始するチェーン上のインデックス
+            page_size: 1ページの件数
+            device_id: デバイスIDによる絞り込み
+            include_ipfs: IPFSの詳細データを含めるかどうか
+            sync: 取得前にチェーンとの差分を同期するかどうか
+            
+        Yields:
+            呼吸データ
+        """
+        loop = asyncio.get_running_loop()
+        iterator = self.iter_breathing_data(start_index, page_size, device_id, include_ipfs, sync)
+        sentinel = object()
+        while True:
+            data = await loop.run_in_executor(None, next, iterator, sentinel)
+            if data is sentinel:
+                return
+            yield data
+            
     def get_all_breathing_data(self) -> List[Dict[str, Any]]:
         """
         すべての呼吸データを取得
         
+        履歴が長い場合はiter_breathing_dataを使用すること。
+        
         Returns:
             呼吸データ一覧
         """
         try:
-            count = self.get_breathing_data_count()
-            data_list = []
-            
-            for i in range(count):
-                data = self.get_breathing_data(i)
-                if data:
-                    # IPFSから詳細データを取得
-                    ipfs_data = self.get_data_from_ipfs(data['ipfs_hash'])
-                    if ipfs_data:
-                        data['analysis_data'] = ipfs_data
-                    data_list.append(data)
-                    
-            return data_list
+            return list(self.iter_breathing_data())
             
         except Exception as e:
             logger.error(f"全呼吸データの取得に失敗: {e}")
             return []
             
-    async def fetch_and_process_analysis_results(self) -> List[Dict[str, Any]]:
+    def _register_dedup(
+        self,
+        payload_hash: str,
+        ipfs_hash: str,
+        tx_hash: Optional[str],
+        timestamp: int,
+        anchored: Future
+    ):
         """
-        分析サーバーから結果を取得してブロックチェーンに保存
+        送信済みの解析結果を重複排除インデックスに登録
+        
+        記録に失敗した場合は再送できるよう登録を取り消す。
+        """
+        if not self.dedup_index:
+            return
+            
+        self.dedup_index.put(payload_hash, ipfs_hash, tx_hash, timestamp)
         
+        def callback(future: Future):
+            try:
+                if future.exception() is not None:
+                    self.dedup_index.remove(payload_hash)
+                elif tx_hash is None:
+                    self.dedup_index.update_transaction(payload_hash, future.result()['transaction_hash'])
+            except Exception as e:
+                logger.error(f"重複排除インデックスの更新に失敗: {e}")
+        anchored.add_done_callback(callback)
+        # 登録の取り消し・更新の後に確定前の扱いを外す
+        self._hold_dedup_pending(payload_hash, anchored)
+        
+    def _hold_dedup_pending(self, payload_hash: str, anchored: Future):
+        """重複排除インデックスに登録した解析結果を、記録が完了するまで確定前として扱う"""
+        if not self.dedup_index:
+            return
+        self._dedup_pending[payload_hash] = anchored
+        
+        def release(future: Future):
+            if self._dedup_pending.get(payload_hash) is future:
+                self._dedup_pending.pop(payload_hash, None)
+        anchored.add_done_callback(release)
+        
+    def _record_timestamp(self, record: Dict[str, Any]) -> int:
+        """解析結果の生成時刻（取得できない場合は0）"""
+        field = self.config.get('analysis_server', {}).get('timestamp_field', 'timestamp')
+        return record_timestamp(record, field) or 0
+        
+    def enqueue_analysis(
+        self,
+        analysis_data: Dict[str, Any],
+        source: str,
+        source_ref: Optional[str] = None,
+        retry_failed: bool = False
+    ) -> str:
+        """
+        解析結果を作業キューに追加
+        
+        Args:
+            analysis_data: 呼吸解析データ
+            source: 取り込み元（'file' または 'analysis_server'）
+            source_ref: 取り込み元の参照（ファイルパスなど）
+            retry_failed: 同一の解析結果がfailed状態であれば再試行待ちに戻すかどうか
+            
+        Returns:
+            'queued'（追加した）、'requeued'（failed状態から戻した）、'duplicate'（同一の解析結果が既にある）のいずれか
+        """
+        payload_hash = canonical_hash(analysis_data)
+        device_id = (analysis_data.get('metadata') or {}).get('device_id')
+        enqueued = self.work_queue.enqueue(
+            analysis_data,
+            payload_hash,
+            source,
+            source_ref=source_ref,
+            device_id=device_id,
+            record_timestamp=self._record_timestamp(analysis_data),
+            retry_failed=retry_failed
+        )
+        if enqueued != 'duplicate':
+            # 取り込みから確定までを1つのトレースにする
+            self.tracer.start_record(payload_hash, device_id=device_id, source=source)
+        return enqueued
+        
+    def process_work_queue(
+        self,
+        max_items: Optional[int] = None,
+        workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        作業キューの待機中項目を処理
+        
+        複数のワーカーで並行に処理し、IPFSへの保存とトランザクションの送信を重ねる。
+        nonceは送信アカウントごとのNonceManagerが排他的に払い出す。
+        
+        Args:
+            max_items: 処理する最大件数（Noneの場合は待機中をすべて処理）
+            workers: ワーカー数（Noneの場合は設定値）
+            
         Returns:
             処理された結果のリスト
         """
-        try:
-            async with AnalysisServerClient(self.config) as client:
-                # 分析サーバーのヘルスチェック
-                if not await client.health_check():
-                    logger.error("分析サーバーが利用できません")
-                    return []
+        if workers is None:
+            workers = self.config.get('work_queue', {}).get('workers', 4)
+        # 1回の取り出しでまとめてIPFSに保存する件数
+        bulk_size = max(1, self.config.get('work_queue', {}).get('bulk_size', 10))
+            
+        processed_results = []
+        lock = threading.Lock()
+        claimed = 0
+        
+        def drain():
+            nonlocal claimed
+            while True:
+                with lock:
+                    if max_items is not None and claimed >= max_items:
+                        return
+                    limit = bulk_size if max_items is None else min(bulk_size, max_items - claimed)
+                    claimed += limit
+                items = self.work_queue.claim(limit=limit)
+                if not items:
+                    return
+                if len(items) == 1:
+                    results = [self._process_work_item(items[0])]
+                else:
+                    results = self._process_work_items(items)
+                with lock:
+                    processed_results.extend(result for result in results if result)
+                        
+        if workers <= 1:
+            drain()
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='work-queue') as executor:
+                for future in [executor.submit(drain) for _ in range(workers)]:
+                    future.result()
                     
-                # 全デバイスの最新結果を取得
-                all_results = await client.get_all_devices_results(
-                    limit_per_device=self.config['analysis_server']['batch_size']
-                )
+        return processed_results
+        
+    async def aprocess_work_queue(
+        self,
+        max_items: Optional[int] = None,
+        workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        作業キューの待機中項目をイベントループを止めずに処理
+        
+        Args:
+            max_items: 処理する最大件数（Noneの場合は待機中をすべて処理）
+            workers: ワーカー数（Noneの場合は設定値）
+            
+        Returns:
+            処理された結果のリスト
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.process_work_queue, max_items, workers)
+        
+    def process_queued_analysis(self, payload_hash: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        作業キューにある指定の解析結果だけを処理し、チェーンへの記録の確定・失敗まで待機
+        
+        他の処理が取り出し済みの場合は、その処理の結果を待つ。
+        
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ
+            timeout: 待機時間（秒、Noneの場合はレシート追跡のタイムアウト）
+            
+        Returns:
+            項目の状態（'confirmed'、'failed'、再試行待ちの場合は 'pending'、項目がない場合はNone）
+        """
+        if timeout is None:
+            timeout = self.config.get('ethereum', {}).get('receipt_tracker', {}).get('timeout', 600)
+        items = self.work_queue.claim_hashes([payload_hash])
+        if items and self._process_work_items(items)[0] is None:
+            # 送信前に失敗して再試行待ちまたはfailed状態に戻った
+            return self.work_queue.state(payload_hash)
+            
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.work_queue.state(payload_hash)
+            if state in (None, STATE_CONFIRMED, STATE_FAILED) or time.monotonic() >= deadline:
+                return state
+            if state == STATE_PENDING and items:
+                # 取り出した項目が確定せずに再試行待ちに戻った
+                return state
+            time.sleep(0.1)
+            
+    def _process_work_item(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        作業項目1件をIPFSとブロックチェーンに記録
+        
+        Args:
+            item: 作業キューから取り出した項目
+            
+        Returns:
+            処理結果（失敗した場合はNone）
+        """
+        try:
+            blockchain_result, anchored = self._process_breathing_analysis(
+                item['payload'],
+                on_uploaded=lambda ipfs_hash: self.work_queue.mark_uploaded(item['id'], ipfs_hash)
+            )
+            self.work_queue.mark_submitted(
+                item['id'],
+                blockchain_result['ipfs_hash'],
+                blockchain_result['transaction_hash']
+            )
+            anchored.add_done_callback(self._work_item_callback(item))
+            return {
+                'device_id': item['device_id'],
+                'source_ref': item['source_ref'],
+                'analysis_result': item['payload'],
+                'blockchain_result': blockchain_result
+            }
+        except Exception as e:
+            logger.error(f"作業項目の処理に失敗 {item['id']} ({item['source_ref'] or item['device_id']}): {e}")
+            self.work_queue.nack(item['id'], str(e))
+            return None
+            
+    def _process_work_items(self, items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        複数の作業項目をIPFSへの一括保存でまとめて記録
+        
+        Args:
+            items: 作業キューから取り出した項目のリスト
+            
+        Returns:
+            入力と同じ順序の処理結果（失敗した項目はNone）
+        """
+        outcomes = self._process_breathing_analyses(
+            [item['payload'] for item in items],
+            on_uploaded=lambda index, ipfs_hash: self.work_queue.mark_uploaded(items[index]['id'], ipfs_hash)
+        )
+        return self._finish_work_items(items, outcomes)
+        
+    def _finish_work_items(self, items: List[Dict[str, Any]], outcomes: List[Any]) -> List[Optional[Dict[str, Any]]]:
+        """
+        一括処理の結果を作業キューに反映
+        
+        Args:
+            items: 作業キューから取り出した項目のリスト
+            outcomes: 入力と同じ順序の (処理結果, Future) または失敗時の例外のリスト
+            
+        Returns:
+            入力と同じ順序の処理結果（失敗した項目はNone）
+        """
+        with self._pipeline_items_lock:
+            self._pipeline_items.difference_update(item['id'] for item in items)
+        results = []
+        for item, outcome in zip(items, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"作業項目の処理に失敗 {item['id']} ({item['source_ref'] or item['device_id']}): {outcome}")
+                self.work_queue.nack(item['id'], str(outcome))
+                results.append(None)
+                continue
                 
-                processed_results = []
+            blockchain_result, anchored = outcome
+            self.work_queue.mark_submitted(item['id'], blockchain_result['ipfs_hash'], blockchain_result['transaction_hash'])
+            anchored.add_done_callback(self._work_item_callback(item))
+            results.append({
+                'device_id': item['device_id'],
+                'source_ref': item['source_ref'],
+                'analysis_result': item['payload'],
+                'blockchain_result': blockchain_result
+            })
+        return results
+        
+    def _work_item_callback(self, item: Dict[str, Any]):
+        """記録の確定・失敗時に作業項目とウォーターマークを更新するコールバックを生成"""
+        def callback(future: Future):
+            try:
+                error = future.exception()
+                if error is not None:
+                    # 再処理時に重複排除で記録済みと誤判定されないよう登録を取り消す
+                    if self.dedup_index:
+                        self.dedup_index.remove(item['payload_hash'])
+                    self.work_queue.nack(item['id'], str(error))
+                    return
+                self.work_queue.ack(item['id'], future.result().get('transaction_hash'))
+                if item['source'] == 'analysis_server' and item['device_id']:
+                    self.watermark_store.advance(
+                        item['device_id'],
+                        item['record_timestamp'] or 0,
+                        item['payload_hash']
+                    )
+            except Exception as e:
+                logger.error(f"作業項目の状態更新に失敗 {item['id']}: {e}")
+        return callback
+        
+    def create_pipeline(self, fetch: StageHandler, fetch_concurrency: int, name: str = 'pipeline') -> Pipeline:
+        """
+        取得 → 検証 → IPFS保存 → 送信 → 確定待ち の段階からなるパイプラインを作成
+        
+        取得段階は取り込み元ごとに異なるため呼び出し側が渡す。取得段階は次の形式の辞書をemitする。
+        
+            source: 取り込み元（'file' または 'analysis_server'）
+            source_ref: 取り込み元の参照（ファイルパス・デバイスID）
+            payload: 解析結果
+            fetched: 取得区間の (開始, 終了) 時刻（UNIXエポックからのナノ秒、省略可）
+            on_admitted: 検証・作業キューへの追加の結果（'queued'、'requeued'、'duplicate'、'invalid'、'error'）
+                         を渡して呼び出すコールバック（省略可）
+        
+        作業キューへの追加までを検証段階で行うため、未完了の項目は停止後も作業キューから再開できる。
+        
+        Args:
+            fetch: 取得段階の処理関数
+            fetch_concurrency: 取得段階の並行数（設定で上書きできる）
+            name: パイプライン名
+            
+        Returns:
+            開始前のパイプライン
+        """
+        stages_config = self.config.get('pipeline', {}).get('stages', {})
+        queue_config = self.config.get('work_queue', {})
+        bulk_size = max(1, queue_config.get('bulk_size', 10))
+        # (処理関数, 既定の並行数, まとめて取り出す件数)
+        defaults = {
+            'fetch': (fetch, fetch_concurrency, 1),
+            'validate': (self._validate_stage, 1, bulk_size),
+            'ipfs': (self._upload_stage, queue_config.get('workers', 4), bulk_size),
+            'chain': (self._anchor_stage, self.config.get('ethereum', {}).get('submit_workers', 8), 1),
+            'confirm': (self._confirm_stage, 256, 1)
+        }
+        stages = []
+        for stage_name, (handler, concurrency, batch_size) in defaults.items():
+            stage_config = stages_config.get(stage_name, {})
+            stages.append(PipelineStage(
+                stage_name,
+                handler,
+                concurrency=stage_config.get('concurrency', concurrency),
+                queue_size=stage_config.get('queue_size', 100),
+                batch_size=batch_size
+            ))
+        pipeline = Pipeline(stages, name=name)
+        
+        PIPELINE_ITEMS.set_function(
+            lambda: {(stage_name, state): stage[state]
+                     for stage_name, stage in pipeline.snapshot().items() for state in ('queued', 'running')}
+        )
+        return pipeline
+        
+    async def feed_pipeline_backlog(self, pipeline: Pipeline) -> int:
+        """
+        作業キューに残っている待機中の項目をパイプラインのIPFS保存段階に渡す
+        
+        前回終了時の未完了分や、失敗して再試行待ちに戻った項目を処理する。
+        IPFS保存段階のキューの空きの分だけ取り出すため、新しい項目の流れを妨げない。
+        先にパイプライン内の待機中の項目のリースを延長し、段階のキューで待つ間に
+        リースが切れて同じ項目を二重に渡さないようにする。
+        
+        Args:
+            pipeline: create_pipeline で作成したパイプライン
+            
+        Returns:
+            渡した件数
+        """
+        bulk_size = max(1, self.config.get('work_queue', {}).get('bulk_size', 10))
+        with self._pipeline_items_lock:
+            in_pipeline = list(self._pipeline_items)
+        self.work_queue.renew(in_pipeline)
+        fed = 0
+        while not pipeline.closed:
+            limit = min(bulk_size, pipeline.free_slots('ipfs'))
+            if limit <= 0:
+                break
+            items = self.work_queue.claim(limit=limit)
+            self._track_pipeline_items(items)
+            for item in items:
+                await pipeline.put(item, stage='ipfs')
+            fed += len(items)
+            if len(items) < limit:
+                break
+        if fed:
+            logger.info(f"作業キューの待機中項目をパイプラインに渡しました: {fed} 件")
+        return fed
+        
+    async def _validate_stage(self, records: List[Dict[str, Any]], emit: Emit):
+        """パイプラインの検証段階（検証して作業キューに追加し、取り出した項目を渡す）"""
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(None, self._admit_records, records)
+        for item in items:
+            await emit(item)
+            
+    def _admit_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        取得した解析結果を検証して作業キューに追加し、追加した項目を取り出す
+        
+        Args:
+            records: 取得段階がemitした辞書のリスト
+            
+        Returns:
+            作業キューから取り出した項目のリスト
+        """
+        admitted = []
+        for record in records:
+            payload = record['payload']
+            try:
+                validate_analysis(payload)
+            except ValueError as e:
+                RECORDS_FAILED.inc(stage='validate')
+                logger.error(f"解析結果の検証に失敗 ({record['source_ref']}): {e}")
+                outcome = 'invalid'
+            else:
+                try:
+                    # 取り込み直したファイルはfailed状態の項目を再試行する
+                    outcome = self.enqueue_analysis(
+                        payload, record['source'], source_ref=record['source_ref'],
+                        retry_failed=record['source'] == 'file'
+                    )
+                    if outcome != 'duplicate':
+                        payload_hash = canonical_hash(payload)
+                        admitted.append(payload_hash)
+                        if record.get('fetched'):
+                            # 取得の区間を各レコードのトレースに含める
+                            started_ns, ended_ns = record['fetched']
+                            self.tracer.add_span(
+                                payload_hash, 'analysis_server.fetch', started_ns, ended_ns,
+                                device_id=record['source_ref']
+                            )
+                except Exception as e:
+                    logger.error(f"作業キューへの追加に失敗 ({record['source_ref']}): {e}")
+                    outcome = 'error'
+                    if record['source'] == 'analysis_server':
+                        # 次回の取得でこの解析結果から取り直す
+                        timestamp = self._record_timestamp(payload)
+                        device_id = record['source_ref']
+                        self.fetch_cursors[device_id] = min(timestamp, self.fetch_cursors.get(device_id, timestamp))
+                        self.fetch_cursor_keys.pop(device_id, None)
+            if record.get('on_admitted'):
+                try:
+                    record['on_admitted'](outcome)
+                except Exception as e:
+                    logger.error(f"取り込み結果の処理中にエラーが発生 ({record['source_ref']}): {e}")
+        items = self.work_queue.claim_hashes(admitted)
+        self._track_pipeline_items(items)
+        return items
+        
+    def _track_pipeline_items(self, items: List[Dict[str, Any]]):
+        """パイプラインに渡す項目を、処理が終わるまでリース延長の対象にする"""
+        with self._pipeline_items_lock:
+            self._pipeline_items.update(item['id'] for item in items)
+        
+    async def _upload_stage(self, items: List[Dict[str, Any]], emit: Emit):
+        """パイプラインのIPFS保存段階（まとめてIPFSに保存し、送信段階に渡す）"""
+        try:
+            outcomes, payload_hashes, pending, ipfs_hashes = await self._aupload_analyses(
+                [item['payload'] for item in items]
+            )
+        except Exception as e:
+            self._finish_work_items(items, [e] * len(items))
+            return
+        uploaded = dict(zip(pending, ipfs_hashes))
+        for index, item in enumerate(items):
+            if index in uploaded:
+                self.work_queue.mark_uploaded(item['id'], uploaded[index])
+                await emit({'item': item, 'payload_hash': payload_hashes[index], 'ipfs_hash': uploaded[index]})
+            elif isinstance(outcomes[index], Exception):
+                self._finish_work_items([item], [outcomes[index]])
+            else:
+                # 記録済みの解析結果は送信せずに確定待ちへ進める
+                await emit({'item': item, 'outcome': outcomes[index]})
                 
-                for device_id, results in all_results.items():
-                    for result in results:
-                        try:
-                            # 分析結果をブロックチェーンに保存
-                            blockchain_result = self.process_breathing_analysis(result)
-                            processed_results.append({
-                                'device_id': device_id,
-                                'analysis_result': result,
-                                'blockchain_result': blockchain_result
-                            })
-                            logger.info(f"分析結果をブロックチェーンに保存しました: {device_id}")
-                            
-                        except Exception as e:
-                            logger.error(f"分析結果の処理に失敗 {device_id}: {e}")
-                            continue
-                            
-                logger.info(f"分析結果の処理が完了しました: {len(processed_results)} 件")
-                return processed_results
+    async def _anchor_stage(self, entries: List[Dict[str, Any]], emit: Emit):
+        """パイプラインの送信段階（トランザクションを送信し、確定待ち段階に渡す）"""
+        for entry in entries:
+            item = entry['item']
+            outcome = entry.get('outcome')
+            if outcome is None:
+                try:
+                    outcome = await self._aanchor_analysis(item['payload'], entry['payload_hash'], entry['ipfs_hash'])
+                except Exception as e:
+                    logger.error(f"呼吸解析データ処理中にエラーが発生: {e}")
+                    outcome = e
+            result = self._finish_work_items([item], [outcome])[0]
+            if result:
+                await emit({'result': result, 'anchored': outcome[1]})
+                
+    async def _confirm_stage(self, entries: List[Dict[str, Any]], emit: Emit):
+        """パイプラインの確定待ち段階（確定・失敗まで待ち、未確定の送信数を並行数で抑える）"""
+        for entry in entries:
+            try:
+                # 待機側のキャンセルが追跡中のFutureに伝わらないようにする
+                await asyncio.shield(asyncio.wrap_future(entry['anchored']))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 失敗はFutureのコールバックで作業キューに反映済み
+                pass
+            await emit(entry['result'])
+            
+    async def fetch_and_process_analysis_results(self, due_only: bool = False) -> List[Dict[str, Any]]:
+        """
+        分析サーバーから結果を取得してブロックチェーンに保存
+        
+        Args:
+            due_only: 問い合わせ時刻に達したデバイスだけを取得するかどうか（適応ポーリング時）
+            
+        Returns:
+            処理された結果のリスト
+        """
+        cycle_started = time.perf_counter()
+        try:
+            client = self.analysis_client
+            device_ids = await self._poll_targets(client, due_only)
+            if not device_ids:
+                return await self.aprocess_work_queue()
+                
+            # 直近の要求が失敗し続けている場合のみヘルスチェックで回復を確認する
+            if not await client.is_available():
+                logger.error("分析サーバーが利用できません")
+                if self.poll_scheduler:
+                    for device_id in device_ids:
+                        self.poll_scheduler.record_failure(device_id)
+                return []
                 
+            # デバイスごとに取得済みの位置以降の結果を取得
+            limit = self.config['analysis_server']['batch_size']
+            start_times = self.watermark_store.get_all()
+            for device_id, cursor in self.fetch_cursors.items():
+                start_times[device_id] = max(cursor, start_times.get(device_id, 0))
+            processed_results: List[Dict[str, Any]] = []
+            with STAGE_DURATION.time(stage='analysis_fetch'):
+                if self.config['analysis_server'].get('streaming', {}).get('enabled', False):
+                    fetched, new_counts, failures, durations = await self._stream_analysis_results(
+                        client, device_ids, start_times, limit, processed_results
+                    )
+                else:
+                    fetched, new_counts, failures, durations = await self._fetch_analysis_results(
+                        client, device_ids, start_times, limit
+                    )
+                    
+            if self.poll_scheduler:
+                for device_id in device_ids:
+                    if device_id in failures:
+                        self.poll_scheduler.record_failure(device_id)
+                    else:
+                        self.poll_scheduler.record_result(
+                            device_id,
+                            fetched=fetched.get(device_id, 0),
+                            new=new_counts.get(device_id, 0),
+                            limit=limit,
+                            elapsed=durations.get(device_id)
+                        )
+                    
+            processed_results.extend(await self.aprocess_work_queue())
+            
+            logger.info(f"分析結果の処理が完了しました: {len(processed_results)} 件")
+            return processed_results
+            
         except Exception as e:
             logger.error(f"分析結果の取得・処理中にエラーが発生: {e}")
             return []
+        finally:
+            STAGE_DURATION.observe(time.perf_counter() - cycle_started, stage='fetch_cycle')
+            
+    async def _fetch_analysis_results(
+        self,
+        client: AnalysisServerClient,
+        device_ids: List[str],
+        start_times: Dict[str, int],
+        limit: int
+    ) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, str], Dict[str, float]]:
+        """
+        デバイスごとの応答全体を受信してから作業キューに追加
+        
+        Args:
+            client: 分析サーバークライアント
+            device_ids: 取得するデバイスID
+            start_times: デバイスIDをキーとした取得開始時刻
+            limit: デバイスごとの取得件数
+            
+        Returns:
+            デバイスごとの (取得件数, 追加件数, 失敗理由, 取得時間) の辞書のタプル
+        """
+        fetch_started_ns = time.time_ns()
+        all_results = await client.get_all_devices_results(
+            limit_per_device=limit,
+            start_times=start_times,
+            device_ids=device_ids,
+            wait=self.long_poll_wait
+        )
+        fetch_ended_ns = time.time_ns()
+        
+        fetched: Dict[str, int] = {}
+        new_counts: Dict[str, int] = {}
+        for device_id, results in all_results.items():
+            fetched[device_id] = len(results)
+            new_counts[device_id] = 0
+            for result in sorted(results, key=self._record_timestamp):
+                if self._enqueue_fetched(device_id, result, fetch_started_ns, fetch_ended_ns):
+                    new_counts[device_id] += 1
+        return fetched, new_counts, dict(client.last_failures), dict(client.last_durations)
+        
+    async def _stream_analysis_results(
+        self,
+        client: AnalysisServerClient,
+        device_ids: List[str],
+        start_times: Dict[str, int],
+        limit: int,
+        processed_results: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, str], Dict[str, float]]:
+        """
+        デバイスごとの応答を受信しながら1件ずつ作業キューに追加
+        
+        bulk_size件たまるごとに作業キューの処理を始めるため、
+        応答の受信中にIPFSへの保存と送信が進む。
+        
+        Args:
+            client: 分析サーバークライアント
+            device_ids: 取得するデバイスID
+            start_times: デバイスIDをキーとした取得開始時刻
+            limit: デバイスごとの取得件数
+            processed_results: 受信中に処理した結果の追加先
+            
+        Returns:
+            デバイスごとの (取得件数, 追加件数, 失敗理由, 取得時間) の辞書のタプル
+        """
+        bulk_size = max(1, self.config.get('work_queue', {}).get('bulk_size', 10))
+        semaphore = asyncio.Semaphore(client.max_concurrency)
+        fetched: Dict[str, int] = {}
+        new_counts: Dict[str, int] = {}
+        failures: Dict[str, str] = {}
+        durations: Dict[str, float] = {}
+        drains = []
+        queued = 0
+        
+        async def stream(device_id: str):
+            nonlocal queued
+            fetched[device_id] = new_counts[device_id] = 0
+            async with semaphore:
+                started = time.monotonic()
+                started_ns = time.time_ns()
+                try:
+                    async for result in client.stream_analysis_results(
+                        device_id,
+                        start_time=start_times.get(device_id),
+                        limit=limit,
+                        wait=self.long_poll_wait
+                    ):
+                        fetched[device_id] += 1
+                        if self._enqueue_fetched(device_id, result, started_ns, time.time_ns()):
+                            new_counts[device_id] += 1
+                            queued += 1
+                        if queued >= bulk_size:
+                            drains.append(asyncio.ensure_future(self.aprocess_work_queue(max_items=queued)))
+                            queued = 0
+                except Exception as e:
+                    failures[device_id] = str(e)
+                finally:
+                    durations[device_id] = time.monotonic() - started
+                    
+        await asyncio.gather(*(stream(device_id) for device_id in device_ids))
+        if failures:
+            logger.warning(f"分析結果の受信に失敗したデバイス: {len(failures)}/{len(device_ids)} {failures}")
+        # 受信中に始めた処理の完了を待つ（残りは呼び出し側で処理する）
+        for results in await asyncio.gather(*drains):
+            processed_results.extend(results)
+        return fetched, new_counts, failures, durations
+        
+    def _enqueue_fetched(self, device_id: str, result: Dict[str, Any], started_ns: int, ended_ns: int) -> bool:
+        """
+        分析サーバーから取得した結果を、処理済みでなければ作業キューに追加
+        
+        Args:
+            device_id: デバイスID
+            result: 分析結果
+            started_ns: 取得を開始した時刻（UNIXエポックからのナノ秒）
+            ended_ns: 結果を受け取った時刻（UNIXエポックからのナノ秒）
+            
+        Returns:
+            新たに追加したかどうか
+        """
+        timestamp = self._record_timestamp(result)
+        payload_hash = canonical_hash(result)
+        enqueued = (
+            not self.watermark_store.is_processed(device_id, timestamp, payload_hash)
+            and self.enqueue_analysis(result, 'analysis_server', source_ref=device_id) == 'queued'
+        )
+        if enqueued:
+            # 取得の区間を各レコードのトレースに含める
+            self.tracer.add_span(
+                payload_hash, 'analysis_server.fetch', started_ns, ended_ns, device_id=device_id
+            )
+        # 作業キューに入った（または処理済みの）位置まで次回の取得開始時刻を進める
+        self.fetch_cursors[device_id] = max(timestamp, self.fetch_cursors.get(device_id, 0))
+        return enqueued
+        
+    async def _poll_targets(self, client: AnalysisServerClient, due_only: bool) -> List[str]:
+        """
+        今回取得するデバイスIDを決定
+        
+        Args:
+            client: 分析サーバークライアント
+            due_only: 問い合わせ時刻に達したデバイスだけに絞るかどうか
+            
+        Returns:
+            デバイスIDのリスト
+        """
+        if not self.poll_scheduler:
+            return await client.get_device_ids()
+            
+        if self.poll_scheduler.needs_device_refresh():
+            device_ids = await client.get_device_ids()
+            # 一覧の取得に失敗した場合は前回の一覧で続ける
+            if device_ids:
+                self.poll_scheduler.sync(device_ids)
+                
+        if due_only:
+            return self.poll_scheduler.due()
+        return self.poll_scheduler.devices
+        
+    async def _fetch_device_stage(self, client: AnalysisServerClient, device_id: str, emit: Emit):
+        """
+        パイプラインの取得段階（1デバイス分の新しい解析結果を取得して渡す）
+        
+        Args:
+            client: 分析サーバークライアント
+            device_id: デバイスID
+            emit: 次の段階へ渡す関数
+        """
+        server_config = self.config['analysis_server']
+        limit = server_config['batch_size']
+        start_time = max(self.fetch_cursors.get(device_id, 0), self.watermark_store.get(device_id) or 0)
+        fetched = new = 0
+        started = time.monotonic()
+        started_ns = time.time_ns()
+        
+        async def forward(result: Dict[str, Any]):
+            nonlocal new
+            timestamp = self._record_timestamp(result)
+            payload_hash = canonical_hash(result)
+            cursor = self.fetch_cursors.get(device_id, 0)
+            keys = self.fetch_cursor_keys.setdefault(device_id, set())
+            # 開始時刻と同時刻のレコードは前回も返るため、渡し済み・作業キューにあるものは新しい結果に数えない
+            if timestamp == cursor and payload_hash in keys:
+                return
+            if not (self.watermark_store.is_processed(device_id, timestamp, payload_hash)
+                    or self.work_queue.contains(payload_hash)):
+                new += 1
+                await emit({
+                    'source': 'analysis_server',
+                    'source_ref': device_id,
+                    'payload': result,
+                    'fetched': (started_ns, time.time_ns())
+                })
+            # 下流に渡した（または処理済みの）位置まで次回の取得開始時刻を進める
+            cursor = self.fetch_cursors.get(device_id, 0)
+            if timestamp > cursor:
+                self.fetch_cursors[device_id] = timestamp
+                self.fetch_cursor_keys[device_id] = {payload_hash}
+            elif timestamp == cursor:
+                keys.add(payload_hash)
+            
+        try:
+            with STAGE_DURATION.time(stage='analysis_fetch'):
+                if server_config.get('streaming', {}).get('enabled', False):
+                    async for result in client.stream_analysis_results(
+                        device_id, start_time=start_time or None, limit=limit, wait=self.long_poll_wait
+                    ):
+                        fetched += 1
+                        await forward(result)
+                else:
+                    results = await client.fetch_analysis_results(
+                        device_id, start_time=start_time or None, limit=limit, wait=self.long_poll_wait
+                    )
+                    fetched = len(results)
+                    for result in sorted(results, key=self._record_timestamp):
+                        await forward(result)
+        except Exception as e:
+            logger.warning(f"分析結果の取得に失敗 {device_id}: {e}")
+            if self.poll_scheduler:
+                self.poll_scheduler.record_failure(device_id)
+            return
+            
+        if self.poll_scheduler:
+            self.poll_scheduler.record_result(
+                device_id, fetched=fetched, new=new, limit=limit, elapsed=time.monotonic() - started
+            )
+            
+    async def _monitor_with_pipeline(self):
+        """
+        分析サーバーの監視をパイプラインで実行
+        
+        問い合わせ時刻に達したデバイスを取得段階に渡し、取得・IPFS保存・送信・確定待ちを
+        段階ごとの並行数で重ねる。停止時は処理中の項目を流し切ってから終了する。
+        """
+        pipeline_config = self.config.get('pipeline', {})
+        backlog_interval = pipeline_config.get('backlog_interval', 30)
+        polling_interval = self.config['analysis_server']['polling_interval']
+        client = self.analysis_client
+        # 取得段階にあるデバイス（結果が出るまで再度渡さない）
+        polling = set()
+        fetch_finished = asyncio.Event()
+        
+        async def fetch(device_ids: List[str], emit: Emit):
+            for device_id in device_ids:
+                try:
+                    await self._fetch_device_stage(client, device_id, emit)
+                finally:
+                    polling.discard(device_id)
+                    fetch_finished.set()
+                    
+        pipeline = self.create_pipeline(fetch, client.max_concurrency, name='analysis-monitor')
+        await pipeline.start()
+        next_backlog = next_poll = time.monotonic()
+        try:
+            while True:
+                try:
+                    fetch_finished.clear()
+                    now = time.monotonic()
+                    if now >= next_backlog:
+                        await self.feed_pipeline_backlog(pipeline)
+                        next_backlog = now + backlog_interval
+                        
+                    if self.poll_scheduler or now >= next_poll:
+                        device_ids = [
+                            device_id for device_id in await self._poll_targets(client, self.poll_scheduler is not None)
+                            if device_id not in polling
+                        ]
+                        next_poll = now + polling_interval
+                        # 直近の要求が失敗し続けている場合のみヘルスチェックで回復を確認する
+                        if device_ids and not await client.is_available():
+                            logger.error("分析サーバーが利用できません")
+                            if self.poll_scheduler:
+                                for device_id in device_ids:
+                                    self.poll_scheduler.record_failure(device_id)
+                            device_ids = []
+                        for device_id in device_ids:
+                            polling.add(device_id)
+                            if self.poll_scheduler:
+                                self.poll_scheduler.mark_polling(device_id)
+                            # 取得段階のキューが満杯の間はここで待つ
+                            await pipeline.put(device_id)
+                            
+                    if self.poll_scheduler:
+                        # 次にいずれかのデバイスの問い合わせ時刻が来るか、取得が終わるまで待機
+                        delay = min(self.poll_scheduler.seconds_until_next(), next_backlog - time.monotonic())
+                        try:
+                            await asyncio.wait_for(fetch_finished.wait(), max(0.0, delay))
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await asyncio.sleep(max(0.0, min(next_poll, next_backlog) - time.monotonic()))
+                        
+                except Exception as e:
+                    logger.error(f"監視サイクル中にエラーが発生: {e}")
+                    await asyncio.sleep(30)  # エラー時は短い間隔で再試行
+        finally:
+            await pipeline.close(timeout=pipeline_config.get('drain_timeout', 60))
+            logger.info(f"パイプラインの処理件数: {pipeline.snapshot()}")
             
     async def monitor_analysis_server(self):
         """
         分析サーバーの監視と自動処理
         """
+        if self.config.get('pipeline', {}).get('enabled', True):
+            try:
+                logger.info("分析サーバーの監視を開始しました（パイプライン）")
+                await self._monitor_with_pipeline()
+            except KeyboardInterrupt:
+                logger.info("分析サーバーの監視を停止しました")
+            return
+            
         try:
             logger.info("分析サーバーの監視を開始しました")
             
             while True:
                 try:
                     # 分析結果の取得と処理
-                    processed_results = await self.fetch_and_process_analysis_results()
+                    processed_results = await self.fetch_and_process_analysis_results(
+                        due_only=self.poll_scheduler is not None
+                    )
                     
                     if processed_results:
                         logger.info(f"監視サイクルで {len(processed_results)} 件の結果を処理しました")
                     else:
-                        logger.info("監視サイクル: 新しい分析結果はありませんでした")
+                        logger.debug("監視サイクル: 新しい分析結果はありませんでした")
                         
-                    # 設定された間隔で待機
-                    await asyncio.sleep(self.config['analysis_server']['polling_interval'])
+                    if self.poll_scheduler:
+                        # 次にいずれかのデバイスの問い合わせ時刻が来るまで待機
+                        await asyncio.sleep(self.poll_scheduler.seconds_until_next())
+                    else:
+                        # 設定された間隔で待機
+                        await asyncio.sleep(self.config['analysis_server']['polling_interval'])
                     
                 except Exception as e:
                     logger.error(f"監視サイクル中にエラーが発生: {e}")
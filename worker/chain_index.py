@@ -0,0 +1,266 @@
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+_RECORD_COLUMNS = ('chain_index', 'ipfs_hash', 'timestamp', 'device_id', 'merkle_root')
+
+
+class ChainIndex:
+    """チェーン上の呼吸データのローカルインデックス"""
+
+    def __init__(self, db_path: str):
+        """
+        チェーンインデックスの初期化
+
+        Args:
+            db_path: SQLiteデータベースのパス
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS chain_records (
+                chain_index INTEGER PRIMARY KEY,
+                ipfs_hash TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                device_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_chain_records_device_time
+                ON chain_records (device_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_chain_records_time
+                ON chain_records (timestamp);
+
+            -- Merkleバッチに含まれるレコード（マニフェストを展開したもの）
+            CREATE TABLE IF NOT EXISTS batch_records (
+                ipfs_hash TEXT PRIMARY KEY,
+                chain_index INTEGER NOT NULL,
+                merkle_root TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                device_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_batch_records_device_time
+                ON batch_records (device_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_batch_records_time
+                ON batch_records (timestamp);
+
+            -- マニフェストを取得できず展開していないMerkleバッチ（次回の同期で再試行する）
+            CREATE TABLE IF NOT EXISTS pending_batches (
+                chain_index INTEGER PRIMARY KEY,
+                ipfs_hash TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                device_id TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        ''')
+        self._conn.commit()
+
+    @property
+    def synced_count(self) -> int:
+        """同期済みのレコード数（次に取得するチェーン上のインデックス）"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = 'synced_count'").fetchone()
+        return row[0] if row else 0
+
+    @property
+    def pending_batch_count(self) -> int:
+        """マニフェストを取得できず展開を再試行待ちのMerkleバッチ数"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pending_batches').fetchone()[0]
+
+    def sync(
+        self,
+        get_count: Callable[[], int],
+        get_record: Callable[[int], Optional[Dict[str, Any]]],
+        batch_size: int = 100,
+        workers: int = 8,
+        expand_batch: Optional[Callable[[Dict[str, Any]], List[Dict[str, Any]]]] = None
+    ) -> int:
+        """
+        前回の同期以降に追加されたレコードを取り込む
+
+        Args:
+            get_count: チェーン上のレコード数を返す関数
+            get_record: インデックスを受け取りレコードを返す関数
+            batch_size: 1回のコミットで取り込むレコード数
+            workers: レコード取得の並列数
+            expand_batch: Merkleバッチのレコードを受け取り、含まれるレコードのリストを返す関数
+                          （バッチでない場合は空のリスト、マニフェストを取得できない場合はNoneを返す。
+                          Noneのバッチは記録しておき、次回以降の同期で展開を再試行する）
+
+        Returns:
+            新たに取り込んだレコード数
+        """
+        with self._sync_lock:
+            if expand_batch:
+                self._retry_pending_batches(expand_batch)
+
+            start = self.synced_count
+            count = get_count()
+            if count <= start:
+                return 0
+
+            added = 0
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chain-index') as executor:
+                for batch_start in range(start, count, batch_size):
+                    indices = list(range(batch_start, min(batch_start + batch_size, count)))
+                    records = list(executor.map(get_record, indices))
+                    complete = None not in records
+                    if not complete:
+                        # 取得に失敗した位置から次回再開する
+                        records = records[:records.index(None)]
+                        indices = indices[:len(records)]
+                        logger.error(f"チェーンインデックスの同期を中断しました: インデックス {batch_start + len(records)}")
+
+                    expanded = []
+                    failed = []
+                    if expand_batch:
+                        for index, record in zip(indices, records):
+                            entries = expand_batch(record)
+                            if entries is None:
+                                failed.append(index)
+                                continue
+                            for entry in entries:
+                                expanded.append(dict(entry, chain_index=index))
+
+                    self._store(indices, records, expanded, failed)
+                    added += len(records)
+                    if not complete:
+                        break
+
+            logger.info(f"チェーンインデックスを同期しました: {added} 件追加 (合計 {start + added} 件)")
+            return added
+
+    def _retry_pending_batches(self, expand_batch: Callable[[Dict[str, Any]], Optional[List[Dict[str, Any]]]]):
+        """前回までの同期で展開できなかったMerkleバッチの展開を再試行"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT chain_index, ipfs_hash, timestamp, device_id FROM pending_batches ORDER BY chain_index'
+            ).fetchall()
+        if not rows:
+            return
+
+        expanded_count = 0
+        for index, ipfs_hash, timestamp, device_id in rows:
+            entries = expand_batch({'ipfs_hash': ipfs_hash, 'timestamp': timestamp, 'device_id': device_id})
+            if entries is None:
+                continue
+            with self._lock:
+                with self._conn:
+                    self._insert_batch_records([dict(entry, chain_index=index) for entry in entries])
+                    self._conn.execute('DELETE FROM pending_batches WHERE chain_index = ?', (index,))
+            expanded_count += 1
+
+        remaining = len(rows) - expanded_count
+        if remaining:
+            logger.warning(f"Merkleバッチの展開を再試行しました: {expanded_count} 件展開、{remaining} 件は次回再試行")
+        else:
+            logger.info(f"展開できていなかったMerkleバッチをすべて展開しました: {expanded_count} 件")
+
+    def _insert_batch_records(self, expanded: List[Dict[str, Any]]):
+        """Merkleバッチに含まれるレコードを保存（ロック・トランザクション内で呼び出す）"""
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO batch_records VALUES (?, ?, ?, ?, ?)',
+            [(e['ipfs_hash'], e['chain_index'], e['merkle_root'], e['timestamp'], e['device_id'])
+             for e in expanded]
+        )
+
+    def _store(
+        self,
+        indices: List[int],
+        records: List[Dict[str, Any]],
+        expanded: List[Dict[str, Any]],
+        failed: List[int]
+    ):
+        """取得したレコード・展開できなかったバッチ・同期位置を1トランザクションで保存"""
+        if not records:
+            return
+        by_index = dict(zip(indices, records))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO chain_records VALUES (?, ?, ?, ?)',
+                    [(index, r['ipfs_hash'], r['timestamp'], r['device_id']) for index, r in zip(indices, records)]
+                )
+                self._insert_batch_records(expanded)
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO pending_batches VALUES (?, ?, ?, ?)',
+                    [(index, by_index[index]['ipfs_hash'], by_index[index]['timestamp'], by_index[index]['device_id'])
+                     for index in failed]
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state VALUES ('synced_count', ?)",
+                    (indices[-1] + 1,)
+                )
+
+    def query(
+        self,
+        device_id: Optional[str] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[int, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        インデックスからレコードを検索
+
+        Merkleバッチに含まれるレコードも個別のレコードとして返す。
+
+        Args:
+            device_id: デバイスID
+            start_time: 開始時刻（UNIXタイムスタンプ、この時刻を含む）
+            end_time: 終了時刻（UNIXタイムスタンプ、この時刻を含む）
+            limit: 取得件数制限
+            after: (チェーン上のインデックス, IPFSハッシュ) より後のレコードのみを返す（ページ送り用）
+
+        Returns:
+            チェーン上のインデックス・IPFSハッシュ順のレコードのリスト
+        """
+        conditions = []
+        params: List[Any] = []
+        if device_id is not None:
+            conditions.append('device_id = ?')
+            params.append(device_id)
+        if start_time is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append('timestamp <= ?')
+            params.append(end_time)
+        if after is not None:
+            conditions.append('(chain_index > ? OR (chain_index = ? AND ipfs_hash > ?))')
+            params.extend([after[0], after[0], after[1]])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        sql = f'''
+            SELECT chain_index, ipfs_hash, timestamp, device_id, NULL AS merkle_root FROM chain_records {where}
+            UNION ALL
+            SELECT chain_index, ipfs_hash, timestamp, device_id, merkle_root FROM batch_records {where}
+            ORDER BY chain_index, ipfs_hash
+        '''
+        params = params * 2
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(_RECORD_COLUMNS, row)) for row in rows]
+
+    def close(self):
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
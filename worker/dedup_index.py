@@ -0,0 +1,109 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DedupIndex:
+    """解析結果の正規化ハッシュから記録済みのCIDとトランザクションを引く永続インデックス"""
+
+    def __init__(self, db_path: str, cache_size_mb: int = 64):
+        """
+        重複排除インデックスの初期化
+
+        Args:
+            db_path: SQLiteデータベースのパス
+            cache_size_mb: SQLiteのページキャッシュサイズ（MB）
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # 数千万件規模でも参照が高速になるよう、ハッシュを主キーとした
+        # WITHOUT ROWIDテーブルにしてB木を1本に抑える
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'PRAGMA cache_size=-{cache_size_mb * 1024}')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS dedup_index (
+                payload_hash BLOB PRIMARY KEY,
+                ipfs_hash TEXT NOT NULL,
+                transaction_hash TEXT,
+                timestamp INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self._conn.commit()
+
+    def get(self, payload_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        記録済みの結果を取得
+
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ（16進文字列）
+
+        Returns:
+            記録済みの結果（未記録の場合はNone）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT ipfs_hash, transaction_hash, timestamp FROM dedup_index WHERE payload_hash = ?',
+                (bytes.fromhex(payload_hash),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'ipfs_hash': row[0], 'transaction_hash': row[1], 'timestamp': row[2]}
+
+    def put(self, payload_hash: str, ipfs_hash: str, transaction_hash: Optional[str], timestamp: int):
+        """
+        記録結果を登録
+
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ（16進文字列）
+            ipfs_hash: IPFSハッシュ
+            transaction_hash: トランザクションハッシュ（バッチ送信前はNone）
+            timestamp: ブロックチェーンに記録したタイムスタンプ
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO dedup_index VALUES (?, ?, ?, ?)',
+                    (bytes.fromhex(payload_hash), ipfs_hash, transaction_hash, timestamp)
+                )
+
+    def update_transaction(self, payload_hash: str, transaction_hash: str):
+        """
+        登録済みの結果にトランザクションハッシュを設定
+
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ（16進文字列）
+            transaction_hash: トランザクションハッシュ
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE dedup_index SET transaction_hash = ? WHERE payload_hash = ?',
+                    (transaction_hash, bytes.fromhex(payload_hash))
+                )
+
+    def remove(self, payload_hash: str):
+        """
+        記録に失敗した結果を削除
+
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ（16進文字列）
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'DELETE FROM dedup_index WHERE payload_hash = ?',
+                    (bytes.fromhex(payload_hash),)
+                )
+
+    def close(self):
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
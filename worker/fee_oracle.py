@@ -0,0 +1,172 @@
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class FeeOracle:
+    """ガス代と推定ガス量をブロック単位でキャッシュするクラス
+
+    手数料は新しいブロックを検知したときだけバックグラウンドで更新し、
+    すべての送信スレッドで共有する。推定ガス量は引数の形ごとに1回だけ問い合わせる。
+    """
+
+    def __init__(
+        self,
+        w3,
+        mode: str = 'auto',
+        poll_interval: float = 1.0,
+        base_fee_multiplier: float = 2.0,
+        priority_fee_per_gas: int = 1_500_000_000,
+        gas_price: Optional[int] = None,
+        gas_limit: int = 3_000_000,
+        gas_multiplier: float = 1.2
+    ):
+        """
+        フィーオラクルの初期化
+
+        Args:
+            w3: Web3インスタンス
+            mode: 'auto'（ベースフィーの有無で判定）、'eip1559'、'legacy' のいずれか
+            poll_interval: 新しいブロックを確認する間隔（秒）
+            base_fee_multiplier: maxFeePerGasに見込むベースフィーの倍率
+            priority_fee_per_gas: ノードから取得できない場合のチップ（wei）
+            gas_price: legacyモードで使う固定のガス価格（wei、Noneの場合はノードの値）
+            gas_limit: 推定ガス量の上限、推定に失敗した場合の値
+            gas_multiplier: 推定ガス量に上乗せする倍率
+        """
+        if mode not in ('auto', 'eip1559', 'legacy'):
+            raise ValueError(f"対応していない手数料モードです: {mode}")
+
+        self.w3 = w3
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.base_fee_multiplier = base_fee_multiplier
+        self.priority_fee_per_gas = priority_fee_per_gas
+        self.gas_price = gas_price
+        self.gas_limit = gas_limit
+        self.gas_multiplier = gas_multiplier
+
+        self._lock = threading.Lock()
+        self._fees: Optional[Dict[str, int]] = None
+        self._block_number: Optional[int] = None
+        self._gas_estimates: Dict[Hashable, int] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """更新スレッドの開始"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.refresh()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='fee-oracle', daemon=True)
+        self._thread.start()
+        logger.info("フィーオラクルを開始しました")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        更新スレッドの停止
+
+        Args:
+            timeout: スレッド終了の待機時間（秒）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        logger.info("フィーオラクルを停止しました")
+
+    def _run(self):
+        """新しいブロックごとの更新ループ"""
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                if self.w3.eth.block_number != self._block_number:
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"手数料の更新中にエラーが発生: {e}")
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        最新ブロックから手数料を取得してキャッシュを更新
+
+        Returns:
+            トランザクションに設定する手数料のフィールド
+        """
+        block = self.w3.eth.get_block('latest')
+        base_fee = block.get('baseFeePerGas')
+
+        if self.mode == 'legacy' or (self.mode == 'auto' and base_fee is None):
+            fees = {'gasPrice': self.gas_price or self.w3.eth.gas_price}
+        else:
+            if base_fee is None:
+                raise ValueError("ノードがEIP-1559に対応していません（baseFeePerGasがありません）")
+            try:
+                priority_fee = self.w3.eth.max_priority_fee
+            except Exception:
+                priority_fee = self.priority_fee_per_gas
+            fees = {
+                'type': 2,
+                'maxPriorityFeePerGas': priority_fee,
+                'maxFeePerGas': int(base_fee * self.base_fee_multiplier) + priority_fee
+            }
+
+        with self._lock:
+            self._fees = fees
+            self._block_number = block['number']
+        return fees
+
+    def fees(self) -> Dict[str, int]:
+        """
+        キャッシュ済みの手数料を取得（未取得の場合のみ問い合わせる）
+
+        Returns:
+            トランザクションに設定する手数料のフィールド
+        """
+        with self._lock:
+            fees = self._fees
+        if fees is None:
+            fees = self.refresh()
+        return dict(fees)
+
+    def estimate_gas(self, shape: Hashable, estimate: Callable[[], int]) -> int:
+        """
+        引数の形ごとにキャッシュした推定ガス量を取得
+
+        Args:
+            shape: ガス量が同じになる呼び出しをまとめるキー（引数の長さなど）
+            estimate: ガス量を推定する関数（キャッシュにない場合のみ呼び出す）
+
+        Returns:
+            上乗せ・上限適用後のガス量
+        """
+        with self._lock:
+            gas = self._gas_estimates.get(shape)
+        if gas is not None:
+            return gas
+
+        try:
+            gas = min(int(estimate() * self.gas_multiplier), self.gas_limit)
+        except Exception as e:
+            # 推定に失敗した場合は上限値で送信し、キャッシュしない
+            logger.warning(f"ガス量の推定に失敗したため上限値を使用します: {e}")
+            return self.gas_limit
+
+        with self._lock:
+            self._gas_estimates[shape] = gas
+        logger.info(f"ガス量を推定しました: {shape} -> {gas}")
+        return gas
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        現在のキャッシュ状態を取得
+
+        Returns:
+            手数料・取得ブロック・推定済みの形の数
+        """
+        with self._lock:
+            return {
+                'fees': dict(self._fees) if self._fees else None,
+                'block_number': self._block_number,
+                'gas_estimates': len(self._gas_estimates)
+            }
@@ -0,0 +1,190 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Dict, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# inotifyのイベントマスク（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _Inotify:
+    """libcのinotify APIの薄いラッパー"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1に失敗: {os.strerror(errno)}")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """監視対象の追加"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watchに失敗: {os.strerror(errno)}")
+        return wd
+
+    def read_events(self):
+        """
+        到着済みのイベントを読み出す
+
+        Yields:
+            (マスク, ファイル名) のタプル
+        """
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            yield mask, os.fsdecode(name)
+
+    def close(self):
+        """ファイルディスクリプタを閉じる"""
+        os.close(self.fd)
+
+
+def inotify_available() -> bool:
+    """inotifyが利用可能かどうか"""
+    try:
+        _Inotify().close()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class PendingDirectoryWatcher:
+    """待機ディレクトリへのファイル書き込み完了をinotifyで検知するクラス"""
+
+    def __init__(
+        self,
+        directory: str,
+        on_file_ready: Callable[[str], None],
+        on_reconcile: Optional[Callable[[], None]] = None,
+        suffix: str = '.json',
+        debounce_seconds: float = 0.5,
+        reconcile_interval: float = 300
+    ):
+        """
+        ディレクトリ監視の初期化
+
+        Args:
+            directory: 監視するディレクトリ
+            on_file_ready: 書き込みが完了したファイルのパスを渡して呼び出すコールバック
+            on_reconcile: 取りこぼし確認のため定期的に呼び出す全件走査のコールバック
+            suffix: 対象とするファイルの拡張子
+            debounce_seconds: 最後のイベントから処理するまでの待機時間（秒）
+            reconcile_interval: 全件走査の間隔（秒）
+        """
+        self.directory = directory
+        self.on_file_ready = on_file_ready
+        self.on_reconcile = on_reconcile
+        self.suffix = suffix
+        self.debounce_seconds = debounce_seconds
+        self.reconcile_interval = reconcile_interval
+
+        # ファイル名ごとの処理予定時刻（単調時計）
+        self._deadlines: Dict[str, float] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+
+    def start(self):
+        """監視スレッドの開始"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._inotify = _Inotify()
+        self._inotify.add_watch(self.directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='pending-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"待機ディレクトリのinotify監視を開始しました: {self.directory}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        監視スレッドの停止
+
+        Args:
+            timeout: スレッド終了の待機時間（秒）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        logger.info("待機ディレクトリの監視を停止しました")
+
+    def _run(self):
+        """イベント待ちとデバウンス処理のループ"""
+        poller = select.poll()
+        poller.register(self._inotify.fd, select.POLLIN)
+        # 起動前に置かれたファイルを拾うため最初に全件走査する
+        next_reconcile = time.monotonic()
+
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if self.on_reconcile and now >= next_reconcile:
+                self._reconcile()
+                next_reconcile = now + self.reconcile_interval
+
+            # 次の処理予定時刻まで（最大1秒）イベントを待つ
+            wait = 1.0
+            if self._deadlines:
+                wait = min(wait, max(0.0, min(self._deadlines.values()) - now))
+            if poller.poll(wait * 1000):
+                self._handle_events()
+
+            self._dispatch_ready()
+
+    def _handle_events(self):
+        """inotifyイベントを処理予定に登録"""
+        for mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # イベントが溢れた場合は全件走査で取りこぼしを回収する
+                logger.warning("inotifyイベントが溢れたため全件走査します")
+                self._reconcile()
+                continue
+            if mask & IN_IGNORED or not name.endswith(self.suffix):
+                continue
+            # 書き込みが続く間は処理予定を後ろにずらす
+            self._deadlines[name] = time.monotonic() + self.debounce_seconds
+
+    def _dispatch_ready(self):
+        """待機時間が経過したファイルを処理"""
+        now = time.monotonic()
+        ready = [name for name, deadline in self._deadlines.items() if deadline <= now]
+        for name in ready:
+            del self._deadlines[name]
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                self.on_file_ready(path)
+            except Exception as e:
+                logger.error(f"ファイル処理中にエラーが発生 {path}: {e}")
+
+    def _reconcile(self):
+        """全件走査のコールバックを呼び出す"""
+        try:
+            self.on_reconcile()
+        except Exception as e:
+            logger.error(f"待機ディレクトリの全件走査中にエラーが発生: {e}")
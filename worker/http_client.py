@@ -1,14 +1,36 @@
 import aiohttp
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, AsyncIterator
 from datetime import datetime
 import json
+from .json_stream import JsonArrayStreamParser, NdjsonStreamParser, BodyTooLargeError
 
 logger = logging.getLogger(__name__)
 
+# 再試行する応答ステータス（過負荷・ゲートウェイの一時的な失敗）
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class AnalysisServerStatusError(RuntimeError):
+    """分析サーバーが200以外のステータスを返した場合の例外"""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
 class AnalysisServerClient:
-    """分析サーバーとの通信を行うクライアント"""
+    """分析サーバーとの通信を行うクライアント
+    
+    ノードごとに1つ作成して監視サイクルをまたいで使い回す。セッションは最初の要求時に
+    作成し、接続プール・keep-alive・DNSキャッシュ・圧縮応答の展開を有効にする。
+    一時的な失敗は間隔にジッターを加えて再試行し、サーバーの状態は要求の成否から判定する。
+    """
     
     def __init__(self, config: Dict[str, Any]):
         """
@@ -18,26 +40,195 @@ class AnalysisServerClient:
             config: 設定辞書
         """
         self.config = config
-        self.base_url = config['analysis_server']['base_url']
-        self.api_key = config['analysis_server']['api_key']
-        self.endpoints = config['analysis_server']['endpoints']
-        self.session = None
+        server_config = config['analysis_server']
+        http_config = server_config.get('http', {})
+        self.base_url = server_config['base_url']
+        self.api_key = server_config['api_key']
+        self.endpoints = server_config['endpoints']
+        self.max_concurrency = server_config.get('max_concurrency', 20)
+        self.request_timeout = server_config.get('request_timeout', 10)
+        self.connect_timeout = http_config.get('connect_timeout', 5)
+        self.max_connections = http_config.get('max_connections', self.max_concurrency)
+        self.keepalive_timeout = http_config.get('keepalive_timeout', 30)
+        self.dns_cache_ttl = http_config.get('dns_cache_ttl', 300)
+        self.retries = http_config.get('retries', 3)
+        self.retry_backoff = http_config.get('retry_backoff', 0.5)
+        self.retry_max_backoff = http_config.get('retry_max_backoff', 10)
+        # 連続でこの回数失敗したら利用不可とみなし、recheck_intervalごとにヘルスチェックで確認する
+        self.failure_threshold = http_config.get('failure_threshold', 3)
+        self.recheck_interval = http_config.get('recheck_interval', 30)
+        # 応答本文の上限（バイト）と、ストリーミング時に1回に読む大きさ
+        self.max_body_bytes = http_config.get('max_body_bytes', 64 * 1024 * 1024)
+        self.chunk_size = server_config.get('streaming', {}).get('chunk_size', 64 * 1024)
+        
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.consecutive_failures = 0
+        self._last_probe: Optional[float] = None
+        # 直近のget_all_devices_resultsで取得に失敗したデバイスとその理由
+        self.last_failures: Dict[str, str] = {}
+        # 直近のget_all_devices_resultsでのデバイスごとの取得時間（秒）
+        self.last_durations: Dict[str, float] = {}
         
     async def __aenter__(self):
         """非同期コンテキストマネージャーの開始"""
-        self.session = aiohttp.ClientSession(
-            headers={
-                'X-API-Key': self.api_key,
-                'Content-Type': 'application/json'
-            }
-        )
+        self._get_session()
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """非同期コンテキストマネージャーの終了"""
-        if self.session:
+        await self.close()
+        
+    def _get_session(self) -> aiohttp.ClientSession:
+        """接続プール付きのセッションを取得（未作成・閉じている・別のイベントループの場合は作成）"""
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self._session_loop is not loop:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=self.keepalive_timeout,
+                    use_dns_cache=True,
+                    ttl_dns_cache=self.dns_cache_ttl
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout, connect=self.connect_timeout),
+                headers={
+                    'X-API-Key': self.api_key,
+                    'Content-Type': 'application/json',
+                    'Accept-Encoding': 'gzip, deflate'
+                },
+                auto_decompress=True
+            )
+            self._session_loop = loop
+        return self.session
+        
+    async def close(self):
+        """セッションを閉じて接続を解放"""
+        if self.session and not self.session.closed:
             await self.session.close()
+        self.session = None
+        
+    @property
+    def healthy(self) -> bool:
+        """直近の要求の成否から見て分析サーバーが利用可能かどうか"""
+        return self.consecutive_failures < self.failure_threshold
+        
+    def _record_outcome(self, success: bool):
+        """要求の成否をサーバーの状態に反映"""
+        if success:
+            if not self.healthy:
+                logger.info("分析サーバーへの要求が回復しました")
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures == self.failure_threshold:
+                logger.error(f"分析サーバーへの要求が {self.consecutive_failures} 回連続で失敗しました")
+                
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """再試行までの待ち時間（指数バックオフにフルジッターを加えたもの）"""
+        if retry_after is not None:
+            return min(retry_after, self.retry_max_backoff)
+        return random.uniform(0, min(self.retry_max_backoff, self.retry_backoff * 2 ** attempt))
+        
+    async def _get_json(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        GET要求を送ってJSON応答を取得（一時的な失敗は再試行）
+        
+        Args:
+            path: エンドポイントのパス
+            params: クエリパラメータ
+            timeout: 1回の要求のタイムアウト（秒、Noneの場合はrequest_timeout）
+            
+        Returns:
+            デコード済みの応答
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._request(path, params, timeout) as response:
+                    data = json.loads(await self._read_body(response))
+                self._record_outcome(True)
+                return data
+            except Exception as e:
+                attempt = await self._retry_or_raise(e, attempt)
+                
+    @asynccontextmanager
+    async def _request(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        GET要求を送り、200の応答を受け取る（それ以外はAnalysisServerStatusError）
+        
+        Args:
+            path: エンドポイントのパス
+            params: クエリパラメータ
+            timeout: 1回の要求のタイムアウト（秒、Noneの場合はrequest_timeout）
+            headers: 追加のヘッダー
+        """
+        url = f"{self.base_url}{path}"
+        request_timeout = aiohttp.ClientTimeout(
+            total=timeout or self.request_timeout,
+            connect=self.connect_timeout
+        )
+        async with self._get_session().get(url, params=params, timeout=request_timeout, headers=headers) as response:
+            if response.status != 200:
+                header = response.headers.get('Retry-After', '')
+                raise AnalysisServerStatusError(
+                    f"ステータス {response.status}: {url}",
+                    response.status,
+                    float(header) if header.isdigit() else None
+                )
+            yield response
             
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        """応答本文を上限つきで読み込む"""
+        if response.content_length is not None and response.content_length > self.max_body_bytes:
+            raise BodyTooLargeError(f"応答本文が上限を超えています: {response.content_length} > {self.max_body_bytes}")
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(self.chunk_size):
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise BodyTooLargeError(f"応答本文が上限 {self.max_body_bytes} バイトを超えました")
+            chunks.append(chunk)
+        return b''.join(chunks)
+        
+    async def _retry_or_raise(self, error: Exception, attempt: int) -> int:
+        """
+        一時的な失敗であれば待機して次の試行番号を返し、それ以外は例外を送出
+        
+        Args:
+            error: 発生した例外
+            attempt: 失敗した試行の番号（0から）
+            
+        Returns:
+            次の試行の番号
+        """
+        if isinstance(error, AnalysisServerStatusError):
+            retryable = error.status in RETRYABLE_STATUSES
+        else:
+            retryable = isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+        if not retryable:
+            # 再試行しない5xxもサーバー側の障害として数え、要求自体の誤り（404や本文の上限超過など）は含めない
+            if isinstance(error, AnalysisServerStatusError) and error.status >= 500:
+                self._record_outcome(False)
+            raise error
+        if attempt >= self.retries:
+            self._record_outcome(False)
+            raise error
+        delay = self._backoff(attempt, getattr(error, 'retry_after', None))
+        logger.warning(f"分析サーバーへの要求を再試行します（{attempt + 1}/{self.retries}、{delay:.2f}秒後）: {error!r}")
+        await asyncio.sleep(delay)
+        return attempt + 1
+                
     async def health_check(self) -> bool:
         """
         分析サーバーのヘルスチェック
@@ -45,20 +236,33 @@ class AnalysisServerClient:
         Returns:
             サーバーが正常かどうか
         """
+        self._last_probe = time.monotonic()
         try:
-            url = f"{self.base_url}{self.endpoints['health']}"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"分析サーバーのヘルスチェック成功: {data}")
-                    return True
-                else:
-                    logger.error(f"分析サーバーのヘルスチェック失敗: {response.status}")
-                    return False
+            data = await self._get_json(self.endpoints['health'])
+            logger.info(f"分析サーバーのヘルスチェック成功: {data}")
+            return True
         except Exception as e:
-            logger.error(f"分析サーバーのヘルスチェック中にエラー: {e}")
+            logger.error(f"分析サーバーのヘルスチェック失敗: {e}")
+            # ヘルスチェックの失敗は回復を確認できるまで利用不可として扱う
+            self.consecutive_failures = max(self.consecutive_failures, self.failure_threshold)
             return False
             
+    async def is_available(self) -> bool:
+        """
+        分析サーバーが利用可能かどうか
+        
+        直近の要求が成功していれば追加の要求は行わない。連続で失敗している間は
+        recheck_intervalごとにヘルスチェックで回復を確認する。
+        
+        Returns:
+            要求を送ってよいかどうか
+        """
+        if self.healthy:
+            return True
+        if self._last_probe is not None and time.monotonic() - self._last_probe < self.recheck_interval:
+            return False
+        return await self.health_check()
+            
     async def get_analysis_results(
         self, 
         device_id: str,
@@ -79,27 +283,120 @@ class AnalysisServerClient:
             分析結果のリスト
         """
         try:
-            url = f"{self.base_url}{self.endpoints['results']}/{device_id}"
-            params = {'limit': limit}
-            
-            if start_time:
-                params['start_time'] = start_time
-            if end_time:
-                params['end_time'] = end_time
-                
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"分析結果を取得しました: {device_id}, 件数: {data.get('count', 0)}")
-                    return data.get('results', [])
-                else:
-                    logger.error(f"分析結果の取得に失敗: {response.status}")
-                    return []
-                    
+            return await self.fetch_analysis_results(device_id, start_time, end_time, limit)
         except Exception as e:
             logger.error(f"分析結果取得中にエラー: {e}")
             return []
             
+    async def fetch_analysis_results(
+        self,
+        device_id: str,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        limit: int = 100,
+        wait: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        分析結果の取得（失敗時は例外を送出）
+        
+        Args:
+            device_id: デバイスID
+            start_time: 開始時刻（UNIXタイムスタンプ）
+            end_time: 終了時刻（UNIXタイムスタンプ）
+            limit: 取得件数制限
+            wait: 結果がない場合にサーバー側で待機する秒数（ロングポーリング）
+            
+        Returns:
+            分析結果のリスト
+        """
+        params = {'limit': limit}
+        
+        if start_time:
+            params['start_time'] = start_time
+        if end_time:
+            params['end_time'] = end_time
+        if wait:
+            params['wait'] = wait
+            
+        data = await self._get_json(
+            f"{self.endpoints['results']}/{device_id}",
+            params=params,
+            timeout=self.request_timeout + (wait or 0)
+        )
+        logger.info(f"分析結果を取得しました: {device_id}, 件数: {data.get('count', 0)}")
+        return data.get('results', [])
+        
+    async def stream_analysis_results(
+        self,
+        device_id: str,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        limit: int = 100,
+        wait: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        分析結果を受信しながら1件ずつ取得
+        
+        応答がNDJSONの場合は1行ずつ、JSONの場合は配列（またはresultsの配列）の要素を
+        完結した順に返すため、本文全体を待たずに処理を始められる。
+        最初の1件を返す前の一時的な失敗のみ再試行する。
+        
+        Args:
+            device_id: デバイスID
+            start_time: 開始時刻（UNIXタイムスタンプ）
+            end_time: 終了時刻（UNIXタイムスタンプ）
+            limit: 取得件数制限
+            wait: 結果がない場合にサーバー側で待機する秒数（ロングポーリング）
+            
+        Yields:
+            分析結果
+        """
+        params = {'limit': limit}
+        if start_time:
+            params['start_time'] = start_time
+        if end_time:
+            params['end_time'] = end_time
+        if wait:
+            params['wait'] = wait
+            
+        attempt = 0
+        count = 0
+        while True:
+            try:
+                async with self._request(
+                    f"{self.endpoints['results']}/{device_id}",
+                    params=params,
+                    timeout=self.request_timeout + (wait or 0),
+                    headers={'Accept': 'application/x-ndjson, application/json;q=0.9'}
+                ) as response:
+                    content_type = response.headers.get('Content-Type', '')
+                    if 'ndjson' in content_type or 'jsonl' in content_type:
+                        parser = NdjsonStreamParser()
+                    else:
+                        parser = JsonArrayStreamParser('results')
+                        
+                    size = 0
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_body_bytes:
+                            raise BodyTooLargeError(f"応答本文が上限 {self.max_body_bytes} バイトを超えました")
+                        for result in parser.feed(chunk):
+                            count += 1
+                            yield result
+                    for result in parser.close():
+                        count += 1
+                        yield result
+                        
+                self._record_outcome(True)
+                logger.info(f"分析結果を受信しました: {device_id}, 件数: {count}")
+                return
+            except Exception as e:
+                if count:
+                    # 返した結果は取り消せないため、途中からの再試行はしない
+                    self._record_outcome(False)
+                    raise
+                attempt = await self._retry_or_raise(e, attempt)
+            
     async def get_latest_analysis_result(self, device_id: str) -> Optional[Dict[str, Any]]:
         """
         最新の分析結果の取得
@@ -111,48 +408,107 @@ class AnalysisServerClient:
             最新の分析結果
         """
         try:
-            url = f"{self.base_url}{self.endpoints['latest'].format(device_id=device_id)}"
-            
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"最新の分析結果を取得しました: {device_id}")
-                    return data
-                else:
-                    logger.error(f"最新の分析結果の取得に失敗: {response.status}")
-                    return None
-                    
+            data = await self._get_json(self.endpoints['latest'].format(device_id=device_id))
+            logger.info(f"最新の分析結果を取得しました: {device_id}")
+            return data
+            
         except Exception as e:
             logger.error(f"最新の分析結果取得中にエラー: {e}")
             return None
             
-    async def get_all_devices_results(self, limit_per_device: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    async def get_device_ids(self) -> List[str]:
+        """
+        監視対象のデバイスID一覧を取得
+        
+        設定のdevice_idsを優先し、未設定の場合はdevicesエンドポイントから取得する。
+        
+        Returns:
+            デバイスIDのリスト
+        """
+        device_ids = self.config['analysis_server'].get('device_ids')
+        if device_ids:
+            return list(device_ids)
+            
+        if 'devices' not in self.endpoints:
+            logger.warning("デバイスIDの設定とdevicesエンドポイントがありません")
+            return []
+            
+        try:
+            data = await self._get_json(self.endpoints['devices'])
+            devices = data.get('devices', []) if isinstance(data, dict) else data
+            # 文字列のリストと {'device_id': ...} のリストの両方を受け付ける
+            return [d['device_id'] if isinstance(d, dict) else d for d in devices]
+        except Exception as e:
+            logger.error(f"デバイス一覧の取得中にエラー: {e}")
+            return []
+            
+    async def get_all_devices_results(
+        self,
+        limit_per_device: int = 10,
+        start_times: Optional[Dict[str, int]] = None,
+        device_ids: Optional[List[str]] = None,
+        wait: Optional[float] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
         """
         全デバイスの分析結果を取得
         
+        デバイスごとの取得を同時実行数の上限つきで並行に行う。取得に失敗した
+        デバイスは結果から除外し、理由をlast_failuresに記録する。
+        
         Args:
             limit_per_device: デバイスごとの取得件数
+            start_times: デバイスIDをキーとした取得開始時刻（UNIXタイムスタンプ）
+            device_ids: 取得するデバイスID（Noneの場合は監視対象のすべて）
+            wait: 結果がない場合にサーバー側で待機する秒数（ロングポーリング）
             
         Returns:
             デバイスIDをキーとした分析結果の辞書
         """
         try:
-            # 全デバイスの結果を取得（実際の実装ではデバイスリストの取得が必要）
-            # ここでは例として固定のデバイスIDを使用
-            device_ids = ['edge-device-001', 'edge-device-002']  # 設定から取得するように変更
+            if device_ids is None:
+                device_ids = await self.get_device_ids()
+            start_times = start_times or {}
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            timeout = self.request_timeout + (wait or 0)
+            durations: Dict[str, float] = {}
+            
+            async def fetch(device_id: str) -> List[Dict[str, Any]]:
+                async with semaphore:
+                    started = time.monotonic()
+                    try:
+                        # タイムアウトは1回の要求ごとに適用し、再試行を含めて打ち切らない
+                        return await self.fetch_analysis_results(
+                            device_id=device_id,
+                            start_time=start_times.get(device_id),
+                            limit=limit_per_device,
+                            wait=wait
+                        )
+                    finally:
+                        durations[device_id] = time.monotonic() - started
+                    
+            outcomes = await asyncio.gather(
+                *(fetch(device_id) for device_id in device_ids),
+                return_exceptions=True
+            )
             
             all_results = {}
-            for device_id in device_ids:
-                results = await self.get_analysis_results(
-                    device_id=device_id,
-                    limit=limit_per_device
-                )
-                if results:
-                    all_results[device_id] = results
+            failures = {}
+            for device_id, outcome in zip(device_ids, outcomes):
+                if isinstance(outcome, asyncio.TimeoutError):
+                    failures[device_id] = f"タイムアウト（{timeout}秒）"
+                elif isinstance(outcome, Exception):
+                    failures[device_id] = str(outcome)
+                elif outcome:
+                    all_results[device_id] = outcome
                     
+            self.last_failures = failures
+            self.last_durations = durations
+            if failures:
+                logger.warning(f"分析結果の取得に失敗したデバイス: {len(failures)}/{len(device_ids)} {failures}")
+                
             logger.info(f"全デバイスの分析結果を取得しました: {len(all_results)} デバイス")
             return all_results
             
         except Exception as e:
             logger.error(f"全デバイスの分析結果取得中にエラー: {e}")
-            return {} 
\ No newline at end of file
+            return {}
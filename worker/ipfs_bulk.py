@@ -0,0 +1,117 @@
+import json
+import logging
+from typing import Dict, Any, List
+
+import requests
+
+from .payload_codec import encode_json
+
+logger = logging.getLogger(__name__)
+
+
+def multiaddr_to_url(api_addr: str) -> str:
+    """
+    IPFS APIのmultiaddrをHTTPのURLに変換
+
+    例: /ip4/127.0.0.1/tcp/5001 -> http://127.0.0.1:5001、/dns/ipfs/tcp/5001/https -> https://ipfs:5001
+
+    Args:
+        api_addr: multiaddr形式またはURL形式のアドレス
+
+    Returns:
+        HTTPのベースURL
+    """
+    if api_addr.startswith(('http://', 'https://')):
+        return api_addr.rstrip('/')
+    parts = [part for part in api_addr.split('/') if part]
+    if len(parts) < 4 or parts[2] != 'tcp':
+        raise ValueError(f"対応していないmultiaddrです: {api_addr}")
+    host = f"[{parts[1]}]" if parts[0] == 'ip6' else parts[1]
+    scheme = 'https' if 'https' in parts[4:] else 'http'
+    return f"{scheme}://{host}:{parts[3]}"
+
+
+def parse_add_response(text: str, count: int) -> List[str]:
+    """
+    addの応答からファイル名（入力の位置）順にCIDを取り出す
+
+    Args:
+        text: 応答本文（ファイルごとに1行のJSON、NDJSON）
+        count: 追加したファイル数
+
+    Returns:
+        入力と同じ順序のCIDのリスト
+    """
+    cids: Dict[int, str] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        name = entry.get('Name', '')
+        if name.isdigit():
+            cids[int(name)] = entry['Hash']
+
+    missing = [index for index in range(count) if index not in cids]
+    if missing:
+        raise RuntimeError(f"一括保存の応答にCIDが含まれていません: {missing}")
+    return [cids[index] for index in range(count)]
+
+
+class IpfsBulkUploader:
+    """複数レコードを1回のadd要求でIPFSに保存するクラス"""
+
+    def __init__(self, api_url: str, timeout: float = 30):
+        """
+        一括アップローダーの初期化
+
+        Args:
+            api_url: IPFS APIのアドレス（multiaddrまたはURL）
+            timeout: 要求のタイムアウト（秒）
+        """
+        self.base_url = multiaddr_to_url(api_url)
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def add_many(self, payloads: List[bytes], pin: bool = True) -> List[str]:
+        """
+        複数のバイト列を1回のマルチパート要求で追加
+
+        Args:
+            payloads: 追加するバイト列のリスト
+            pin: ピン留めするかどうか
+
+        Returns:
+            入力と同じ順序のCIDのリスト
+        """
+        if not payloads:
+            return []
+
+        files = [
+            ('file', (f"{index}", payload, 'application/octet-stream'))
+            for index, payload in enumerate(payloads)
+        ]
+        response = self._session.post(
+            f"{self.base_url}/api/v0/add",
+            params={'pin': 'true' if pin else 'false'},
+            files=files,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return parse_add_response(response.text, len(payloads))
+
+    def add_json_many(self, records: List[Dict[str, Any]], pin: bool = True) -> List[str]:
+        """
+        複数のJSONレコードを1回の要求で追加
+
+        Args:
+            records: 追加するレコードのリスト
+            pin: ピン留めするかどうか
+
+        Returns:
+            入力と同じ順序のCIDのリスト
+        """
+        return self.add_many([encode_json(record) for record in records], pin=pin)
+
+    def close(self):
+        """HTTPセッションを閉じる"""
+        self._session.close()
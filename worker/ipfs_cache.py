@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IpfsPayloadCache:
+    """CIDをキーとしたIPFSペイロードのサイズ上限つきLRUキャッシュ
+
+    CIDの内容は不変のため無効化は行わない。メモリ上の1段目に加え、
+    任意でディスク上の2段目を持つ。返すオブジェクトはキャッシュと共有されるため
+    呼び出し側で変更しないこと。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 1024 * 1024 * 1024
+    ):
+        """
+        キャッシュの初期化
+
+        Args:
+            max_bytes: メモリ上に保持するペイロードの合計サイズの上限（バイト）
+            disk_dir: ディスクキャッシュのディレクトリ（Noneの場合は無効）
+            disk_max_bytes: ディスクキャッシュの合計サイズの上限（バイト）
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries: 'OrderedDict[str, Tuple[Any, int]]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'disk_evictions': 0}
+
+        self._disk_size = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_size = sum(size for _, size, _ in self._scan_disk())
+
+    def get(self, cid: str) -> Optional[Any]:
+        """
+        キャッシュからペイロードを取得
+
+        Args:
+            cid: IPFSハッシュ
+
+        Returns:
+            ペイロード（キャッシュにない場合はNone）
+        """
+        with self._lock:
+            entry = self._entries.get(cid)
+            if entry is not None:
+                self._entries.move_to_end(cid)
+                self._stats['hits'] += 1
+                return entry[0]
+
+        payload = self._read_disk(cid)
+        with self._lock:
+            if payload is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+        self._put_memory(cid, payload[0], payload[1])
+        return payload[0]
+
+    def put(self, cid: str, data: Any):
+        """
+        ペイロードをキャッシュに追加
+
+        Args:
+            cid: IPFSハッシュ
+            data: ペイロード
+        """
+        encoded = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self._put_memory(cid, data, len(encoded))
+        self._write_disk(cid, encoded)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            ヒット数・ミス数・追い出し数と現在のサイズ
+        """
+        with self._lock:
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._size,
+                disk_bytes=self._disk_size
+            )
+
+    def _put_memory(self, cid: str, data: Any, size: int):
+        """メモリ上の1段目に追加し、上限を超えた分を古い順に追い出す"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(cid, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[cid] = (data, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._stats['evictions'] += 1
+
+    def _disk_path(self, cid: str) -> str:
+        """ディスクキャッシュのファイルパス（CIDの末尾2文字でディレクトリを分ける）"""
+        return os.path.join(self.disk_dir, cid[-2:], cid)
+
+    def _read_disk(self, cid: str) -> Optional[Tuple[Any, int]]:
+        """ディスク上の2段目から読み込み"""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(cid)
+        try:
+            with open(path, 'rb') as f:
+                encoded = f.read()
+            # 更新時刻を読み込み時刻として追い出し順に使う
+            os.utime(path)
+            return json.loads(encoded), len(encoded)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"ディスクキャッシュの読み込みに失敗: {cid}: {e}")
+            return None
+
+    def _write_disk(self, cid: str, encoded: bytes):
+        """ディスク上の2段目に書き込み"""
+        if not self.disk_dir or len(encoded) > self.disk_max_bytes:
+            return
+        path = self._disk_path(cid)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"ディスクキャッシュへの書き込みに失敗: {cid}: {e}")
+            return
+
+        with self._lock:
+            self._disk_size += len(encoded)
+            over_limit = self._disk_size > self.disk_max_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """ディスクキャッシュのファイル一覧（パス、サイズ、更新時刻）"""
+        for shard in os.scandir(self.disk_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def _evict_disk(self):
+        """ディスクキャッシュを上限の9割まで古い順に削除"""
+        files = sorted(self._scan_disk(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_size = total
+            self._stats['disk_evictions'] += evicted
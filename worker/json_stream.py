@@ -0,0 +1,199 @@
+import codecs
+import json
+from typing import Any, List, Optional
+
+_WHITESPACE = ' \t\r\n'
+# 数値の途中で現れうる文字（raw_decodeが手前で数値を打ち切っていないかの判定に使う）
+_NUMBER_CONTINUATION = '.eE+-0123456789'
+
+
+class BodyTooLargeError(ValueError):
+    """応答本文が上限を超えた場合の例外"""
+
+
+class JsonArrayStreamParser:
+    """JSON配列の要素を受信しながら1つずつ取り出すパーサー
+
+    トップレベルが配列の場合はその要素を、オブジェクトの場合は指定したキーの配列の要素を返す。
+    それ以外のキーの値（countなど）は読み飛ばし、fieldsに保持する。
+    要素は完結した時点で返すため、本文全体をメモリに保持しない。
+    """
+
+    def __init__(self, field: str = 'results'):
+        """
+        パーサーの初期化
+
+        Args:
+            field: トップレベルがオブジェクトの場合に要素を取り出す配列のキー
+        """
+        self.field = field
+        self.fields = {}
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = 0
+        # 'start' → 'array' → 'done'、または 'start' → 'object_key' ⇄ 'object_value'（→ 'array'）→ 'done'
+        self._state = 'start'
+        self._key: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        受信したバイト列を追加し、完結した要素を取り出す
+
+        Args:
+            chunk: 受信したバイト列
+
+        Returns:
+            新たに完結した要素のリスト
+        """
+        self._buffer += self._text_decoder.decode(chunk)
+        items = []
+        while self._step(items):
+            pass
+        # 処理済みの部分を捨ててバッファを小さく保つ
+        if self._position:
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+        return items
+
+    def close(self) -> List[Any]:
+        """
+        本文の終わりで、JSONが完結しているかを確認
+
+        Returns:
+            残りの要素（配列の要素は完結した時点で返すため常に空のリスト）
+        """
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        if self._state != 'done' or self._buffer[self._position:].strip(_WHITESPACE):
+            raise ValueError("応答のJSONが途中で終わっているか、形式が正しくありません")
+        return []
+
+    def _skip_whitespace(self) -> Optional[str]:
+        """空白を読み飛ばし、次の文字を返す（バッファの終わりではNone）"""
+        while self._position < len(self._buffer) and self._buffer[self._position] in _WHITESPACE:
+            self._position += 1
+        return self._buffer[self._position] if self._position < len(self._buffer) else None
+
+    def _decode_value(self) -> Optional[tuple]:
+        """次の値をデコード（まだ完結していない場合はNone）"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._position)
+        except json.JSONDecodeError:
+            # 値の途中でバッファが終わっているため続きを待つ（形式の誤りはclose()で検出する）
+            return None
+        # 数値やリテラルはバッファの終わりで切れている可能性がある
+        if end == len(self._buffer) and not isinstance(value, (dict, list, str)):
+            return None
+        # 数値の整数部の直後で切れていた場合は、続きの小数部・指数部を受け取るまで待つ
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and self._buffer[end] in _NUMBER_CONTINUATION:
+            return None
+        return value, end
+
+    def _step(self, items: List[Any]) -> bool:
+        """状態を1つ進める（進めなかった場合はFalse）"""
+        char = self._skip_whitespace()
+        if char is None or self._state == 'done':
+            return False
+
+        if self._state == 'start':
+            if char == '[':
+                self._state = 'array'
+            elif char == '{':
+                self._state = 'object_key'
+            else:
+                raise ValueError(f"JSONの配列またはオブジェクトではありません: {char!r}")
+            self._position += 1
+            return True
+
+        if self._state == 'array':
+            if char == ']':
+                self._position += 1
+                # オブジェクト内の配列であれば残りのキーを読む
+                self._state = 'object_key' if self._key is not None else 'done'
+                self._key = None
+                return True
+            if char == ',':
+                self._position += 1
+                return True
+            decoded = self._decode_value()
+            if decoded is None:
+                return False
+            value, self._position = decoded
+            items.append(value)
+            return True
+
+        if self._state == 'object_key':
+            if char == '}':
+                self._position += 1
+                self._state = 'done'
+                return True
+            if char == ',':
+                self._position += 1
+                return True
+            decoded = self._decode_value()
+            if decoded is None:
+                return False
+            key, position = decoded
+            if not isinstance(key, str):
+                raise ValueError("JSONオブジェクトのキーが文字列ではありません")
+            # キーの後の「:」まで読めてから進める
+            colon = position
+            while colon < len(self._buffer) and self._buffer[colon] in _WHITESPACE:
+                colon += 1
+            if colon >= len(self._buffer):
+                return False
+            if self._buffer[colon] != ':':
+                raise ValueError("JSONオブジェクトのキーの後に「:」がありません")
+            self._position = colon + 1
+            self._key = key
+            self._state = 'object_value'
+            return True
+
+        if self._state == 'object_value':
+            if self._key == self.field and char == '[':
+                # 要素を1つずつ取り出す配列
+                self._position += 1
+                self._state = 'array'
+                return True
+            decoded = self._decode_value()
+            if decoded is None:
+                return False
+            self.fields[self._key], self._position = decoded
+            self._key = None
+            self._state = 'object_key'
+            return True
+
+        return False
+
+
+class NdjsonStreamParser:
+    """NDJSON（1行に1つのJSON）を受信しながら1行ずつ取り出すパーサー"""
+
+    def __init__(self):
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        受信したバイト列を追加し、完結した行を取り出す
+
+        Args:
+            chunk: 受信したバイト列
+
+        Returns:
+            新たに完結した行のJSONのリスト
+        """
+        self._buffer += self._text_decoder.decode(chunk)
+        *lines, self._buffer = self._buffer.split('\n')
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def close(self) -> List[Any]:
+        """
+        本文の終わりで、改行のない最後の行を取り出す
+
+        Returns:
+            最後の行のJSON（ない場合は空のリスト）
+        """
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        line, self._buffer = self._buffer, ''
+        return [json.loads(line)] if line.strip() else []
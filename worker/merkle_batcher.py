@@ -0,0 +1,424 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# チェーン上のdeviceIdに記録するバッチの接頭辞
+BATCH_DEVICE_PREFIX = 'batch:'
+
+# 葉と内部ノードのハッシュを区別するためのドメイン分離用プレフィックス
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def hash_leaf(cid: str) -> bytes:
+    """CIDから葉ノードのハッシュを計算"""
+    return hashlib.sha256(LEAF_PREFIX + cid.encode('utf-8')).digest()
+
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    """子ノードから内部ノードのハッシュを計算"""
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    """CIDを葉とするMerkle木"""
+
+    def __init__(self, cids: List[str]):
+        """
+        Merkle木の構築
+
+        Args:
+            cids: 葉となるCIDのリスト（順序を保持する）
+        """
+        if not cids:
+            raise ValueError("Merkle木には1件以上のCIDが必要です")
+        self.cids = list(cids)
+        self.levels: List[List[bytes]] = [[hash_leaf(cid) for cid in self.cids]]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            if len(level) % 2 == 1:
+                # 奇数個の場合は末尾を複製して組にする
+                level = level + [level[-1]]
+            self.levels.append([hash_node(level[i], level[i + 1]) for i in range(0, len(level), 2)])
+
+    @property
+    def root(self) -> str:
+        """ルートハッシュ（16進文字列）"""
+        return self.levels[-1][0].hex()
+
+    def proof(self, index: int) -> List[Tuple[str, str]]:
+        """
+        包含証明の取得
+
+        Args:
+            index: 葉のインデックス
+
+        Returns:
+            (兄弟ノードの位置 'left'/'right', 兄弟ノードのハッシュ) のリスト
+        """
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            sibling_hash = level[sibling] if sibling < len(level) else level[index]
+            proof.append(('left' if sibling < index else 'right', sibling_hash.hex()))
+            index //= 2
+        return proof
+
+
+def compute_root(cid: str, proof: List[Tuple[str, str]]) -> str:
+    """
+    包含証明からルートハッシュを再計算
+
+    Args:
+        cid: 対象レコードのCID
+        proof: MerkleTree.proofで得た包含証明
+
+    Returns:
+        ルートハッシュ（16進文字列）
+    """
+    current = hash_leaf(cid)
+    for position, sibling_hex in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        current = hash_node(sibling, current) if position == 'left' else hash_node(current, sibling)
+    return current.hex()
+
+
+class ProofStore:
+    """レコードごとの包含証明を保持するローカルストア"""
+
+    def __init__(self, db_path: str):
+        """
+        証明ストアの初期化
+
+        Args:
+            db_path: SQLiteデータベースのパス
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS record_proofs (
+                cid TEXT PRIMARY KEY,
+                merkle_root TEXT NOT NULL,
+                manifest_cid TEXT NOT NULL,
+                leaf_index INTEGER NOT NULL,
+                proof TEXT NOT NULL,
+                device_id TEXT,
+                transaction_hash TEXT,
+                created_at INTEGER NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_record_proofs_root ON record_proofs (merkle_root)')
+        self._conn.commit()
+
+    def save_batch(self, rows: List[Dict[str, Any]]):
+        """
+        バッチ内の全レコードの証明を保存
+
+        Args:
+            rows: 証明情報の辞書のリスト
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    '''INSERT OR REPLACE INTO record_proofs
+                       (cid, merkle_root, manifest_cid, leaf_index, proof, device_id, transaction_hash, created_at)
+                       VALUES (:cid, :merkle_root, :manifest_cid, :leaf_index, :proof, :device_id,
+                               :transaction_hash, :created_at)''',
+                    [dict(row, proof=json.dumps(row['proof'])) for row in rows]
+                )
+
+    def get(self, cid: str) -> Optional[Dict[str, Any]]:
+        """
+        レコードの証明を取得
+
+        Args:
+            cid: レコードのCID
+
+        Returns:
+            証明情報（見つからない場合はNone）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                '''SELECT cid, merkle_root, manifest_cid, leaf_index, proof, device_id, transaction_hash, created_at
+                   FROM record_proofs WHERE cid = ?''',
+                (cid,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ['cid', 'merkle_root', 'manifest_cid', 'leaf_index', 'proof', 'device_id',
+                'transaction_hash', 'created_at']
+        record = dict(zip(keys, row))
+        record['proof'] = [tuple(step) for step in json.loads(record['proof'])]
+        return record
+
+    def delete(self, cids: List[str]):
+        """
+        確定しなかったバッチのレコードの証明を削除
+
+        Args:
+            cids: レコードのCIDのリスト
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.executemany('DELETE FROM record_proofs WHERE cid = ?', [(cid,) for cid in cids])
+
+    def close(self):
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class _BatchEntry:
+    """バッチ待ちのレコード"""
+    cid: str
+    device_id: str
+    timestamp: int
+    future: Future = field(default_factory=Future)
+
+
+class MerkleBatcher:
+    """複数レコードのCIDをMerkle木にまとめて1トランザクションで記録するクラス"""
+
+    def __init__(
+        self,
+        store_manifest: Callable[[Dict[str, Any]], str],
+        submit: Callable[[str, int, str], Tuple[str, Future]],
+        proof_store: ProofStore,
+        max_records: int = 100,
+        max_wait_seconds: float = 30,
+        on_submitted: Optional[Callable[[List[str], str], None]] = None
+    ):
+        """
+        バッチャーの初期化
+
+        Args:
+            store_manifest: バッチマニフェストをIPFSに保存しCIDを返す関数
+            submit: (ipfs_hash, timestamp, device_id) を送信し (tx_hash, Future) を返す関数
+            proof_store: 包含証明の保存先
+            max_records: 1バッチの最大レコード数
+            max_wait_seconds: 最初のレコードからバッチを確定するまでの最大待機時間（秒）
+            on_submitted: バッチのトランザクションの送信直後に (CIDのリスト, tx_hash) を渡して呼び出す関数
+        """
+        self.store_manifest = store_manifest
+        self.submit = submit
+        self.proof_store = proof_store
+        self.max_records = max_records
+        self.max_wait_seconds = max_wait_seconds
+        self.on_submitted = on_submitted
+
+        self._entries: List[_BatchEntry] = []
+        self._first_added_at: Optional[float] = None
+        self._lock = threading.Lock()
+        # 送信済みで確定・失敗を反映していないバッチ数
+        self._unsettled = 0
+        self._settled = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """時間経過によるバッチ確定スレッドの開始"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='merkle-batcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Merkleバッチモードを開始しました: 最大{self.max_records}件 / {self.max_wait_seconds}秒")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        スレッドを停止し、残っているレコードを記録
+
+        Args:
+            timeout: スレッド終了の待機時間（秒）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def wait_settled(self, timeout: Optional[float] = None) -> bool:
+        """
+        送信済みのバッチの確定・失敗が各レコードに反映されるまで待機
+
+        Args:
+            timeout: 待機時間（秒）
+
+        Returns:
+            すべてのバッチが反映されたかどうか
+        """
+        with self._settled:
+            return self._settled.wait_for(lambda: self._unsettled == 0, timeout)
+
+    def add(self, cid: str, device_id: str, timestamp: int) -> Future:
+        """
+        レコードをバッチに追加
+
+        Args:
+            cid: IPFSに保存済みのレコードのCID
+            device_id: デバイスID
+            timestamp: タイムスタンプ
+
+        Returns:
+            バッチのトランザクションの確定後に記録結果で解決されるFuture（送信・確定に失敗した場合は例外）
+        """
+        entry = _BatchEntry(cid=cid, device_id=device_id, timestamp=timestamp)
+        with self._lock:
+            if not self._entries:
+                self._first_added_at = time.monotonic()
+            self._entries.append(entry)
+            full = len(self._entries) >= self.max_records
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # 失敗は各レコードのFutureに設定済み
+                pass
+        return entry.future
+
+    @property
+    def pending_count(self) -> int:
+        """バッチ待ちのレコード数"""
+        with self._lock:
+            return len(self._entries)
+
+    def _run(self):
+        """待機時間を超えたバッチを確定するループ"""
+        interval = min(1.0, self.max_wait_seconds / 4) if self.max_wait_seconds > 0 else 1.0
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                expired = (
+                    self._first_added_at is not None
+                    and time.monotonic() - self._first_added_at >= self.max_wait_seconds
+                )
+            if expired:
+                try:
+                    self.flush()
+                except Exception:
+                    # 失敗は各レコードのFutureに設定済み
+                    pass
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """
+        バッチ待ちのレコードをまとめて記録
+
+        Returns:
+            バッチの記録結果（レコードがない場合はNone）
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+                self._first_added_at = None
+            if not entries:
+                return None
+
+            try:
+                tree = MerkleTree([entry.cid for entry in entries])
+                batch_timestamp = int(datetime.now().timestamp())
+                manifest = {
+                    'type': 'breathing_batch',
+                    'version': 1,
+                    'merkle_root': tree.root,
+                    'created_at': batch_timestamp,
+                    'records': [
+                        {'cid': entry.cid, 'device_id': entry.device_id, 'timestamp': entry.timestamp}
+                        for entry in entries
+                    ]
+                }
+                manifest_cid = self.store_manifest(manifest)
+                tx_hash, receipt_future = self.submit(
+                    manifest_cid,
+                    batch_timestamp,
+                    f"{BATCH_DEVICE_PREFIX}{tree.root}"
+                )
+
+                proofs = [
+                    {
+                        'cid': entry.cid,
+                        'merkle_root': tree.root,
+                        'manifest_cid': manifest_cid,
+                        'leaf_index': index,
+                        'proof': tree.proof(index),
+                        'device_id': entry.device_id,
+                        'transaction_hash': tx_hash,
+                        'created_at': batch_timestamp
+                    }
+                    for index, entry in enumerate(entries)
+                ]
+
+                result = {
+                    'merkle_root': tree.root,
+                    'manifest_cid': manifest_cid,
+                    'transaction_hash': tx_hash,
+                    'record_count': len(entries),
+                    'receipt_future': receipt_future
+                }
+                logger.info(f"Merkleバッチを送信しました: {len(entries)} 件, root {tree.root}, tx {tx_hash}")
+
+            except Exception as e:
+                logger.error(f"Merkleバッチの記録に失敗: {e}")
+                for entry in entries:
+                    entry.future.set_exception(e)
+                raise
+
+            # 再起動後も確定を追跡できるよう、送信済みのトランザクションを確定前に記録しておく
+            try:
+                self.proof_store.save_batch(proofs)
+                if self.on_submitted:
+                    self.on_submitted([entry.cid for entry in entries], tx_hash)
+            except Exception as e:
+                logger.error(f"Merkleバッチの送信記録に失敗: {tree.root}: {e}")
+
+            # 各レコードはバッチのトランザクションが確定してから解決する
+            with self._lock:
+                self._unsettled += 1
+            receipt_future.add_done_callback(lambda future: self._settle(entries, proofs, future))
+            return result
+
+    def _settle(self, entries: List[_BatchEntry], proofs: List[Dict[str, Any]], receipt_future: Future):
+        """バッチのトランザクションの確定・失敗を各レコードのFutureに反映"""
+        try:
+            self._resolve_entries(entries, proofs, receipt_future)
+        finally:
+            with self._settled:
+                self._unsettled -= 1
+                self._settled.notify_all()
+
+    def _resolve_entries(self, entries: List[_BatchEntry], proofs: List[Dict[str, Any]], receipt_future: Future):
+        """バッチのトランザクションの結果で各レコードのFutureを解決"""
+        try:
+            receipt = receipt_future.result()
+        except Exception as e:
+            logger.error(f"Merkleバッチが確定しませんでした: {proofs[0]['merkle_root']}: {e}")
+            try:
+                self.proof_store.delete([proof['cid'] for proof in proofs])
+            except Exception as delete_error:
+                logger.error(f"包含証明の削除に失敗: {delete_error}")
+            for entry in entries:
+                entry.future.set_exception(e)
+            return
+
+        for entry, proof in zip(entries, proofs):
+            entry.future.set_result({
+                'ipfs_hash': entry.cid,
+                'merkle_root': proof['merkle_root'],
+                'manifest_cid': proof['manifest_cid'],
+                'leaf_index': proof['leaf_index'],
+                'transaction_hash': proof['transaction_hash'],
+                'block_number': receipt['block_number']
+            })
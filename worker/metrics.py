@@ -0,0 +1,369 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 外部呼び出し（数ms）からブロック確定待ち（数分）までを覆うバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    """Prometheusのテキスト形式の数値表記"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """ラベル値のエスケープ"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    """ラベルの組を {name="value",...} の形式に変換"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """メトリクスの共通部分（名前・説明・ラベル名）"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        """キーワード引数のラベルをラベル名の順に並べる"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} のラベルが一致しません: {sorted(labels)} != {sorted(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """テキスト形式の行（HELP・TYPEを含む）"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        # ラベルなしのカウンターは未発生でも0を出力する
+        self._values: Dict[LabelValues, float] = {} if labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        カウンターを加算
+
+        Args:
+            amount: 加算する値
+            **labels: ラベル
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    """増減する値、またはスクレイプ時に関数で求める値"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels):
+        """
+        値を設定
+
+        Args:
+            value: 設定する値
+            **labels: ラベル
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Any]):
+        """
+        スクレイプ時に値を求める関数を設定
+
+        Args:
+            function: ラベルなしの場合は数値、ラベルありの場合は {ラベル値のタプル: 数値} を返す関数
+        """
+        if self.labelnames:
+            self._function = function
+        else:
+            self._function = lambda: {(): function()}
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                values = dict(self._function())
+            except Exception as e:
+                logger.warning(f"メトリクスの取得に失敗: {self.name}: {e}")
+                return []
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, tuple(str(v) for v in key))} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """累積バケットつきのヒストグラム"""
+
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル値ごとの [バケットごとの件数..., +Infの件数], 合計
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        """
+        観測値を追加
+
+        Args:
+            value: 観測値（秒など）
+            **labels: ラベル
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        ブロックの実行時間を観測するコンテキストマネージャー
+
+        Args:
+            **labels: ラベル
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスの登録とテキスト形式への出力"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        """同名のメトリクスがあれば既存のものを返す"""
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"同名で種類またはラベルの異なるメトリクスがあります: {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """カウンターを登録"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """ゲージを登録"""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """ヒストグラムを登録"""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        登録済みのメトリクスをPrometheusのテキスト形式で出力
+
+        Returns:
+            テキスト形式のメトリクス
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# ノードの処理段階ごとの所要時間と件数
+STAGE_DURATION = REGISTRY.histogram(
+    'csi_node_stage_duration_seconds',
+    '処理段階ごとの所要時間（秒）',
+    ('stage',)
+)
+RECORDS_PROCESSED = REGISTRY.counter(
+    'csi_node_records_processed_total',
+    'チェーンへの記録が確定した解析結果の件数'
+)
+RECORDS_FAILED = REGISTRY.counter(
+    'csi_node_records_failed_total',
+    '処理に失敗した解析結果の件数',
+    ('stage',)
+)
+RECORDS_DEDUPLICATED = REGISTRY.counter(
+    'csi_node_records_deduplicated_total',
+    '記録済みのため処理を省略した解析結果の件数'
+)
+WORK_QUEUE_ITEMS = REGISTRY.gauge(
+    'csi_node_work_queue_items',
+    '作業キューの状態ごとの項目数',
+    ('state',)
+)
+PENDING_TRANSACTIONS = REGISTRY.gauge(
+    'csi_node_pending_transactions',
+    '確定待ちのトランザクション数'
+)
+DEVICE_LAG = REGISTRY.gauge(
+    'csi_node_device_lag_seconds',
+    'デバイスごとの記録済み位置から現在時刻までの遅れ（秒）',
+    ('device_id',)
+)
+DEVICE_POLL_INTERVAL = REGISTRY.gauge(
+    'csi_node_device_poll_interval_seconds',
+    'デバイスごとの分析サーバーへの現在の問い合わせ間隔（秒）',
+    ('device_id',)
+)
+PIPELINE_ITEMS = REGISTRY.gauge(
+    'csi_node_pipeline_items',
+    'パイプラインの段階ごとの待機中・処理中の項目数',
+    ('stage', 'state')
+)
+SIGNER_BALANCE = REGISTRY.gauge(
+    'csi_node_signer_balance_wei',
+    '署名アカウントごとの最後に確認した残高（wei）',
+    ('account',)
+)
+SIGNER_ACTIVE = REGISTRY.gauge(
+    'csi_node_signer_active',
+    '署名アカウントごとの送信に使用中かどうか（1: 使用中、0: 残高不足で停止中）',
+    ('account',)
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics への要求に応答するハンドラー"""
+
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # スクレイプごとのアクセスログは出さない
+        pass
+
+
+class MetricsServer:
+    """メトリクスを公開するHTTPサーバー（バックグラウンドスレッドで動作）"""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 9100, registry: MetricsRegistry = REGISTRY):
+        """
+        メトリクスサーバーの初期化
+
+        Args:
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート
+            registry: 公開するメトリクスのレジストリ
+        """
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """待ち受けているポート"""
+        return self._server.server_address[1]
+
+    def start(self):
+        """サーバースレッドの開始"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        logger.info(f"メトリクスの公開を開始しました: ポート {self.port}")
+
+    def stop(self):
+        """サーバーの停止"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,149 @@
+import logging
+import threading
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# nonceの不整合を示すRPCエラーメッセージ（クライアント実装ごとの表記揺れを含む）
+NONCE_ERROR_MARKERS = (
+    'nonce too low',
+    'nonce too high',
+    'already known',
+    'known transaction',
+    'replacement transaction underpriced',
+    'invalid nonce',
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    """
+    例外がnonceの不整合に起因するかどうかを判定
+
+    Args:
+        error: 送信時に発生した例外
+
+    Returns:
+        nonce関連のエラーかどうか
+    """
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERROR_MARKERS)
+
+
+class NonceManager:
+    """送信アカウントのnonceをノード内で払い出すクラス"""
+
+    def __init__(self, w3, address: str):
+        """
+        nonceマネージャーの初期化
+
+        Args:
+            w3: Web3インスタンス
+            address: 送信アカウントのアドレス
+        """
+        self.w3 = w3
+        self.address = address
+        self._lock = threading.Lock()
+        self._next_nonce: Optional[int] = None
+        self._in_flight: Set[int] = set()
+        # 払い出し位置より手前で、送信に失敗して空いたnonce（次の払い出しで先に埋める）
+        self._gaps: Set[int] = set()
+
+    def sync(self) -> int:
+        """
+        チェーン上のpending nonceから払い出し位置を同期
+
+        Returns:
+            次に払い出すnonce
+        """
+        with self._lock:
+            return self._sync_locked()
+
+    def _sync_locked(self) -> int:
+        """ロック取得済みの状態でチェーンと同期"""
+        chain_nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+        # チェーンに取り込まれた分は送信中の集合から外す
+        self._in_flight = {nonce for nonce in self._in_flight if nonce >= chain_nonce}
+        # ノードがまだ受け取っていない送信中のnonceを払い出し直さないよう、その先から払い出し、
+        # 間の空いたnonceは先に埋める
+        self._next_nonce = max(self._in_flight) + 1 if self._in_flight else chain_nonce
+        self._gaps = set(range(chain_nonce, self._next_nonce)) - self._in_flight
+        logger.info(f"nonceをチェーンと同期しました: {self.address} -> {chain_nonce} (次の払い出し {self._next_nonce})")
+        return self._next_nonce
+
+    def allocate(self) -> int:
+        """
+        次のnonceを払い出す
+
+        初回のみチェーンへ問い合わせ、以降はローカルで単調増加させる。
+        送信に失敗して空いたnonceがあれば、後続のトランザクションが詰まらないよう先に払い出す。
+
+        Returns:
+            払い出したnonce
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                self._sync_locked()
+            if self._gaps:
+                nonce = min(self._gaps)
+                self._gaps.discard(nonce)
+            else:
+                nonce = self._next_nonce
+                self._next_nonce += 1
+            self._in_flight.add(nonce)
+            return nonce
+
+    def release(self, nonce: int):
+        """
+        送信に失敗したnonceを返却
+
+        直近に払い出したnonceであれば巻き戻し、そうでなければ
+        欠番として次の払い出しで埋める。
+
+        Args:
+            nonce: 返却するnonce
+        """
+        with self._lock:
+            self._in_flight.discard(nonce)
+            if self._next_nonce is None:
+                return
+            if nonce == self._next_nonce - 1:
+                self._next_nonce = nonce
+                # 末尾に続く欠番もまとめて巻き戻す
+                while self._next_nonce - 1 in self._gaps:
+                    self._next_nonce -= 1
+                    self._gaps.discard(self._next_nonce)
+            elif nonce < self._next_nonce:
+                logger.warning(f"nonceに欠番が発生したため次の払い出しで埋めます: {nonce}")
+                self._gaps.add(nonce)
+
+    def confirm(self, nonce: int):
+        """
+        チェーンに取り込まれたnonceを送信中の集合から外す
+
+        Args:
+            nonce: 取り込まれたnonce
+        """
+        with self._lock:
+            self._in_flight.discard(nonce)
+
+    def resync(self, dropped: Optional[int] = None):
+        """
+        トランザクションの破棄・置換後にチェーンと再同期
+
+        次回のallocate時にチェーンのpending nonceを取得し直す。
+        破棄したトランザクションのnonceは送信中の集合から外し、欠番として埋め直す。
+
+        Args:
+            dropped: 破棄とみなしたトランザクションのnonce
+        """
+        with self._lock:
+            logger.warning(f"nonceの再同期を要求しました: {self.address}")
+            if dropped is not None:
+                self._in_flight.discard(dropped)
+            self._next_nonce = None
+
+    @property
+    def in_flight_count(self) -> int:
+        """送信済みで未確定のトランザクション数"""
+        with self._lock:
+            return len(self._in_flight)
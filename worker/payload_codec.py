@@ -0,0 +1,144 @@
+import json
+import struct
+from typing import Any, Optional
+
+# 任意の依存パッケージ（未インストールの場合は該当する形式を選択できない）
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 自己記述ヘッダー: マジック(4) + バージョン(1) + 形式(1) + 圧縮(1)
+MAGIC = b'CSIP'
+HEADER = struct.Struct('>4sBBB')
+HEADER_VERSION = 1
+
+CODEC_IDS = {'json': 1, 'cbor': 2, 'msgpack': 3}
+COMPRESSION_IDS = {None: 0, 'zstd': 1}
+
+
+def encode_json(data: Any) -> bytes:
+    """
+    ipfshttpclientのadd_jsonと同一のバイト列にJSONを符号化
+
+    同じ内容が同じCIDになるよう、キー順序・区切り文字を揃える。
+    """
+    return json.dumps(
+        data,
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':'),
+        allow_nan=False
+    ).encode('utf-8')
+
+
+def _require(module, name: str):
+    """任意の依存パッケージが利用可能か確認"""
+    if module is None:
+        raise ValueError(f"{name} がインストールされていません: pip install {name}")
+    return module
+
+
+class PayloadCodec:
+    """IPFSに保存するペイロードの符号化形式"""
+
+    def __init__(self, codec: str = 'json', compression: Optional[str] = None, level: int = 3):
+        """
+        符号化形式の初期化
+
+        Args:
+            codec: 'json'、'cbor'、'msgpack' のいずれか
+            compression: None または 'zstd'
+            level: zstdの圧縮レベル
+        """
+        if codec not in CODEC_IDS:
+            raise ValueError(f"対応していない符号化形式です: {codec}")
+        if compression not in COMPRESSION_IDS:
+            raise ValueError(f"対応していない圧縮形式です: {compression}")
+        if codec == 'cbor':
+            _require(cbor2, 'cbor2')
+        elif codec == 'msgpack':
+            _require(msgpack, 'msgpack')
+        if compression == 'zstd':
+            _require(zstandard, 'zstandard')
+
+        self.codec = codec
+        self.compression = compression
+        self.level = level
+
+    @property
+    def is_plain_json(self) -> bool:
+        """従来と同じヘッダーなしのJSONで保存するかどうか"""
+        return self.codec == 'json' and self.compression is None
+
+    def encode(self, data: Any) -> bytes:
+        """
+        ペイロードの符号化
+
+        JSONかつ無圧縮の場合は従来のadd_jsonと同一のバイト列（ヘッダーなし）を返す。
+
+        Args:
+            data: 符号化するデータ
+
+        Returns:
+            符号化したバイト列
+        """
+        if self.is_plain_json:
+            return encode_json(data)
+
+        if self.codec == 'json':
+            body = encode_json(data)
+        elif self.codec == 'cbor':
+            body = cbor2.dumps(data)
+        else:
+            body = msgpack.packb(data, use_bin_type=True)
+
+        if self.compression == 'zstd':
+            body = zstandard.ZstdCompressor(level=self.level).compress(body)
+
+        header = HEADER.pack(MAGIC, HEADER_VERSION, CODEC_IDS[self.codec], COMPRESSION_IDS[self.compression])
+        return header + body
+
+
+def decode_payload(raw: bytes) -> Any:
+    """
+    ペイロードの復号
+
+    ヘッダーがあればその形式で、なければ従来のJSONとして復号する。
+
+    Args:
+        raw: IPFSから取得したバイト列
+
+    Returns:
+        復号したデータ
+    """
+    if not raw.startswith(MAGIC):
+        return json.loads(raw)
+
+    _, version, codec_id, compression_id = HEADER.unpack_from(raw)
+    if version != HEADER_VERSION:
+        raise ValueError(f"対応していないペイロードのバージョンです: {version}")
+    body = raw[HEADER.size:]
+
+    if compression_id == COMPRESSION_IDS['zstd']:
+        body = _require(zstandard, 'zstandard').ZstdDecompressor().decompress(body)
+    elif compression_id != COMPRESSION_IDS[None]:
+        raise ValueError(f"対応していない圧縮形式です: {compression_id}")
+
+    if codec_id == CODEC_IDS['json']:
+        return json.loads(body)
+    if codec_id == CODEC_IDS['cbor']:
+        return _require(cbor2, 'cbor2').loads(body)
+    if codec_id == CODEC_IDS['msgpack']:
+        return _require(msgpack, 'msgpack').unpackb(body, raw=False)
+    raise ValueError(f"対応していない符号化形式です: {codec_id}")
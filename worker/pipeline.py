@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 次の段階へ項目を渡す関数（次の段階のキューが満杯の間は待機する）
+Emit = Callable[[Any], Awaitable[None]]
+# 段階の処理関数（取り出した項目のリストと、次の段階へ渡す関数を受け取る）
+StageHandler = Callable[[List[Any], Emit], Awaitable[None]]
+
+
+class PipelineClosedError(RuntimeError):
+    """停止したパイプラインに項目を追加しようとした場合の例外"""
+
+
+class PipelineStage:
+    """パイプラインの1段階"""
+
+    def __init__(
+        self,
+        name: str,
+        handler: StageHandler,
+        concurrency: int = 1,
+        queue_size: int = 100,
+        batch_size: int = 1
+    ):
+        """
+        段階の初期化
+
+        Args:
+            name: 段階名
+            handler: 処理関数
+            concurrency: 同時に処理するワーカー数
+            queue_size: 入力キューの上限
+            batch_size: 1回の処理でまとめて取り出す最大件数
+        """
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+
+
+class Pipeline:
+    """段階ごとに上限つきの入力キューと並行数を持つasyncioのパイプライン
+
+    各段階のワーカーは入力キューから項目を取り出して処理し、emitで次の段階のキューに渡す。
+    キューが満杯の間はemit（先頭の段階ではput）が空きを待つため、遅い段階があると上流が止まり、
+    メモリ上の項目数は各段階のキューの上限と並行数の合計に収まる。
+    1つの入力から複数の項目を渡すことも、1つも渡さない（検証に失敗した場合など）こともできる。
+    """
+
+    def __init__(self, stages: Sequence[PipelineStage], name: str = 'pipeline'):
+        """
+        パイプラインの初期化
+
+        Args:
+            stages: 上流から順に並べた段階
+            name: ログとタスク名に使う名前
+        """
+        if not stages:
+            raise ValueError("パイプラインには1つ以上の段階が必要です")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"段階名が重複しています: {names}")
+
+        self.name = name
+        self.stages = list(stages)
+        self._index = {stage.name: index for index, stage in enumerate(self.stages)}
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._idle: Optional[asyncio.Event] = None
+        self._in_flight = 0
+        self._closed = False
+        self._running = {stage.name: 0 for stage in self.stages}
+        self._processed = {stage.name: 0 for stage in self.stages}
+        self._failed = {stage.name: 0 for stage in self.stages}
+
+    async def start(self):
+        """各段階のワーカーを開始（イベントループ上で呼び出す）"""
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(stage.queue_size) for stage in self.stages]
+        self._idle = asyncio.Event()
+        self._idle.set()
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.concurrency):
+                self._tasks.append(asyncio.create_task(
+                    self._worker(index), name=f"{self.name}-{stage.name}-{number}"
+                ))
+        logger.info(
+            f"パイプラインを開始しました: {self.name} "
+            f"({', '.join(f'{stage.name}×{stage.concurrency}' for stage in self.stages)})"
+        )
+
+    @property
+    def closed(self) -> bool:
+        """停止処理を開始したかどうか"""
+        return self._closed
+
+    @property
+    def in_flight(self) -> int:
+        """キューにあるか処理中の項目数"""
+        return self._in_flight
+
+    async def put(self, item: Any, stage: Optional[str] = None):
+        """
+        項目を追加（キューが満杯の間は空きを待つ）
+
+        Args:
+            item: 追加する項目
+            stage: 追加先の段階名（Noneの場合は先頭の段階）
+
+        Raises:
+            PipelineClosedError: 停止処理を開始している場合
+        """
+        if self._closed:
+            raise PipelineClosedError(f"パイプラインは停止しています: {self.name}")
+        await self._enqueue(self._index[stage] if stage else 0, item)
+
+    def free_slots(self, stage: str) -> int:
+        """
+        段階の入力キューの空き数
+
+        Args:
+            stage: 段階名
+
+        Returns:
+            待たずに追加できる件数
+        """
+        queue = self._queues[self._index[stage]]
+        return max(0, queue.maxsize - queue.qsize())
+
+    async def _enqueue(self, index: int, item: Any):
+        """段階の入力キューに追加し、未完了の項目数を数える"""
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            await self._queues[index].put(item)
+        except BaseException:
+            self._finish(1)
+            raise
+
+    def _finish(self, count: int):
+        """項目の完了を反映"""
+        self._in_flight -= count
+        if self._in_flight == 0:
+            self._idle.set()
+
+    async def _worker(self, index: int):
+        """段階のワーカー（入力キューから取り出して処理関数に渡す）"""
+        stage = self.stages[index]
+        queue = self._queues[index]
+        is_last = index == len(self.stages) - 1
+
+        async def emit(item: Any):
+            # 最後の段階の出力は捨てる
+            if not is_last:
+                await self._enqueue(index + 1, item)
+
+        while True:
+            items = [await queue.get()]
+            while len(items) < stage.batch_size and not queue.empty():
+                items.append(queue.get_nowait())
+            self._running[stage.name] += len(items)
+            try:
+                await stage.handler(items, emit)
+                self._processed[stage.name] += len(items)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failed[stage.name] += len(items)
+                logger.error(f"パイプラインの段階 {stage.name} で {len(items)} 件の処理に失敗: {e}")
+            finally:
+                self._running[stage.name] -= len(items)
+                # 次の段階へ渡した項目は渡した時点で数えているため、取り出した分だけ減らす
+                self._finish(len(items))
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        キューにある項目と処理中の項目がすべて完了するまで待機
+
+        Args:
+            timeout: 待機時間（秒、Noneの場合は完了まで）
+
+        Returns:
+            すべて完了したかどうか
+        """
+        if self._idle is None:
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self, timeout: Optional[float] = None) -> bool:
+        """
+        新しい項目の受け付けを止め、処理中の項目を流し切ってから停止
+
+        Args:
+            timeout: 流し切るまでの待機時間（秒、Noneの場合は完了まで）
+
+        Returns:
+            すべての項目を流し切れたかどうか
+        """
+        self._closed = True
+        drained = await self.join(timeout)
+        if not drained:
+            logger.warning(f"パイプラインの停止時に未完了の項目が残りました: {self.name}: {self.snapshot()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"パイプラインを停止しました: {self.name}")
+        return drained
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        段階ごとの状態を取得
+
+        Returns:
+            段階名をキーとした待機中・処理中・処理済み・失敗の件数
+        """
+        return {
+            stage.name: {
+                'queued': self._queues[index].qsize() if self._queues else 0,
+                'running': self._running[stage.name],
+                'processed': self._processed[stage.name],
+                'failed': self._failed[stage.name]
+            }
+            for index, stage in enumerate(self.stages)
+        }
@@ -0,0 +1,238 @@
+import logging
+import random
+import time
+from typing import Dict, Any, Optional, List, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class _DeviceState:
+    """デバイスごとのポーリング状態"""
+
+    __slots__ = ('interval', 'next_poll_at', 'idle_streak', 'failures')
+
+    def __init__(self, interval: float, next_poll_at: float):
+        self.interval = interval
+        self.next_poll_at = next_poll_at
+        self.idle_streak = 0
+        self.failures = 0
+
+
+class AdaptivePollScheduler:
+    """デバイスごとに分析サーバーへの問い合わせ間隔を調整するスケジューラー
+
+    取得件数が上限に達した（まだ続きがある）デバイスは最短間隔ですぐに再取得し、
+    新しい結果がないデバイスや取得に失敗したデバイスは間隔を指数的に延ばす。
+    待ち時間にはジッターを加え、多数のデバイスの問い合わせが同時刻に揃わないようにする。
+    """
+
+    def __init__(
+        self,
+        base_interval: float,
+        min_interval: float = 0.0,
+        max_interval: float = 300.0,
+        backoff_factor: float = 2.0,
+        jitter: float = 0.2,
+        device_refresh_interval: float = 300.0,
+        long_poll_wait: Optional[float] = None,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        スケジューラーの初期化
+
+        Args:
+            base_interval: 新しい結果があったデバイスの問い合わせ間隔（秒）
+            min_interval: 取得件数が上限に達したデバイスの問い合わせ間隔（秒）
+            max_interval: バックオフ時の間隔の上限（秒）
+            backoff_factor: 結果なし・失敗が続くたびに間隔に掛ける倍率
+            jitter: 待ち時間を短縮する割合の上限（0.2の場合は間隔の80〜100%）
+            device_refresh_interval: デバイス一覧を取得し直す間隔（秒）
+            long_poll_wait: ロングポーリングの待機時間（秒、Noneの場合は使わない）
+            rng: ジッターに使う乱数生成器
+        """
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, base_interval)
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.device_refresh_interval = device_refresh_interval
+        self.long_poll_wait = long_poll_wait
+        self._rng = rng or random.Random()
+        self._devices: Dict[str, _DeviceState] = {}
+        self._devices_synced_at: Optional[float] = None
+
+    @property
+    def devices(self) -> List[str]:
+        """スケジュール対象のデバイスID"""
+        return list(self._devices)
+
+    def needs_device_refresh(self, now: Optional[float] = None) -> bool:
+        """デバイス一覧を取得し直す時期かどうか"""
+        now = time.monotonic() if now is None else now
+        return (
+            self._devices_synced_at is None
+            or now - self._devices_synced_at >= self.device_refresh_interval
+        )
+
+    def sync(self, device_ids: Iterable[str], now: Optional[float] = None):
+        """
+        スケジュール対象のデバイスを更新
+
+        新しいデバイスはすぐに問い合わせ、一覧から消えたデバイスは対象から外す。
+
+        Args:
+            device_ids: 監視対象のデバイスID
+            now: 現在時刻（time.monotonic()）
+        """
+        now = time.monotonic() if now is None else now
+        device_ids = list(device_ids)
+        for device_id in device_ids:
+            if device_id not in self._devices:
+                self._devices[device_id] = _DeviceState(self.base_interval, now)
+        for device_id in set(self._devices) - set(device_ids):
+            del self._devices[device_id]
+        self._devices_synced_at = now
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """
+        問い合わせ時刻に達したデバイスを取得
+
+        Args:
+            now: 現在時刻（time.monotonic()）
+
+        Returns:
+            問い合わせるデバイスIDのリスト（待ち時間の長いものから）
+        """
+        now = time.monotonic() if now is None else now
+        due = [(state.next_poll_at, device_id) for device_id, state in self._devices.items()
+               if state.next_poll_at <= now]
+        return [device_id for _, device_id in sorted(due)]
+
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        """
+        次にいずれかのデバイスを問い合わせるまでの秒数
+
+        Args:
+            now: 現在時刻（time.monotonic()）
+
+        Returns:
+            待ち時間（対象デバイスがない場合・すべて問い合わせ中の場合は基本間隔）
+        """
+        now = time.monotonic() if now is None else now
+        if not self._devices:
+            return self.base_interval
+        next_poll_at = min(state.next_poll_at for state in self._devices.values())
+        if next_poll_at == float('inf'):
+            # すべて問い合わせ中の場合は基本間隔で見直す
+            return self.base_interval
+        return max(0.0, next_poll_at - now)
+
+    def mark_polling(self, device_id: str):
+        """
+        問い合わせ中のデバイスを、結果が記録されるまで問い合わせ対象から外す
+
+        Args:
+            device_id: デバイスID
+        """
+        state = self._devices.get(device_id)
+        if state is not None:
+            state.next_poll_at = float('inf')
+
+    def _schedule(self, state: _DeviceState, interval: float, now: float, jitter: bool = True) -> float:
+        """次の問い合わせ時刻を設定"""
+        state.interval = interval
+        delay = interval * (1 - self._rng.uniform(0, self.jitter)) if jitter else interval
+        state.next_poll_at = now + delay
+        return delay
+
+    def record_result(
+        self,
+        device_id: str,
+        fetched: int,
+        new: int,
+        limit: int,
+        elapsed: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> float:
+        """
+        取得結果に応じて次の問い合わせ時刻を設定
+
+        Args:
+            device_id: デバイスID
+            fetched: 分析サーバーから取得した件数
+            new: そのうち未処理だった件数
+            limit: 1回の取得件数の上限
+            elapsed: 取得にかかった時間（秒、ロングポーリングの判定に使う）
+            now: 現在時刻（time.monotonic()）
+
+        Returns:
+            次の問い合わせまでの秒数
+        """
+        now = time.monotonic() if now is None else now
+        state = self._devices.get(device_id)
+        if state is None:
+            state = self._devices[device_id] = _DeviceState(self.base_interval, now)
+        state.failures = 0
+
+        if new > 0 and fetched >= limit:
+            # 続きがあるため、追いつくまで最短間隔で取得する
+            state.idle_streak = 0
+            return self._schedule(state, self.min_interval, now, jitter=False)
+        if new > 0:
+            state.idle_streak = 0
+            return self._schedule(state, self.base_interval, now)
+
+        # サーバーが待機時間いっぱいまで応答を保留した場合は、待機自体が間隔の役割を果たす
+        if self.long_poll_wait and elapsed is not None and elapsed >= self.long_poll_wait / 2:
+            state.idle_streak = 0
+            return self._schedule(state, self.min_interval, now, jitter=False)
+
+        state.idle_streak += 1
+        interval = min(self.max_interval, self.base_interval * self.backoff_factor ** (state.idle_streak - 1))
+        return self._schedule(state, interval, now)
+
+    def record_failure(self, device_id: str, now: Optional[float] = None) -> float:
+        """
+        取得失敗に応じて次の問い合わせ時刻を設定
+
+        Args:
+            device_id: デバイスID
+            now: 現在時刻（time.monotonic()）
+
+        Returns:
+            次の問い合わせまでの秒数
+        """
+        now = time.monotonic() if now is None else now
+        state = self._devices.get(device_id)
+        if state is None:
+            state = self._devices[device_id] = _DeviceState(self.base_interval, now)
+        state.failures += 1
+        interval = min(self.max_interval, self.base_interval * self.backoff_factor ** state.failures)
+        return self._schedule(state, interval, now)
+
+    def intervals(self) -> Dict[str, float]:
+        """
+        デバイスごとの現在の問い合わせ間隔
+
+        Returns:
+            デバイスIDをキーとした間隔（秒）
+        """
+        return {device_id: state.interval for device_id, state in self._devices.items()}
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        デバイスごとのスケジュール状態を取得
+
+        Returns:
+            デバイスIDをキーとした間隔・次の問い合わせまでの秒数・連続回数
+        """
+        now = time.monotonic() if now is None else now
+        return {
+            device_id: {
+                'interval': state.interval,
+                'next_poll_in': max(0.0, state.next_poll_at - now),
+                'idle_streak': state.idle_streak,
+                'failures': state.failures
+            }
+            for device_id, state in self._devices.items()
+        }
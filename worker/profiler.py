@@ -0,0 +1,86 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """全スレッドのスタックを一定間隔で採取するサンプリングプロファイラー
+
+    結果はflamegraph.plやspeedscopeで読み込めるcollapsed stack形式
+    （1行に「スレッド名;外側の関数;...;内側の関数 サンプル数」）で書き出す。
+    """
+
+    def __init__(self, output: str, interval: float = 0.005):
+        """
+        プロファイラーの初期化
+
+        Args:
+            output: 書き出し先のファイル
+            interval: サンプリング間隔（秒）
+        """
+        self.output = output
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at: Optional[float] = None
+
+    def start(self):
+        """サンプリングスレッドの開始"""
+        self._stop_event.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"プロファイルの採取を開始しました: 間隔 {self.interval * 1000:.1f} ms")
+
+    def _run(self):
+        """サンプリングループ"""
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.sample_count += 1
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        """フレームを外側から内側の順に「;」で連結"""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        # collapsed stack形式では「;」がフレームの区切りになる
+        return ';'.join(name.replace(';', ':') for name in reversed(frames))
+
+    def stop(self) -> Dict[str, float]:
+        """
+        サンプリングを停止して結果を書き出す
+
+        Returns:
+            採取時間（秒）とサンプリング回数
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+
+        directory = os.path.dirname(self.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.output, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        logger.info(f"プロファイルを書き出しました: {self.output} ({self.sample_count} 回, {elapsed:.1f} 秒)")
+        return {'seconds': elapsed, 'samples': self.sample_count}
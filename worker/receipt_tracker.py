@@ -0,0 +1,320 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Callable
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionRevertedError(RuntimeError):
+    """取り込まれたトランザクションが失敗（status 0）した場合の例外"""
+
+
+@dataclass
+class PendingTransaction:
+    """確定待ちトランザクションの情報"""
+    tx_hash: str
+    future: Future
+    nonce: Optional[int] = None
+    sender: Optional[str] = None
+    submitted_at: float = field(default_factory=time.monotonic)
+    block_number: Optional[int] = None
+    # タイムアウト後もnonceが未消費のため追跡を続けているかどうか
+    stalled: bool = False
+
+
+class ReceiptTracker:
+    """送信済みトランザクションのレシートをバックグラウンドで追跡するクラス"""
+
+    def __init__(
+        self,
+        w3,
+        rpc_url: str,
+        poll_interval: float = 1.0,
+        confirmations: int = 1,
+        timeout: float = 600,
+        batch_size: int = 100,
+        on_confirmed: Optional[Callable[[PendingTransaction], None]] = None,
+        on_dropped: Optional[Callable[[PendingTransaction], None]] = None,
+        session: Optional[requests.Session] = None
+    ):
+        """
+        レシートトラッカーの初期化
+
+        Args:
+            w3: Web3インスタンス
+            rpc_url: JSON-RPCのURL（バッチ問い合わせに使用）
+            poll_interval: レシート確認の間隔（秒）
+            confirmations: 確定とみなすまでのブロック数（取り込みブロックを含む）
+            timeout: 破棄を疑うまでの待機時間（秒、経過後は送信元のnonceが他のトランザクションで
+                     消費されるまで追跡を続ける）
+            batch_size: 1回のバッチ問い合わせで確認するトランザクション数
+            on_confirmed: 確定時に呼び出すコールバック
+            on_dropped: 破棄とみなした際に呼び出すコールバック
+            session: バッチ問い合わせに使うHTTPセッション（Noneの場合は新規に作成）
+        """
+        self.w3 = w3
+        self.rpc_url = rpc_url
+        self.poll_interval = poll_interval
+        self.confirmations = max(1, confirmations)
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.on_confirmed = on_confirmed
+        self.on_dropped = on_dropped
+
+        self._pending: Dict[str, PendingTransaction] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # 渡されたセッションは呼び出し側が閉じるため、自前で作成した場合のみ閉じる
+        self._owns_session = session is None
+        self._session = session or requests.Session()
+        self._batch_supported = True
+
+    def start(self):
+        """追跡スレッドの開始"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='receipt-tracker', daemon=True)
+        self._thread.start()
+        logger.info("レシートトラッカーを開始しました")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        追跡スレッドの停止
+
+        Args:
+            timeout: スレッド終了の待機時間（秒）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._owns_session:
+            self._session.close()
+        logger.info("レシートトラッカーを停止しました")
+
+    def track(
+        self,
+        tx_hash: str,
+        nonce: Optional[int] = None,
+        callback: Optional[Callable[[Future], None]] = None,
+        sender: Optional[str] = None
+    ) -> Future:
+        """
+        トランザクションを追跡対象に追加
+
+        Args:
+            tx_hash: トランザクションハッシュ
+            nonce: トランザクションのnonce
+            callback: 確定・失敗時に呼び出すコールバック
+            sender: 送信元アカウントのアドレス
+
+        Returns:
+            確定時にレシート情報で解決されるFuture
+        """
+        future: Future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        with self._lock:
+            self._pending[tx_hash] = PendingTransaction(
+                tx_hash=tx_hash, future=future, nonce=nonce, sender=sender
+            )
+        return future
+
+    def get(self, tx_hash: str) -> Optional[PendingTransaction]:
+        """
+        確定待ちトランザクションの取得
+
+        Args:
+            tx_hash: トランザクションハッシュ
+
+        Returns:
+            確定待ちであればその情報、追跡対象外であればNone
+        """
+        with self._lock:
+            return self._pending.get(tx_hash)
+
+    @property
+    def pending_count(self) -> int:
+        """確定待ちのトランザクション数"""
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        """レシートのポーリングループ"""
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error(f"レシート確認中にエラーが発生: {e}")
+
+    def poll_once(self):
+        """確定待ちトランザクションのレシートを1回確認"""
+        with self._lock:
+            pending = list(self._pending.values())
+        if not pending:
+            return
+
+        latest_block = self.w3.eth.block_number
+        now = time.monotonic()
+        # タイムアウトしたトランザクションの送信元ごとの取り込み済みnonce（1回の確認で共有する）
+        mined_nonces: Dict[str, Optional[int]] = {}
+
+        for start in range(0, len(pending), self.batch_size):
+            chunk = pending[start:start + self.batch_size]
+            receipts = self._fetch_receipts([tx.tx_hash for tx in chunk])
+
+            for tx in chunk:
+                receipt = receipts.get(tx.tx_hash)
+                if receipt is None:
+                    # 一度取り込まれた後に消えた場合は再編成として待ち直す
+                    tx.block_number = None
+                    if now - tx.submitted_at > self.timeout:
+                        self._check_stalled(tx, mined_nonces)
+                    continue
+
+                tx.block_number = receipt['block_number']
+                if latest_block - tx.block_number + 1 >= self.confirmations:
+                    self._resolve(tx, receipt)
+
+    def _resolve(self, tx: PendingTransaction, receipt: Dict[str, Any]):
+        """確定したトランザクションのFutureを解決（失敗したトランザクションは例外にする）"""
+        with self._lock:
+            self._pending.pop(tx.tx_hash, None)
+        # 失敗したトランザクションもnonceは消費しているため、確定として扱う
+        if self.on_confirmed:
+            try:
+                self.on_confirmed(tx)
+            except Exception as e:
+                logger.error(f"確定コールバックでエラーが発生: {e}")
+        if receipt['status'] != 1:
+            logger.error(f"トランザクションが失敗しました: {tx.tx_hash} (ブロック {receipt['block_number']})")
+            tx.future.set_exception(TransactionRevertedError(
+                f"トランザクションが失敗しました: {tx.tx_hash} (ブロック {receipt['block_number']})"
+            ))
+            return
+        logger.info(f"トランザクションが確定しました: {tx.tx_hash} (ブロック {receipt['block_number']})")
+        tx.future.set_result(receipt)
+
+    def _check_stalled(self, tx: PendingTransaction, mined_nonces: Dict[str, Optional[int]]):
+        """
+        タイムアウトしたトランザクションのnonceが消費済みかを確認
+
+        同じnonceの別のトランザクションが取り込まれた場合のみ破棄扱いにする。
+        nonceが未消費の間は後から取り込まれる可能性があるため追跡を続ける
+        （破棄扱いにして記録を再送すると、元のトランザクションと二重に記録される）。
+
+        Args:
+            tx: タイムアウトしたトランザクション
+            mined_nonces: 送信元ごとの取り込み済みnonce（このメソッドで補う）
+        """
+        if tx.nonce is None or tx.sender is None:
+            # 再起動後に追跡を再開したトランザクションはノードから送信元とnonceを補う
+            try:
+                transaction = self.w3.eth.get_transaction(tx.tx_hash)
+            except Exception:
+                transaction = None
+            if not transaction:
+                logger.warning(f"トランザクションがノードに見つかりません: {tx.tx_hash}")
+                self._drop(tx)
+                return
+            tx.nonce = transaction['nonce']
+            tx.sender = transaction['from']
+
+        if tx.sender not in mined_nonces:
+            try:
+                mined_nonces[tx.sender] = self.w3.eth.get_transaction_count(tx.sender, 'latest')
+            except Exception as e:
+                logger.error(f"取り込み済みnonceの取得に失敗: {tx.sender}: {e}")
+                mined_nonces[tx.sender] = None
+        mined_nonce = mined_nonces[tx.sender]
+        if mined_nonce is None:
+            return
+
+        if mined_nonce > tx.nonce:
+            self._drop(tx)
+        elif not tx.stalled:
+            tx.stalled = True
+            logger.warning(
+                f"トランザクションが{self.timeout}秒以内に確定しませんでしたが、"
+                f"nonce {tx.nonce} が未消費のため追跡を続けます: {tx.tx_hash}"
+            )
+
+    def _drop(self, tx: PendingTransaction):
+        """nonceが他のトランザクションで消費されたトランザクションを破棄扱いにする"""
+        with self._lock:
+            self._pending.pop(tx.tx_hash, None)
+        if self.on_dropped:
+            try:
+                self.on_dropped(tx)
+            except Exception as e:
+                logger.error(f"破棄コールバックでエラーが発生: {e}")
+        logger.error(f"トランザクションが確定しませんでした: {tx.tx_hash}")
+        tx.future.set_exception(TimeoutError(
+            f"トランザクションが{self.timeout}秒以内に確定せず、nonceが他のトランザクションで消費されました: {tx.tx_hash}"
+        ))
+
+    def _fetch_receipts(self, tx_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        レシートの一括取得
+
+        JSON-RPCのバッチ要求を優先し、非対応のノードでは個別に取得する。
+
+        Args:
+            tx_hashes: トランザクションハッシュのリスト
+
+        Returns:
+            トランザクションハッシュをキーとしたレシート情報（未取り込みは含まない）
+        """
+        if self._batch_supported:
+            try:
+                return self._fetch_receipts_batch(tx_hashes)
+            except Exception as e:
+                logger.warning(f"バッチ要求に失敗したため個別取得に切り替えます: {e}")
+                self._batch_supported = False
+
+        receipts = {}
+        for tx_hash in tx_hashes:
+            try:
+                receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+            except Exception:
+                continue
+            if receipt is not None:
+                receipts[tx_hash] = {
+                    'transaction_hash': tx_hash,
+                    'block_number': receipt['blockNumber'],
+                    'gas_used': receipt['gasUsed'],
+                    'status': receipt['status']
+                }
+        return receipts
+
+    def _fetch_receipts_batch(self, tx_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """JSON-RPCのバッチ要求でレシートを取得"""
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': 'eth_getTransactionReceipt', 'params': [tx_hash]}
+            for i, tx_hash in enumerate(tx_hashes)
+        ]
+        response = self._session.post(self.rpc_url, json=payload, timeout=30)
+        response.raise_for_status()
+        replies = response.json()
+        if not isinstance(replies, list):
+            raise ValueError(f"バッチ要求の応答が不正です: {replies}")
+
+        receipts = {}
+        for reply in replies:
+            receipt = reply.get('result')
+            if not receipt or receipt.get('blockNumber') is None:
+                continue
+            tx_hash = tx_hashes[reply['id']]
+            receipts[tx_hash] = {
+                'transaction_hash': tx_hash,
+                'block_number': int(receipt['blockNumber'], 16),
+                'gas_used': int(receipt['gasUsed'], 16),
+                'status': int(receipt.get('status', '0x1'), 16)
+            }
+        return receipts
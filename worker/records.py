@@ -0,0 +1,68 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# ノード側で付与するため、レコードの同一性判定から除外するフィールド
+INJECTED_FIELDS = ('blockchain_timestamp',)
+
+
+def canonical_hash(record: Dict[str, Any]) -> str:
+    """
+    解析結果の正規化ハッシュを計算
+
+    キー順序や空白の違いに左右されないよう正規化したJSONのSHA-256を返す。
+    ノードが付与するblockchain_timestampは対象外とする。
+
+    Args:
+        record: 解析結果
+
+    Returns:
+        16進文字列のハッシュ
+    """
+    payload = {k: v for k, v in record.items() if k not in INJECTED_FIELDS}
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def record_timestamp(record: Dict[str, Any], field: str = 'timestamp') -> Optional[int]:
+    """
+    解析結果の生成時刻をUNIXタイムスタンプで取得
+
+    metadata内のフィールドを優先し、なければトップレベルを参照する。
+    数値（秒またはミリ秒）とISO 8601形式の文字列を受け付ける。
+
+    Args:
+        record: 解析結果
+        field: 時刻を表すフィールド名
+
+    Returns:
+        UNIXタイムスタンプ（秒）、取得できない場合はNone
+    """
+    value = (record.get('metadata') or {}).get(field, record.get(field))
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # ミリ秒表記は秒に換算
+        return int(value / 1000) if value > 1e12 else int(value)
+    try:
+        return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp())
+    except ValueError:
+        return None
+
+
+def validate_analysis(record: Dict[str, Any]):
+    """
+    解析結果が記録に必要な項目を持つか検証
+
+    Args:
+        record: 解析結果
+
+    Raises:
+        ValueError: 必要な項目が不足している場合
+    """
+    if not isinstance(record, dict):
+        raise ValueError("解析結果がJSONオブジェクトではありません")
+    metadata = record.get('metadata')
+    if not isinstance(metadata, dict) or not metadata.get('device_id'):
+        raise ValueError("解析結果にmetadata.device_idがありません")
@@ -0,0 +1,281 @@
+import bisect
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, List
+
+from eth_account import Account
+
+from .nonce_manager import NonceManager
+
+logger = logging.getLogger(__name__)
+
+# 残高不足を示すRPCエラーメッセージ（クライアント実装ごとの表記揺れを含む）
+INSUFFICIENT_FUNDS_MARKERS = (
+    'insufficient funds',
+    'insufficient balance',
+)
+
+
+def is_insufficient_funds_error(error: Exception) -> bool:
+    """
+    例外が送信アカウントの残高不足に起因するかどうかを判定
+
+    Args:
+        error: 送信時に発生した例外
+
+    Returns:
+        残高不足のエラーかどうか
+    """
+    message = str(error).lower()
+    return any(marker in message for marker in INSUFFICIENT_FUNDS_MARKERS)
+
+
+def load_accounts(ethereum_config: Dict[str, Any]) -> List[Any]:
+    """
+    設定から署名アカウントを読み込む
+
+    ethereum.private_key、ethereum.signers.private_keys、
+    ethereum.signers.mnemonic（derivation_pathの末尾にaccount_count個の連番を付けて導出）の順に並べ、
+    重複するアドレスは除く。
+
+    Args:
+        ethereum_config: ethereumセクションの設定
+
+    Returns:
+        署名アカウントのリスト
+    """
+    signers_config = ethereum_config.get('signers', {})
+    keys = []
+    if ethereum_config.get('private_key'):
+        keys.append(ethereum_config['private_key'])
+    keys.extend(signers_config.get('private_keys', []))
+    accounts = [Account.from_key(key) for key in keys]
+
+    mnemonic = signers_config.get('mnemonic')
+    if mnemonic:
+        Account.enable_unaudited_hdwallet_features()
+        derivation_path = signers_config.get('derivation_path', "m/44'/60'/0'/0").rstrip('/')
+        for index in range(signers_config.get('account_count', 1)):
+            accounts.append(Account.from_mnemonic(mnemonic, account_path=f"{derivation_path}/{index}"))
+
+    unique = {}
+    for account in accounts:
+        unique.setdefault(account.address, account)
+    return list(unique.values())
+
+
+class NoSignerAvailableError(RuntimeError):
+    """送信に使える署名アカウントがない場合の例外"""
+
+
+class Signer:
+    """署名アカウントと、そのアカウント専用のnonceの払い出し"""
+
+    def __init__(self, account, nonce_manager: NonceManager):
+        """
+        署名アカウントの初期化
+
+        Args:
+            account: eth_accountのアカウント
+            nonce_manager: このアカウントのnonceマネージャー
+        """
+        self.account = account
+        self.address = account.address
+        self.key = account.key
+        self.nonce_manager = nonce_manager
+        self.balance: Optional[int] = None
+        self.active = True
+        # 残高不足で送信に失敗した時点の残高（これを上回るまで使用を止める）
+        self.suspended_balance: Optional[int] = None
+
+
+class SignerPool:
+    """複数の署名アカウントに送信を振り分けるクラス
+
+    振り分け先はデバイスIDのコンシステントハッシュで決めるため、同じデバイスの記録は常に同じアカウント
+    （同じnonceの系列）から送信され、アカウントの増減で移動するデバイスは一部にとどまる。
+    アカウントごとにnonceを払い出すため、1つのトランザクションが詰まっても他のアカウントの送信は止まらない。
+    残高が下限を下回ったアカウントや残高不足で送信に失敗したアカウントは使用を止め、
+    そのデバイスはリング上の次のアカウントに回す。残高は定期的に確認し、回復したアカウントの使用を再開する。
+    """
+
+    def __init__(
+        self,
+        w3,
+        accounts: List[Any],
+        virtual_nodes: int = 64,
+        min_balance: int = 0,
+        balance_check_interval: float = 60.0
+    ):
+        """
+        署名アカウントプールの初期化
+
+        Args:
+            w3: Web3インスタンス
+            accounts: 署名アカウントのリスト
+            virtual_nodes: ハッシュリング上に置く1アカウントあたりの仮想ノード数
+            min_balance: 送信に使う残高の下限（wei、0の場合は残高不足で送信に失敗したアカウントの再開のみ判定する）
+            balance_check_interval: 残高を確認する間隔（秒）
+        """
+        if not accounts:
+            raise ValueError("署名アカウントが1つ以上必要です")
+
+        self.w3 = w3
+        self.min_balance = min_balance
+        self.balance_check_interval = balance_check_interval
+        self.signers = [Signer(account, NonceManager(w3, account.address)) for account in accounts]
+        self._by_address = {signer.address.lower(): signer for signer in self.signers}
+
+        ring = sorted(
+            (self._hash(f"{signer.address}#{replica}"), index)
+            for index, signer in enumerate(self.signers)
+            for replica in range(max(1, virtual_nodes))
+        )
+        self._ring_hashes = [point for point, _ in ring]
+        self._ring_signers = [index for _, index in ring]
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        """リング上の位置"""
+        return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big')
+
+    @property
+    def primary(self) -> Signer:
+        """先頭の署名アカウント（既定の送信元に使う）"""
+        return self.signers[0]
+
+    def start(self):
+        """各アカウントのnonceを同期し、残高の確認スレッドを開始"""
+        for signer in self.signers:
+            signer.nonce_manager.sync()
+        self.check_balances()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='signer-balance', daemon=True)
+        self._thread.start()
+        logger.info(f"署名アカウントの残高確認を開始しました: {len(self.signers)} アカウント")
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        残高の確認スレッドの停止
+
+        Args:
+            timeout: スレッド終了の待機時間（秒）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        """残高の確認ループ"""
+        while not self._stop_event.wait(self.balance_check_interval):
+            self.check_balances()
+
+    def check_balances(self):
+        """各アカウントの残高を取得し、下限を下回ったアカウントの使用を止める（回復したら再開する）
+
+        残高不足で送信に失敗したアカウントは、下限に加えて失敗時の残高を上回った場合に再開する。
+        """
+        for signer in self.signers:
+            try:
+                balance = self.w3.eth.get_balance(signer.address)
+            except Exception as e:
+                logger.error(f"署名アカウントの残高取得に失敗: {signer.address}: {e}")
+                continue
+            with self._lock:
+                signer.balance = balance
+                active = balance >= self.min_balance and (
+                    signer.suspended_balance is None or balance > signer.suspended_balance
+                )
+                changed = active != signer.active
+                signer.active = active
+                if active:
+                    signer.suspended_balance = None
+            if changed and active:
+                logger.info(f"署名アカウントの残高が回復したため使用を再開します: {signer.address} ({balance} wei)")
+            elif changed:
+                logger.warning(
+                    f"署名アカウントの残高が下限を下回ったため使用を止めます: "
+                    f"{signer.address} ({balance} wei < {self.min_balance} wei)"
+                )
+
+    def deactivate(self, address: str):
+        """
+        残高不足で送信に失敗したアカウントの使用を、入金されて残高が増えるまで止める
+
+        Args:
+            address: アカウントのアドレス
+        """
+        signer = self.get(address)
+        if signer is None:
+            return
+        try:
+            balance = self.w3.eth.get_balance(signer.address)
+        except Exception as e:
+            logger.error(f"署名アカウントの残高取得に失敗: {signer.address}: {e}")
+            balance = signer.balance
+        with self._lock:
+            changed = signer.active
+            signer.active = False
+            signer.balance = balance
+            if balance is not None and (signer.suspended_balance is None or balance < signer.suspended_balance):
+                signer.suspended_balance = balance
+        if changed:
+            logger.warning(f"残高不足のため署名アカウントの使用を止めます: {address}")
+
+    def select(self, device_id: str) -> Signer:
+        """
+        デバイスIDの送信に使うアカウントを選ぶ
+
+        Args:
+            device_id: デバイスID
+
+        Returns:
+            ハッシュリング上でデバイスIDの次にある使用中のアカウント
+
+        Raises:
+            NoSignerAvailableError: すべてのアカウントの使用を止めている場合
+        """
+        start = bisect.bisect(self._ring_hashes, self._hash(device_id))
+        size = len(self._ring_hashes)
+        with self._lock:
+            for offset in range(size):
+                signer = self.signers[self._ring_signers[(start + offset) % size]]
+                if signer.active:
+                    return signer
+        raise NoSignerAvailableError("残高のある署名アカウントがありません")
+
+    def get(self, address: Optional[str]) -> Optional[Signer]:
+        """
+        アドレスからアカウントを取得
+
+        Args:
+            address: アカウントのアドレス
+
+        Returns:
+            プール内のアカウント（ない場合はNone）
+        """
+        return self._by_address.get(address.lower()) if address else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        アカウントごとの状態を取得
+
+        Returns:
+            アドレスをキーとした残高（wei、未確認の場合はNone）・使用中かどうか・未確定のトランザクション数
+        """
+        with self._lock:
+            return {
+                signer.address: {
+                    'balance': signer.balance,
+                    'active': signer.active,
+                    'in_flight': signer.nonce_manager.in_flight_count
+                }
+                for signer in self.signers
+            }
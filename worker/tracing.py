@@ -0,0 +1,387 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Tuple, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# OTLPのSpanKind
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+# OTLPのStatusCode
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# 現在のスレッド・タスクで子スパンの親になるスパン（複数レコードの一括処理では複数）
+_current_parents: ContextVar[Tuple['Span', ...]] = ContextVar('csi_trace_parents', default=())
+
+
+class Span:
+    """1つの処理区間（OTLPのSpanに対応）"""
+
+    __slots__ = (
+        'trace_id', 'span_id', 'parent_span_id', 'name', 'kind',
+        'start_ns', 'end_ns', 'attributes', 'status_code', 'status_message'
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        parent_span_id: Optional[str] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+        attributes: Optional[Dict[str, Any]] = None
+    ):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = ''
+
+    def child(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> 'Span':
+        """このスパンを親とする子スパンを作成"""
+        return Span(name, self.trace_id, self.span_id, kind=kind, attributes=attributes)
+
+    def set_error(self, error: BaseException):
+        """エラーとして終了したことを記録"""
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP JSON形式に変換"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': self.status_code}
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """属性値をOTLPのAnyValueに変換"""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # OTLP JSONでは64ビット整数を文字列で表す
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """属性の辞書をOTLPのKeyValueのリストに変換"""
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class OtlpJsonFileExporter:
+    """終了したスパンをOTLP JSON（1行に1つのExportTraceServiceRequest）でファイルに書き出すクラス"""
+
+    def __init__(
+        self,
+        path: str,
+        service_name: str = 'csi-blockchain-node',
+        flush_interval: float = 5.0,
+        max_batch: int = 512
+    ):
+        """
+        エクスポーターの初期化
+
+        Args:
+            path: 書き出し先のファイル（追記）
+            service_name: resourceのservice.name
+            flush_interval: 書き出し間隔（秒）
+            max_batch: 1行にまとめる最大スパン数
+        """
+        self.path = path
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        """
+        終了したスパンを書き出し待ちに追加
+
+        Args:
+            span: 終了したスパン
+        """
+        with self._lock:
+            self._buffer.append(span)
+
+    def _run(self):
+        """一定間隔での書き出しループ"""
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """書き出し待ちのスパンをファイルに書き出す"""
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if not spans:
+            return
+
+        lines = []
+        for start in range(0, len(spans), self.max_batch):
+            request = {
+                'resourceSpans': [{
+                    'resource': {'attributes': _otlp_attributes({'service.name': self.service_name})},
+                    'scopeSpans': [{
+                        'scope': {'name': __name__},
+                        'spans': [span.to_otlp() for span in spans[start:start + self.max_batch]]
+                    }]
+                }]
+            }
+            lines.append(json.dumps(request, ensure_ascii=False, separators=(',', ':')))
+
+        try:
+            with self._write_lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except Exception as e:
+            logger.error(f"トレースの書き出しに失敗: {e}")
+
+    def shutdown(self):
+        """書き出しスレッドを停止し、残りのスパンを書き出す"""
+        self._stop_event.set()
+        self._thread.join()
+        self.flush()
+
+
+class Tracer:
+    """解析結果ごとのトレースを管理するクラス
+
+    解析結果1件につき取り込みから確定までを覆うルートスパンを1つ作り、
+    正規化ハッシュをキーとして保持する。外部呼び出しのスパンは、
+    records() で指定したレコードのルートスパン（一括処理では各レコード）の子として記録する。
+    エクスポーターがない場合はすべての操作が何もしない。
+    """
+
+    def __init__(self, exporter: Optional[OtlpJsonFileExporter] = None, max_open_records: int = 100_000):
+        """
+        トレーサーの初期化
+
+        Args:
+            exporter: 終了したスパンの書き出し先（Noneの場合はトレースを無効化）
+            max_open_records: 同時に保持するルートスパンの上限（超えた場合は古いものから破棄）
+        """
+        self.exporter = exporter
+        self.max_open_records = max_open_records
+        self._records: 'OrderedDict[str, Span]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """トレースが有効かどうか"""
+        return self.exporter is not None
+
+    def start_record(self, key: str, **attributes):
+        """
+        解析結果のルートスパンを開始（既に開始済みの場合は属性のみ追加）
+
+        Args:
+            key: 解析結果の正規化ハッシュ
+            **attributes: スパンの属性（device_idなど）
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            span = self._records.get(key)
+            if span is None:
+                span = Span('record', attributes={'payload_hash': key})
+                self._records[key] = span
+                if len(self._records) > self.max_open_records:
+                    evicted_key, _ = self._records.popitem(last=False)
+                    logger.warning(f"終了しないトレースを破棄しました: {evicted_key}")
+            span.attributes.update(attributes)
+
+    def end_record(self, key: str, error: Optional[BaseException] = None, **attributes):
+        """
+        解析結果のルートスパンを終了して書き出す
+
+        Args:
+            key: 解析結果の正規化ハッシュ
+            error: 失敗した場合の例外
+            **attributes: 追加するスパンの属性
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            span = self._records.pop(key, None)
+        if span is None:
+            return
+        span.attributes.update(attributes)
+        if error is not None:
+            span.set_error(error)
+        else:
+            span.status_code = STATUS_OK
+        span.end_ns = time.time_ns()
+        self.exporter.export(span)
+
+    def end_record_on(self, key: str, future: Future, **attributes):
+        """
+        Futureの完了時にルートスパンを終了
+
+        Args:
+            key: 解析結果の正規化ハッシュ
+            future: チェーンへの記録完了時に解決されるFuture
+            **attributes: 追加するスパンの属性
+        """
+        if not self.enabled:
+            return
+        future.add_done_callback(lambda done: self.end_record(key, done.exception(), **attributes))
+
+    @contextmanager
+    def records(self, keys: Iterable[str]) -> Iterator[None]:
+        """
+        ブロック内で作成するスパンの親を指定したレコードのルートスパンにする
+
+        Args:
+            keys: 解析結果の正規化ハッシュ
+        """
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            parents = tuple(self._records[key] for key in keys if key in self._records)
+        token = _current_parents.set(parents)
+        try:
+            yield
+        finally:
+            _current_parents.reset(token)
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Iterator[None]:
+        """
+        ブロックの実行を現在の親（各レコード）の子スパンとして記録
+
+        親がない場合は記録しない。ブロック内で作成するスパンはこのスパンの子になる。
+
+        Args:
+            name: スパン名
+            kind: SPAN_KIND_INTERNAL または SPAN_KIND_CLIENT
+            **attributes: スパンの属性
+        """
+        parents = _current_parents.get() if self.enabled else ()
+        if not parents:
+            yield
+            return
+
+        children = tuple(parent.child(name, kind, **attributes) for parent in parents)
+        token = _current_parents.set(children)
+        try:
+            yield
+        except BaseException as e:
+            for child in children:
+                child.set_error(e)
+            raise
+        finally:
+            _current_parents.reset(token)
+            end_ns = time.time_ns()
+            for child in children:
+                child.end_ns = end_ns
+                self.exporter.export(child)
+
+    def follow(self, future: Future, name: str, kind: int = SPAN_KIND_CLIENT, **attributes):
+        """
+        現在からFutureの完了までを現在の親の子スパンとして記録
+
+        Args:
+            future: 完了を待つFuture（レシートの確定など）
+            name: スパン名
+            kind: SPAN_KIND_INTERNAL または SPAN_KIND_CLIENT
+            **attributes: スパンの属性
+        """
+        parents = _current_parents.get() if self.enabled else ()
+        if not parents:
+            return
+        children = tuple(parent.child(name, kind, **attributes) for parent in parents)
+
+        def finish(done: Future):
+            error = done.exception()
+            end_ns = time.time_ns()
+            for child in children:
+                if error is not None:
+                    child.set_error(error)
+                child.end_ns = end_ns
+                self.exporter.export(child)
+        future.add_done_callback(finish)
+
+    def add_span(
+        self,
+        key: str,
+        name: str,
+        start_ns: int,
+        end_ns: int,
+        kind: int = SPAN_KIND_CLIENT,
+        **attributes
+    ):
+        """
+        計測済みの区間をレコードの子スパンとして記録
+
+        分析サーバーからの一括取得など、レコードのキーが分かる前に終わった呼び出しに使う。
+        ルートスパンの開始時刻は子スパンの開始時刻までさかのぼる。
+
+        Args:
+            key: 解析結果の正規化ハッシュ
+            name: スパン名
+            start_ns: 開始時刻（UNIXエポックからのナノ秒）
+            end_ns: 終了時刻（UNIXエポックからのナノ秒）
+            kind: SPAN_KIND_INTERNAL または SPAN_KIND_CLIENT
+            **attributes: スパンの属性
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            parent = self._records.get(key)
+            if parent is None:
+                return
+            parent.start_ns = min(parent.start_ns, start_ns)
+        child = parent.child(name, kind, **attributes)
+        child.start_ns = start_ns
+        child.end_ns = end_ns
+        self.exporter.export(child)
+
+    @property
+    def open_records(self) -> int:
+        """終了していないルートスパンの数"""
+        with self._lock:
+            return len(self._records)
+
+    def shutdown(self):
+        """書き出し待ちのスパンを書き出して停止"""
+        if self.exporter:
+            self.exporter.shutdown()
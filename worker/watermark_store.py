@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WatermarkStore:
+    """デバイスごとの処理済み位置（ハイウォーターマーク）を永続化するクラス"""
+
+    def __init__(self, path: str):
+        """
+        ウォーターマークストアの初期化
+
+        Args:
+            path: 保存先のJSONファイルのパス
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._watermarks: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """保存済みのウォーターマークを読み込み"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                watermarks = json.load(f)
+            logger.info(f"ウォーターマークを読み込みました: {len(watermarks)} デバイス")
+            return watermarks
+        except Exception as e:
+            logger.error(f"ウォーターマークの読み込みに失敗: {e}")
+            raise
+
+    def _persist(self):
+        """一時ファイルへの書き込みと置換で原子的に保存"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.watermarks_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._watermarks, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, device_id: str) -> Optional[int]:
+        """
+        デバイスのウォーターマークを取得
+
+        Args:
+            device_id: デバイスID
+
+        Returns:
+            処理済みの最新時刻（未処理の場合はNone）
+        """
+        with self._lock:
+            watermark = self._watermarks.get(device_id)
+            return watermark['timestamp'] if watermark else None
+
+    def get_all(self) -> Dict[str, int]:
+        """
+        全デバイスのウォーターマークを取得
+
+        Returns:
+            デバイスIDをキーとした処理済みの最新時刻
+        """
+        with self._lock:
+            return {device_id: wm['timestamp'] for device_id, wm in self._watermarks.items()}
+
+    def is_processed(self, device_id: str, timestamp: int, record_key: str) -> bool:
+        """
+        レコードがウォーターマーク以前に処理済みかどうかを判定
+
+        Args:
+            device_id: デバイスID
+            timestamp: レコードの時刻
+            record_key: レコードの識別キー
+
+        Returns:
+            処理済みかどうか
+        """
+        with self._lock:
+            watermark = self._watermarks.get(device_id)
+            if not watermark:
+                return False
+            if timestamp < watermark['timestamp']:
+                return True
+            # 同一時刻のレコードは記録済みキーで判定する
+            return timestamp == watermark['timestamp'] and record_key in watermark['keys']
+
+    def advance(self, device_id: str, timestamp: int, record_key: str):
+        """
+        記録が完了したレコードでウォーターマークを進める
+
+        Args:
+            device_id: デバイスID
+            timestamp: レコードの時刻
+            record_key: レコードの識別キー
+        """
+        with self._lock:
+            watermark = self._watermarks.get(device_id)
+            if watermark is None or timestamp > watermark['timestamp']:
+                self._watermarks[device_id] = {'timestamp': timestamp, 'keys': [record_key]}
+            elif timestamp == watermark['timestamp'] and record_key not in watermark['keys']:
+                watermark['keys'].append(record_key)
+            else:
+                return
+            self._persist()
@@ -0,0 +1,393 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+# 作業項目の状態
+STATE_PENDING = 'pending'
+STATE_UPLOADED = 'uploaded'
+STATE_SUBMITTED = 'submitted'
+STATE_CONFIRMED = 'confirmed'
+STATE_FAILED = 'failed'
+
+STATES = (STATE_PENDING, STATE_UPLOADED, STATE_SUBMITTED, STATE_CONFIRMED, STATE_FAILED)
+
+_COLUMNS = (
+    'id', 'source', 'source_ref', 'payload_hash', 'device_id', 'record_timestamp', 'payload',
+    'state', 'attempts', 'ipfs_hash', 'transaction_hash', 'error', 'created_at', 'updated_at'
+)
+
+
+class WorkQueue:
+    """解析結果の処理状態を管理する組み込みの永続キュー"""
+
+    def __init__(self, db_path: str, lease_seconds: float = 300, max_attempts: int = 3):
+        """
+        作業キューの初期化
+
+        Args:
+            db_path: SQLiteデータベースのパス
+            lease_seconds: 取り出した項目を他の取り出しから除外する時間（秒）
+            max_attempts: failed状態にするまでの最大試行回数
+        """
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS work_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                source_ref TEXT,
+                payload_hash TEXT NOT NULL UNIQUE,
+                device_id TEXT,
+                record_timestamp INTEGER,
+                payload TEXT,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                ipfs_hash TEXT,
+                transaction_hash TEXT,
+                error TEXT,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        # 待機中の項目だけを対象にした部分インデックスで、キューが深くても取り出しを高速に保つ
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_work_items_pending ON work_items (id) WHERE state = 'pending'"
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_work_items_state ON work_items (state)')
+        self._conn.commit()
+
+    def enqueue(
+        self,
+        payload: Dict[str, Any],
+        payload_hash: str,
+        source: str,
+        source_ref: Optional[str] = None,
+        device_id: Optional[str] = None,
+        record_timestamp: Optional[int] = None,
+        retry_failed: bool = False
+    ) -> str:
+        """
+        解析結果をキューに追加
+
+        同じ正規化ハッシュの項目が既にある場合は追加しない。
+        retry_failedの場合は、failed状態の同じ項目を試行回数を戻して再試行待ちにする。
+
+        Args:
+            payload: 解析結果
+            payload_hash: 解析結果の正規化ハッシュ
+            source: 取り込み元（'file' または 'analysis_server'）
+            source_ref: 取り込み元の参照（ファイルパスなど）
+            device_id: デバイスID
+            record_timestamp: 解析結果の生成時刻
+            retry_failed: failed状態の同じ項目を再試行待ちに戻すかどうか
+
+        Returns:
+            'queued'（追加した）、'requeued'（failed状態から戻した）、'duplicate'（既にある）のいずれか
+        """
+        now = time.time()
+        encoded = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    '''INSERT OR IGNORE INTO work_items
+                       (source, source_ref, payload_hash, device_id, record_timestamp, payload,
+                        state, created_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (source, source_ref, payload_hash, device_id, record_timestamp,
+                     encoded, STATE_PENDING, now, now)
+                )
+                if cursor.rowcount > 0:
+                    return 'queued'
+                if not retry_failed:
+                    return 'duplicate'
+                cursor = self._conn.execute(
+                    '''UPDATE work_items
+                       SET state = ?, attempts = 0, error = NULL, lease_until = NULL,
+                           source = ?, source_ref = ?, payload = ?, updated_at = ?
+                       WHERE payload_hash = ? AND state = ?''',
+                    (STATE_PENDING, source, source_ref, encoded, now, payload_hash, STATE_FAILED)
+                )
+        return 'requeued' if cursor.rowcount > 0 else 'duplicate'
+
+    def claim(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """
+        待機中の項目を取り出してリースを設定
+
+        リース期限内は他の取り出しの対象外となり、ackされないまま期限が切れると再度取り出される。
+
+        Args:
+            limit: 取り出す最大件数
+
+        Returns:
+            取り出した項目のリスト
+        """
+        return self._lease('ORDER BY id LIMIT ?', (limit,))
+
+    def claim_hashes(self, payload_hashes: List[str]) -> List[Dict[str, Any]]:
+        """
+        指定した正規化ハッシュの待機中の項目を取り出してリースを設定
+
+        作業キューに追加した直後の項目を、そのまま処理に回す場合に使う。
+
+        Args:
+            payload_hashes: 取り出す項目の正規化ハッシュ
+
+        Returns:
+            取り出した項目のリスト（他で取り出し済みの項目は含まない）
+        """
+        if not payload_hashes:
+            return []
+        placeholders = ', '.join('?' for _ in payload_hashes)
+        return self._lease(f'AND payload_hash IN ({placeholders}) ORDER BY id', tuple(payload_hashes))
+
+    def _lease(self, clause: str, params: tuple) -> List[Dict[str, Any]]:
+        """リースの切れた待機中の項目のうち条件に合うものを取り出してリースを設定"""
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                rows = self._conn.execute(
+                    f'''SELECT {', '.join(_COLUMNS)} FROM work_items
+                        WHERE state = ? AND (lease_until IS NULL OR lease_until < ?) {clause}''',
+                    (STATE_PENDING, now, *params)
+                ).fetchall()
+                self._conn.executemany(
+                    'UPDATE work_items SET lease_until = ?, attempts = attempts + 1 WHERE id = ?',
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+        items = []
+        for row in rows:
+            item = dict(zip(_COLUMNS, row))
+            item['payload'] = json.loads(item['payload'])
+            item['attempts'] += 1
+            items.append(item)
+        return items
+
+    def renew(self, item_ids: List[int]) -> int:
+        """
+        取り出した項目のうち待機中のもののリースを延長
+
+        処理待ちの間にリースが切れて、同じ項目が再度取り出されるのを防ぐ。
+
+        Args:
+            item_ids: 項目のIDのリスト
+
+        Returns:
+            延長した件数
+        """
+        if not item_ids:
+            return 0
+        placeholders = ', '.join('?' for _ in item_ids)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    f'''UPDATE work_items SET lease_until = ?
+                        WHERE id IN ({placeholders}) AND state = ? AND lease_until IS NOT NULL''',
+                    (time.time() + self.lease_seconds, *item_ids, STATE_PENDING)
+                )
+        return cursor.rowcount
+
+    def contains(self, payload_hash: str) -> bool:
+        """
+        同じ正規化ハッシュの項目があるかどうか（状態は問わない）
+
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ
+
+        Returns:
+            項目があるかどうか
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM work_items WHERE payload_hash = ?', (payload_hash,)
+            ).fetchone()
+        return row is not None
+
+    def state(self, payload_hash: str) -> Optional[str]:
+        """
+        同じ正規化ハッシュの項目の状態を取得
+
+        Args:
+            payload_hash: 解析結果の正規化ハッシュ
+
+        Returns:
+            項目の状態（項目がない場合はNone）
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT state FROM work_items WHERE payload_hash = ?', (payload_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _update(self, item_id: int, **fields):
+        """項目のフィールドを更新"""
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{key} = ?' for key in fields)
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    f'UPDATE work_items SET {assignments} WHERE id = ?',
+                    (*fields.values(), item_id)
+                )
+
+    def mark_uploaded(self, item_id: int, ipfs_hash: str):
+        """IPFSへの保存が完了した項目を記録（前回の試行のトランザクションハッシュは消す）"""
+        self._update(item_id, state=STATE_UPLOADED, ipfs_hash=ipfs_hash, transaction_hash=None)
+
+    def mark_submitted(self, item_id: int, ipfs_hash: str, transaction_hash: Optional[str]):
+        """
+        トランザクションを送信した項目を記録
+
+        Args:
+            item_id: 項目のID
+            ipfs_hash: レコードのIPFSハッシュ
+            transaction_hash: トランザクションハッシュ（バッチ待ちの場合はNoneとし、
+                              mark_batch_submittedで記録済みのハッシュは残す）
+        """
+        fields = {'state': STATE_SUBMITTED, 'ipfs_hash': ipfs_hash, 'lease_until': None}
+        if transaction_hash is not None:
+            fields['transaction_hash'] = transaction_hash
+        self._update(item_id, **fields)
+
+    def mark_batch_submitted(self, ipfs_hashes: List[str], transaction_hash: str):
+        """
+        Merkleバッチのトランザクションを送信した項目にそのハッシュを記録
+
+        再起動後もバッチのトランザクションのレシートから追跡を再開できるようにする。
+
+        Args:
+            ipfs_hashes: バッチに含めたレコードのIPFSハッシュのリスト
+            transaction_hash: バッチのトランザクションハッシュ
+        """
+        if not ipfs_hashes:
+            return
+        placeholders = ', '.join('?' for _ in ipfs_hashes)
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    f'''UPDATE work_items SET state = ?, transaction_hash = ?, lease_until = NULL, updated_at = ?
+                        WHERE ipfs_hash IN ({placeholders}) AND state IN (?, ?)''',
+                    (STATE_SUBMITTED, transaction_hash, time.time(), *ipfs_hashes, STATE_UPLOADED, STATE_SUBMITTED)
+                )
+
+    def ack(self, item_id: int, transaction_hash: Optional[str] = None):
+        """
+        チェーンへの記録が確定した項目を完了にする
+
+        完了した項目の解析結果はIPFSに保存済みのため削除して容量を抑える。
+
+        Args:
+            item_id: 項目ID
+            transaction_hash: 確定したトランザクションハッシュ
+        """
+        fields = {'state': STATE_CONFIRMED, 'payload': None, 'error': None, 'lease_until': None}
+        if transaction_hash:
+            fields['transaction_hash'] = transaction_hash
+        self._update(item_id, **fields)
+
+    def nack(self, item_id: int, error: str):
+        """
+        処理に失敗した項目を再試行待ちに戻す
+
+        最大試行回数に達した場合はfailed状態にする。
+
+        Args:
+            item_id: 項目ID
+            error: 失敗の理由
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT attempts FROM work_items WHERE id = ?', (item_id,)).fetchone()
+        if row is None:
+            return
+        attempts = row[0]
+        state = STATE_FAILED if attempts >= self.max_attempts else STATE_PENDING
+        self._update(item_id, state=state, error=error, lease_until=None)
+        if state == STATE_FAILED:
+            logger.error(f"作業項目が最大試行回数に達しました: {item_id}: {error}")
+
+    def recover(self) -> List[Dict[str, Any]]:
+        """
+        前回終了時に処理途中だった項目を復旧
+
+        IPFS保存済みで未送信の項目とリース中の項目を待機中に戻し、
+        送信済みで未確定の項目を呼び出し側で追跡し直せるよう返す。
+
+        Returns:
+            送信済みで未確定の項目のリスト
+        """
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE work_items SET state = ?, lease_until = NULL, updated_at = ? WHERE state = ?',
+                    (STATE_PENDING, now, STATE_UPLOADED)
+                )
+                self._conn.execute(
+                    'UPDATE work_items SET lease_until = NULL WHERE state = ? AND lease_until IS NOT NULL',
+                    (STATE_PENDING,)
+                )
+                rows = self._conn.execute(
+                    f'SELECT {", ".join(_COLUMNS)} FROM work_items WHERE state = ?',
+                    (STATE_SUBMITTED,)
+                ).fetchall()
+        items = []
+        for row in rows:
+            item = dict(zip(_COLUMNS, row))
+            item['payload'] = json.loads(item['payload']) if item['payload'] else None
+            items.append(item)
+        return items
+
+    def requeue(self, item_id: int):
+        """
+        項目を待機中に戻す
+
+        Args:
+            item_id: 項目ID
+        """
+        self._update(item_id, state=STATE_PENDING, lease_until=None)
+
+    def retry_failed(self) -> int:
+        """
+        failed状態の項目を再試行待ちに戻す
+
+        Returns:
+            戻した件数
+        """
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    'UPDATE work_items SET state = ?, attempts = 0, lease_until = NULL, updated_at = ? WHERE state = ?',
+                    (STATE_PENDING, time.time(), STATE_FAILED)
+                )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """
+        状態ごとの項目数を取得
+
+        Returns:
+            状態をキーとした項目数
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM work_items GROUP BY state').fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()